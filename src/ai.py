@@ -13,33 +13,65 @@ from fastapi import FastAPI, File, UploadFile, HTTPException
 from openai import OpenAI
 import time
 import random
+from utils.job_store import JobStore, summarize_results
+from utils.progress import ComparisonCancelled, ProgressReporter
 
 
 # Environment Variables and Configurations
 UPLOAD_FOLDER = "uploads"
 RESULTS_FOLDER = "results"
 JOBS_FOLDER = "jobs"
-JOBS_FILE = "jobs.json"
+JOBS_FILE = "jobs.json"  # Legacy store, imported once into the SQLite job store
+JOBS_DB = os.getenv("JOBS_DB_PATH", "jobs.db")
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 os.makedirs(RESULTS_FOLDER, exist_ok=True)
 os.makedirs(JOBS_FOLDER, exist_ok=True)
 
 # FastAPI for API Management
 app = FastAPI()
-comparisons = {}
+
+# ✅ SQLite (WAL) job store: indexed lookups and atomic status transitions
+job_store = JobStore(JOBS_DB)
+job_store.import_json(JOBS_FILE)
+
+# ✅ Progress/cancel handles of the jobs running in this process; cached so every Streamlit rerun of
+# this script sees the registry the worker threads of earlier runs write to
+@st.cache_resource
+def get_active_jobs():
+    return {}
+
+active_jobs = get_active_jobs()
 
 def run_comparison(baseline_file, candidate_file, job_id):
     """ Compares two datasets and stores full discrepancies """
-    comparisons[job_id] = {"status": "processing", "baseline": baseline_file, "candidate": candidate_file}
-    save_jobs()  # ✅ Save the job status
-
+    reporter = active_jobs.setdefault(job_id, ProgressReporter())
+    if not job_store.transition(job_id, "processing", expected=["queued"]):
+        active_jobs.pop(job_id, None)
+        return  # ✅ Job was already picked up (or removed)
+
+    try:
+        _compare_uploaded(baseline_file, candidate_file, job_id, reporter)
+    except ComparisonCancelled as e:
+        # ✅ The job's DataFrames are unreachable once we get here
+        job_store.transition(job_id, "cancelled", expected=["processing"], error=str(e))
+    except Exception as e:
+        # ✅ Never leave the job in "processing" when the comparison fails
+        job_store.transition(job_id, "failed", expected=["processing"], error=str(e) or type(e).__name__)
+    finally:
+        active_jobs.pop(job_id, None)
+
+def _compare_uploaded(baseline_file, candidate_file, job_id, reporter):
     # Simulating actual file comparison
     df_baseline = pd.read_csv(os.path.join(UPLOAD_FOLDER, baseline_file))
+    reporter.update("read", 1, 2)
     df_candidate = pd.read_csv(os.path.join(UPLOAD_FOLDER, candidate_file))
+    reporter.update("read", 2, 2)
 
     # Simulating some mismatches
     discrepancies = []
     for i in range(len(df_baseline)):
+        if i % 10000 == 0:
+            reporter.update("rules", i, len(df_baseline))
         if i % 5 == 0:  # Simulated mismatches every 5th row
             discrepancy = {
                 "row": i,
@@ -51,13 +83,13 @@ def run_comparison(baseline_file, candidate_file, job_id):
             discrepancies.append(discrepancy)
 
     # Update results after processing
-    comparisons[job_id]["status"] = "completed"
-    comparisons[job_id]["results"] = {
+    results = {
         "mismatch_count": len(discrepancies),
         "critical_errors": sum(1 for d in discrepancies if d["severity"] == "FATAL"),
         "data": discrepancies
     }
-    save_jobs()  # ✅ Save the final status
+    reporter.finish()
+    job_store.transition(job_id, "completed", expected=["processing"], summary=summarize_results(results), results=results)
 
 # ✅ Streamlit UI Function
 def streamlit_ui():
@@ -81,7 +113,7 @@ def streamlit_ui():
             if len(filenames) >= 2:
                 job_id = str(uuid.uuid4())
                 baseline_file, candidate_file = filenames[:2]
-                comparisons[job_id] = {"status": "processing", "baseline": baseline_file, "candidate": candidate_file}
+                job_store.create(job_id, "queued", baseline_file, candidate_file)
 
                 # Run comparison in a separate thread
                 thread = threading.Thread(target=run_comparison, args=(baseline_file, candidate_file, job_id))
@@ -94,9 +126,17 @@ def streamlit_ui():
     # Section to Check Job Status
     st.subheader("📊 Check Comparison Results")
     job_id_input = st.text_input("🔍 Enter Job ID to View Results")
+    if st.button("⛔ Cancel Job"):
+        if job_id_input in active_jobs:
+            active_jobs[job_id_input].cancel()
+            st.success("⛔ Cancellation requested.")
+        else:
+            st.warning("⚠️ Job is not running.")
     if st.button("📥 Fetch Results"):
-        if job_id_input in comparisons:
-            status = comparisons[job_id_input]
+        status = job_store.get(job_id_input, include_results=True)
+        if status is not None:
+            if job_id_input in active_jobs:
+                st.progress(int(active_jobs[job_id_input].percent), text=f"{active_jobs[job_id_input].percent:.0f}% complete")
             st.json(status)
 
             # Display KPIs
@@ -136,51 +176,56 @@ async def upload_file(file: UploadFile = File(...)):
     with open(file_path, "wb") as buffer:
         buffer.write(file.file.read())
     file_id = str(uuid.uuid4())
-    comparisons[file_id] = file_path
+    job_store.register_file(file_id, file_path)
     return {"file_id": file_id, "filename": file.filename}
 
 # ✅ FastAPI Endpoint to Start a Comparison via API
 @app.post("/compare")
 async def compare_files(baseline_id: str, candidate_id: str):
-    if baseline_id not in comparisons or candidate_id not in comparisons:
+    if job_store.get_file(baseline_id) is None or job_store.get_file(candidate_id) is None:
         raise HTTPException(status_code=404, detail="One or both file IDs not found.")
     
     job_id = str(uuid.uuid4())
-    comparisons[job_id] = {"status": "processing", "baseline": baseline_id, "candidate": candidate_id}
+    job_store.create(job_id, "processing", baseline_id, candidate_id)
     
     def run_comparison():
         # Simulate comparison logic (Replace with real logic)
         import time
         time.sleep(5)  # Simulating processing time
-        comparisons[job_id]["status"] = "completed"
-        comparisons[job_id]["results"] = {"mismatch_count": 10, "critical_errors": 2}
+        results = {"mismatch_count": 10, "critical_errors": 2}
+        job_store.transition(job_id, "completed", expected=["processing"], summary=results, results=results)
 
     thread = threading.Thread(target=run_comparison)
     thread.start()
 
     return {"comparison_id": job_id, "message": "Comparison started, fetch results later."}
 
-# ✅ Load Existing Jobs from File
-def load_jobs():
-    if os.path.exists(JOBS_FILE):
-        with open(JOBS_FILE, "r") as f:
-            return json.load(f)
-    return {}
-
-# ✅ Save Jobs to File
-def save_jobs():
-    with open(JOBS_FILE, "w") as f:
-        json.dump(comparisons, f, indent=4)
-
-comparisons = load_jobs()  # ✅ Load existing jobs on startup
-
-# ✅ API to Check Job Status
+# ✅ API to Check Job Status (single indexed lookup, summary only)
 @app.get("/compare-job-id/{comparison_id}")
 async def get_comparison_status(comparison_id: str):
-    comparisons = load_jobs()  # ✅ Ensure latest jobs are loaded
-    if comparison_id not in comparisons:
+    job = job_store.get(comparison_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Comparison ID not found.")
+    response = {"comparison_id": comparison_id, "status": job["status"], "results": job["summary"]}
+    if comparison_id in active_jobs:
+        response["progress"] = active_jobs[comparison_id].as_dict()
+    return response
+
+# ✅ API to Cancel a Running Job
+@app.post("/compare-job-id/{comparison_id}/cancel")
+async def cancel_comparison(comparison_id: str):
+    if comparison_id not in active_jobs:
+        raise HTTPException(status_code=404, detail="Comparison is not running.")
+    active_jobs[comparison_id].cancel()
+    return {"comparison_id": comparison_id, "status": "cancelling"}
+
+# ✅ API to Fetch the Full Discrepancy Payload of a Job
+@app.get("/compare-job-id/{comparison_id}/results")
+async def get_comparison_results(comparison_id: str):
+    job = job_store.get(comparison_id, include_results=True)
+    if job is None:
         raise HTTPException(status_code=404, detail="Comparison ID not found.")
-    return {"comparison_id": comparison_id, "status": comparisons[comparison_id]["status"], "results": comparisons[comparison_id].get("results")}
+    return {"comparison_id": comparison_id, "status": job["status"], "results": job["results"]}
 
 # ✅ Run FastAPI & Streamlit UI in Separate Processes
 if __name__ == "__main__":
@@ -1,14 +1,45 @@
 import os
 import tempfile
+import threading
+import time
+from typing import Dict
 from fastapi import FastAPI, UploadFile, File, Form, HTTPException
-from fastapi.responses import JSONResponse, FileResponse
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, FileResponse, PlainTextResponse
 import pandas as pd
 from utils.data_processor import DataProcessor
+from utils.metrics import REGISTRY
+from utils.output_store import OutputStore
+from utils.progress import ComparisonCancelled, ProgressReporter
+from utils.result_cache import ResultCache
 
 # ✅ Ensure output directory exists
 OUTPUT_DIR = "output"
 os.makedirs(OUTPUT_DIR, exist_ok=True)
 
+# ✅ Per-job output retention (evicted by age first, then by total disk budget)
+OUTPUT_MAX_AGE_SECONDS = float(os.getenv("OUTPUT_MAX_AGE_SECONDS", 24 * 3600))
+OUTPUT_MAX_BYTES = int(os.getenv("OUTPUT_MAX_BYTES", 1024 ** 3))
+OUTPUT_JANITOR_INTERVAL_SECONDS = float(os.getenv("OUTPUT_JANITOR_INTERVAL_SECONDS", 300))
+
+output_store = OutputStore(
+    os.path.join(OUTPUT_DIR, "jobs"),
+    max_age_seconds=OUTPUT_MAX_AGE_SECONDS,
+    max_total_bytes=OUTPUT_MAX_BYTES
+)
+
+# ✅ Repeated comparisons (same file bytes, rules and filters) are served from this cache
+result_cache = ResultCache(
+    os.getenv("RESULT_CACHE_DIR", os.path.join(OUTPUT_DIR, "cache")),
+    max_bytes=int(os.getenv("RESULT_CACHE_MAX_BYTES", 512 * 1024 ** 2))
+)
+
+# ✅ Runaway comparisons are cancelled after this many seconds (0 disables the limit)
+COMPARISON_MAX_RUNTIME_SECONDS = float(os.getenv("COMPARISON_MAX_RUNTIME_SECONDS", 0)) or None
+
+# ✅ Jobs running in this process, so /status can report progress and /cancel can stop them
+active_jobs: Dict[str, ProgressReporter] = {}
+
 # ✅ MIME types for different file formats
 MIME_TYPES = {
     "csv": "text/csv",
@@ -19,6 +50,82 @@ MIME_TYPES = {
 
 app = FastAPI()
 
+
+@app.on_event("startup")
+def start_output_janitor():
+    output_store.start_janitor(OUTPUT_JANITOR_INTERVAL_SECONDS)
+
+
+@app.on_event("shutdown")
+def stop_output_janitor():
+    output_store.stop_janitor()
+
+
+def write_results(results: pd.DataFrame, output_filepath: str, file_extension: str) -> None:
+    """Write comparison results to disk in the requested format."""
+    if file_extension == "csv":
+        results.to_csv(output_filepath, index=False)
+
+    elif file_extension == "json":
+        results.to_json(output_filepath, orient="records", indent=2)
+
+    elif file_extension == "xlsx":
+        results.to_excel(output_filepath, index=False, engine="openpyxl")
+
+    elif file_extension == "txt":
+        results_text = results.to_string(index=False)  # ✅ FIX: Properly format DataFrame as text
+        with open(output_filepath, "w", encoding="utf-8") as f:
+            f.write(results_text)
+
+
+def run_job(job_id, paths, file_type, file_extension, upload_seconds, upload_bytes, reporter):
+    """Run one comparison job and store its result; always removes the job's temp files."""
+    try:
+        output_store.update_meta(job_id, status="running")
+
+        # ✅ Initialize DataProcessor
+        tool = DataProcessor(paths["directory_config"], paths["job_response"], paths["rules_config"])
+        tool.result_cache = result_cache
+        timings = tool.begin_run(reporter)
+        timings.record("upload", upload_seconds, detail=f"{upload_bytes} bytes")
+
+        # ✅ Read input files into DataFrames and run the comparison
+        results = tool.run_comparison(paths["baseline"], paths["candidate"], file_type)
+
+        # ✅ Save output into the job's own directory
+        output_filename = f"comparison_output.{file_extension}"
+        reporter.update("export", 0)
+        with timings.stage("export", rows=len(results), detail=file_extension):
+            output_store.write_result(
+                job_id,
+                output_filename,
+                lambda path: write_results(results, path, file_extension),
+                meta={"output_format": file_extension, "rows": len(results)}
+            )
+        reporter.finish()
+        output_store.update_meta(job_id, status="completed", error=None, timings=timings.as_dict(), progress=reporter.as_dict())
+        return results, timings
+
+    except ComparisonCancelled as e:
+        output_store.update_meta(job_id, status="cancelled", error=str(e), progress=reporter.as_dict())
+        raise
+
+    except Exception as e:
+        output_store.update_meta(job_id, status="failed", error=str(e), progress=reporter.as_dict())
+        raise
+
+    finally:
+        if active_jobs.get(job_id) is reporter:
+            del active_jobs[job_id]
+
+        # ✅ Cleanup Temporary Files (except output)
+        for file_path in paths.values():
+            try:
+                os.remove(file_path)
+            except Exception as e:
+                print(f"Warning: Failed to delete temp file {file_path} - {str(e)}")
+
+
 @app.post("/compare/")
 async def compare_files(
     baseline_file: UploadFile = File(...),
@@ -27,114 +134,161 @@ async def compare_files(
     job_response: UploadFile = File(...),
     rules_config: UploadFile = File(...),
     file_type: str = Form(...),
-    output_format: str = Form("json")  # Supports: json, csv, xlsx, txt
+    output_format: str = Form("json"),  # Supports: json, csv, xlsx, txt
+    run_async: bool = Form(False)  # Return immediately and poll /status/{job_id}
 ):
-    temp_files = []  # ✅ Store temp file paths for safe deletion
+    paths = {}  # ✅ Temp file paths, deleted once the job finishes
 
-    try:
-        # ✅ Save uploaded files to temporary files
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".xlsx") as temp_baseline:
-            temp_baseline.write(await baseline_file.read())
-            baseline_path = temp_baseline.name
-            temp_files.append(baseline_path)
-
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".xlsx") as temp_candidate:
-            temp_candidate.write(await candidate_file.read())
-            candidate_path = temp_candidate.name
-            temp_files.append(candidate_path)
-
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".json") as temp_directory:
-            temp_directory.write(await directory_config.read())
-            directory_path = temp_directory.name
-            temp_files.append(directory_path)
-
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".json") as temp_job:
-            temp_job.write(await job_response.read())
-            job_path = temp_job.name
-            temp_files.append(job_path)
-
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".json") as temp_rules:
-            temp_rules.write(await rules_config.read())
-            rules_path = temp_rules.name
-            temp_files.append(rules_path)
-
-        # ✅ Initialize DataProcessor
-        tool = DataProcessor(directory_path, job_path, rules_path)
-
-        # ✅ Read Excel files into DataFrames
-        df_baseline = pd.read_excel(baseline_path, engine="openpyxl") if file_type == "Excel" else pd.read_csv(baseline_path)
-        df_candidate = pd.read_excel(candidate_path, engine="openpyxl") if file_type == "Excel" else pd.read_csv(candidate_path)
-
-        # ✅ Run Comparison
-        results = tool.compare_files(df_baseline, df_candidate, file_type)
+    # ✅ Normalise the output format before doing any work
+    file_extension = {"excel": "xlsx", "text": "txt"}.get(output_format.lower(), output_format.lower())
+    if file_extension not in MIME_TYPES:
+        raise HTTPException(status_code=400, detail="Unsupported output format. Use json, csv, xlsx, or txt.")
 
-        # ✅ Save output to requested format
-        output_filename = f"comparison_output.{output_format.lower()}"
-        output_filepath = os.path.join(OUTPUT_DIR, output_filename)
-        file_extension = output_format.lower()
-
-        if file_extension == "csv":
-            results.to_csv(output_filepath, index=False)
+    try:
+        upload_started = time.perf_counter()
+        uploads = {
+            "baseline": (await baseline_file.read(), ".xlsx"),
+            "candidate": (await candidate_file.read(), ".xlsx"),
+            "directory_config": (await directory_config.read(), ".json"),
+            "job_response": (await job_response.read(), ".json"),
+            "rules_config": (await rules_config.read(), ".json"),
+        }
 
-        elif file_extension == "json":
-            results.to_json(output_filepath, orient="records", indent=2)
+        # ✅ Identical inputs map to the same job, different inputs never share an output
+        job_id = output_store.job_id_for(
+            uploads["baseline"][0], uploads["candidate"][0], uploads["rules_config"][0], file_type, file_extension
+        )
+        if run_async and job_id in active_jobs:
+            return JSONResponse(status_code=202, content={
+                "message": "Comparison already running.",
+                "job_id": job_id,
+                "status_url": f"/status/{job_id}"
+            })
 
-        elif file_extension in ["xlsx", "excel"]:
-            results.to_excel(output_filepath, index=False, engine="openpyxl")
+        # ✅ Save uploaded files to temporary files
+        for name, (data, suffix) in uploads.items():
+            with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as temp_file:
+                temp_file.write(data)
+                paths[name] = temp_file.name
+        upload_bytes = len(uploads["baseline"][0]) + len(uploads["candidate"][0])
+        upload_seconds = time.perf_counter() - upload_started
+        del uploads
 
-        elif file_extension in ["txt", "text"]:
-            results_text = results.to_string(index=False)  # ✅ FIX: Properly format DataFrame as text
-            with open(output_filepath, "w", encoding="utf-8") as f:
-                f.write(results_text)
+    except Exception as e:
+        for file_path in paths.values():
+            os.remove(file_path)
+        raise HTTPException(status_code=500, detail=f"Error processing files: {str(e)}")
 
-        else:
-            raise HTTPException(status_code=400, detail="Unsupported output format. Use json, csv, xlsx, or txt.")
+    reporter = ProgressReporter(max_runtime_seconds=COMPARISON_MAX_RUNTIME_SECONDS)
+    active_jobs[job_id] = reporter
+    job_args = (job_id, paths, file_type, file_extension, upload_seconds, upload_bytes, reporter)
 
-        # ✅ Cleanup Temporary Files (except output)
-        for file_path in temp_files:
+    if run_async:
+        def run_in_background():
             try:
-                os.remove(file_path)
+                run_job(*job_args)
             except Exception as e:
-                print(f"Warning: Failed to delete temp file {file_path} - {str(e)}")
+                print(f"Comparison job {job_id} did not complete - {str(e)}")
 
-        # ✅ Return JSON response for non-file formats
-        if file_extension == "json":
-            return JSONResponse(
-                content={
-                    "message": "Comparison completed successfully.",
-                    "output_format": "json",
-                    "data": results.to_dict(orient="records")
-                }
-            )
+        threading.Thread(target=run_in_background, name=f"compare-{job_id}", daemon=True).start()
+        return JSONResponse(status_code=202, content={
+            "message": "Comparison started.",
+            "job_id": job_id,
+            "status_url": f"/status/{job_id}",
+            "cancel_url": f"/cancel/{job_id}",
+            "download_url": f"/download/{job_id}"
+        })
 
-        # ✅ Otherwise, return download URL
+    try:
+        # ✅ Run in a worker thread so the server stays responsive (e.g. to /cancel)
+        results, timings = await run_in_threadpool(run_job, *job_args)
+    except ComparisonCancelled as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error processing files: {str(e)}")
+
+    # ✅ Return JSON response for non-file formats
+    if file_extension == "json":
         return JSONResponse(
             content={
                 "message": "Comparison completed successfully.",
-                "output_format": file_extension,
-                "download_url": f"/download/{output_filename}"
+                "job_id": job_id,
+                "output_format": "json",
+                "download_url": f"/download/{job_id}",
+                "timings": timings.as_dict(),
+                "data": results.to_dict(orient="records")
             }
         )
 
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error processing files: {str(e)}")
+    # ✅ Otherwise, return download URL
+    return JSONResponse(
+        content={
+            "message": "Comparison completed successfully.",
+            "job_id": job_id,
+            "output_format": file_extension,
+            "download_url": f"/download/{job_id}",
+            "timings": timings.as_dict()
+        }
+    )
+
+
+@app.post("/cancel/{job_id}")
+async def cancel_job(job_id: str):
+    """Ask a running comparison to stop; it releases its memory at the next checkpoint."""
+    reporter = active_jobs.get(job_id)
+    if reporter is None:
+        raise HTTPException(status_code=404, detail="No running job with this id")
+    reporter.cancel()
+    return JSONResponse(status_code=202, content={"job_id": job_id, "status": "cancelling", "progress": reporter.as_dict()})
+
+
+@app.get("/status/{job_id}")
+async def job_status(job_id: str):
+    """Return the status of a job: live progress while running, stage timings once done."""
+    try:
+        status = output_store.status(job_id)
+    except ValueError:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    if status == "evicted" and job_id not in active_jobs:
+        raise HTTPException(status_code=410, detail="Result has expired and was removed")
+    meta = output_store.read_meta(job_id)
+    if meta is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    reporter = active_jobs.get(job_id)
+    if reporter is not None:
+        meta["progress"] = reporter.as_dict()
+    return JSONResponse(content=meta)
 
 
-@app.get("/download/{filename}")
-async def download_output(filename: str):
-    """Download the generated output file with correct MIME type."""
-    filepath = os.path.join(OUTPUT_DIR, filename)
+@app.get("/metrics")
+async def metrics():
+    """Expose per-stage and per-rule timings in the Prometheus text format."""
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/download/{job_id}")
+async def download_output(job_id: str):
+    """Download the generated output file of a job with correct MIME type."""
+    try:
+        status = output_store.status(job_id)
+    except ValueError:
+        raise HTTPException(status_code=404, detail="File not found")
 
-    # ✅ Ensure file exists
-    if not os.path.exists(filepath):
+    # ✅ Evicted results are gone for good, unknown jobs were never there
+    if status == "evicted":
+        raise HTTPException(status_code=410, detail="Result has expired and was removed")
+    filepath = output_store.result_path(job_id)
+    if filepath is None:
         raise HTTPException(status_code=404, detail="File not found")
 
     # ✅ Determine MIME type from file extension
-    file_extension = filename.split(".")[-1]
+    file_extension = filepath.suffix.lstrip(".")
     mime_type = MIME_TYPES.get(file_extension, "application/octet-stream")
 
     return FileResponse(
-        path=filepath,
-        filename=filename,
+        path=str(filepath),
+        filename=filepath.name,
         media_type=mime_type
     )
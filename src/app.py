@@ -1,34 +1,52 @@
 import streamlit as st
 import os
-import pandas as pd
-import plotly.express as px
 import json
 from io import BytesIO
-from utils.data_processor import DataProcessor
-import plotly.colors
+import gc
 import shutil
 import tempfile
 
+# ✅ pandas, plotly and the processor are imported by the screens that need them (see below),
+# so the config upload screen starts without loading them; keep utils/__pycache__ for fast restarts
+
 
 
 # Get the absolute path of the current script's directory
 base_dir = os.path.dirname(os.path.abspath(__file__))
-cache_dir = os.path.join(base_dir, "utils", "__pycache__")
-
-# Check if the directory exists before attempting to delete it
-if os.path.exists(cache_dir):
-    shutil.rmtree(cache_dir)
-    print(f"Deleted {cache_dir}")
 
 # **✅ Ensure `st.set_page_config()` is first**
 st.set_page_config(page_title="Discrepancy Dashboard", layout="wide")
 
+# ✅ One result cache per server process, shared by every session and rerun
+@st.cache_resource
+def get_result_cache():
+    from utils.result_cache import ResultCache
+    return ResultCache(
+        os.getenv("RESULT_CACHE_DIR", os.path.join(base_dir, "..", ".comparison_cache")),
+        max_bytes=int(os.getenv("RESULT_CACHE_MAX_BYTES", 512 * 1024 ** 2))
+    )
+
+# ✅ Parsed uploads, keyed by file bytes + reader options, so filter changes never re-parse
+@st.cache_resource
+def get_frame_cache():
+    from utils.frame_cache import FrameCache
+    return FrameCache(max_bytes=int(os.getenv("FRAME_CACHE_MAX_BYTES", 256 * 1024 ** 2)))
+
 # ✅ Clear Cache & Restart Button
 if st.sidebar.button("🔄 Clear Cache & Restart", key="restart_button"):
     st.cache_data.clear()
+    get_frame_cache.clear()
     st.session_state.clear()
     st.rerun()
 
+# ✅ Cancel: the click reruns the script, which interrupts the running comparison
+def request_cancel():
+    st.session_state["comparison_cancelled"] = True
+
+if st.session_state.pop("comparison_cancelled", False):
+    gc.collect()  # ✅ Release the interrupted comparison's DataFrames right away
+    st.warning("⛔ Comparison cancelled.")
+
 # ✅ Ensure session state variables persist
 if "screen" not in st.session_state:
     st.session_state["screen"] = "upload_config"
@@ -41,8 +59,6 @@ if "rules_config_path" not in st.session_state:
     st.session_state["rules_config_path"] = None
 if "selected_filters" not in st.session_state:
     st.session_state["selected_filters"] = {}
-if "filtered_results" not in st.session_state:
-    st.session_state["filtered_results"] = pd.DataFrame()
 
 # ✅ Define required config files before using them
 required_files = {
@@ -139,6 +155,16 @@ if st.session_state["screen"] == "file_type_selection":
 
     st.stop()
 
+# ✅ Heavy imports, only once the comparison screens are reached
+import pandas as pd
+from utils.data_processor import DataProcessor
+from utils.differences import THRESHOLD_KEYS, aggregate_report
+from utils.grid_helpers import ResultPager
+from utils.progress import ComparisonCancelled, ProgressReporter
+
+if "filtered_results" not in st.session_state:
+    st.session_state["filtered_results"] = pd.DataFrame()
+
 # ✅ Step 3: Upload Files for Comparison
 if st.session_state["screen"] == "file_selection":
     st.title("Upload Files for Comparison")
@@ -148,6 +174,11 @@ if st.session_state["screen"] == "file_selection":
 
     if st.button("Run Comparison", key="run_comparison_button"):
         if uploaded_file_baseline and uploaded_file_candidate:
+            progress_bar = st.progress(0, text="Reading files...")
+            st.button("⛔ Cancel Comparison", key="cancel_comparison_button", on_click=request_cancel)
+            reporter = ProgressReporter(
+                callback=lambda percent, stage: progress_bar.progress(int(percent), text=f"{stage.capitalize()}... {percent:.0f}%")
+            )
             try:
                 processor = DataProcessor(
                     st.session_state["directory_config_path"],
@@ -155,32 +186,35 @@ if st.session_state["screen"] == "file_selection":
                     st.session_state["rules_config_path"]
                 )
                 file_type = st.session_state["file_type"]
-                if file_type == "Excel":
-                    df_baseline = pd.read_excel(uploaded_file_baseline, engine="openpyxl")
-                    df_candidate = pd.read_excel(uploaded_file_candidate, engine="openpyxl")
-                elif file_type in ["Text", "DD"]:
-                    delimiter = processor.rules_config.get("text_file_delimiter", ",")
-                    header = 0 if processor.rules_config.get("text_file_contains_header", "yes").lower() == "yes" else None
-                    df_baseline = pd.read_csv(uploaded_file_baseline, delimiter=delimiter, header=header)
-                    df_candidate = pd.read_csv(uploaded_file_candidate, delimiter=delimiter, header=header)
-                else:
+                if file_type not in ["Excel", "Text", "DD"]:
                     st.error("Unsupported file type selected.")
                     st.stop()
 
-                # ✅ Run Comparison
-                st.write("✅ Uploaded files are successfully read as DataFrames.")
-                if df_baseline.empty or df_candidate.empty:
+                # ✅ Run Comparison (a repeat of the same files, rules and filters comes from the cache)
+                processor.result_cache = get_result_cache()
+                processor.frame_cache = get_frame_cache()
+                results = processor.run_comparison(uploaded_file_baseline, uploaded_file_candidate, file_type, progress=reporter)
+                if any(stage["stage"] == "parse" and not stage["rows"] for stage in processor.timings.stages):
                     st.error("One of the uploaded files is empty. Please check your data.")
                     st.stop()
-                results = processor.compare_files(df_baseline, df_candidate, st.session_state["file_type"])
+                st.write("✅ Uploaded files are successfully read as DataFrames.")
+                reporter.finish()
                 st.success("Comparison Completed! Discrepancy report generated.")
 
                 # ✅ Store results in session state
                 st.session_state["results"] = results
                 st.session_state["filtered_results"] = results
+                st.session_state["aggregates"] = processor.aggregates
                 st.session_state["uploaded_file_baseline"] = uploaded_file_baseline
                 st.session_state["uploaded_file_candidate"] = uploaded_file_candidate
-
+                st.session_state["differences"] = processor.differences  # ✅ None when served from the result cache
+                st.session_state["input_keys"] = {
+                    "baseline": processor.input_key(uploaded_file_baseline, file_type),
+                    "candidate": processor.input_key(uploaded_file_candidate, file_type)
+                }
+
+            except ComparisonCancelled as e:
+                st.warning(f"⛔ {str(e)}")
             except Exception as e:
                 st.error(f"Error processing files: {str(e)}")
 
@@ -204,20 +238,26 @@ for rule in rules_config.get("rules", []):
 
     st.sidebar.subheader(f"⚖️ {rule_number} ({rule_type})")
     st.sidebar.write(f"📝 Columns: {rule_columns}")
+    if "decimal_places" in rule:
+        # ✅ Shown, not editable: it sets how values are compared, which the threshold filters never change
+        st.sidebar.caption(f"🔢 Compared exactly to {rule['decimal_places']} decimal places (rules_config.json)")
 
     selected_filters.setdefault(rule_number, {})
 
+    # ✅ Only the thresholds the rules are classified with; other settings (suffixed_numbers, ...) are not filters
     for key, value in rule.items():
         if isinstance(value, (int, float, dict)):
             if isinstance(value, dict):
                 for sub_key, sub_value in value.items():
                     input_key = f"{key}_{sub_key}"
+                    if input_key not in THRESHOLD_KEYS:
+                        continue
                     prev_value = selected_filters[rule_number].get(input_key, sub_value)
                     new_value = st.sidebar.number_input(
                         f"{key} ({sub_key}) for {rule_number}", value=prev_value, key=f"{rule_number}_{input_key}"
                     )
                     selected_filters[rule_number][input_key] = new_value
-            else:
+            elif key in THRESHOLD_KEYS:
                 prev_value = selected_filters[rule_number].get(key, value)
                 new_value = st.sidebar.number_input(
                     f"{key} for {rule_number}", value=prev_value, key=f"{rule_number}_{key}"
@@ -243,25 +283,30 @@ if apply_filter_clicked and "results" in st.session_state:
         st.session_state["job_response_path"],
         st.session_state["rules_config_path"]
     )
-    file_type = st.session_state["file_type"]
-    if file_type == "Excel":
-        df_baseline = pd.read_excel(uploaded_file_baseline, engine="openpyxl")
-        df_candidate = pd.read_excel(uploaded_file_candidate, engine="openpyxl")
-    elif file_type in ["Text", "DD"]:
-        delimiter = processor.rules_config.get("text_file_delimiter", ",")
-        header = 0 if processor.rules_config.get("text_file_contains_header", "yes").lower() == "yes" else None
-        df_baseline = pd.read_csv(uploaded_file_baseline, delimiter=delimiter, header=header)
-        df_candidate = pd.read_csv(uploaded_file_candidate, delimiter=delimiter, header=header)
+    if st.session_state.get("differences") is not None:
+        # ✅ Thresholds only re-bucket the stored difference arrays: no re-read, merge or rule evaluation
+        processor.differences = st.session_state["differences"]
+        updated_results = processor.reclassify(st.session_state["selected_filters"])
     else:
-        st.error("Unsupported file type selected.")
-        st.stop()
-
-    updated_results = processor.compare_files(
-        df_baseline, df_candidate, st.session_state["file_type"], st.session_state["selected_filters"]
-    )
+        processor.frame_cache = get_frame_cache()
+        file_type = st.session_state["file_type"]
+
+        # ✅ Reuse the frames parsed by the last run; only re-read an upload if its frame was evicted
+        frames = {}
+        for side in ["baseline", "candidate"]:
+            frames[side] = processor.frame_cache.get(st.session_state["input_keys"][side])
+            if frames[side] is None:
+                frames[side] = processor.read_input(st.session_state[f"uploaded_file_{side}"], file_type, side)
+        df_baseline, df_candidate = frames["baseline"], frames["candidate"]
+
+        updated_results = processor.compare_files(
+            df_baseline, df_candidate, st.session_state["file_type"], st.session_state["selected_filters"]
+        )
+        st.session_state["differences"] = processor.differences
 
     st.session_state["results"] = updated_results
     st.session_state["filtered_results"] = updated_results
+    st.session_state["aggregates"] = processor.aggregates
     st.rerun()
 
 # **📤 Export Button**
@@ -330,18 +375,26 @@ if not filtered_results.empty and job_response:
 filtered_results = st.session_state.get("filtered_results", pd.DataFrame())
 
 if not filtered_results.empty:
+    import plotly.colors
+    import plotly.express as px
+
     st.header("📊 Key Performance Indicators")
 
-    # ✅ Ensure consistent capitalization in Category column
-    filtered_results["Category"] = filtered_results["Category"].str.upper()
+    # ✅ KPIs and charts come from the small aggregate cube stored with the result, not the full frame
+    aggregates = st.session_state.get("aggregates")
+    if aggregates is None:
+        aggregates = aggregate_report(filtered_results)
+        st.session_state["aggregates"] = aggregates
+    aggregates = aggregates.assign(Category=aggregates["Category"].str.upper())  # ✅ Ensure consistent capitalization
 
     # ✅ Count each unique category dynamically
-    category_counts = filtered_results["Category"].value_counts().to_dict()
+    category_totals = aggregates.groupby("Category", sort=False)["Count"].sum()
+    category_counts = category_totals.sort_values(ascending=False, kind="mergesort").to_dict()
 
 
     # ✅ Identify Missing Rows
-    missing_baseline_count = (filtered_results["Rule Type"] == "Missing in Baseline").sum()
-    missing_candidate_count = (filtered_results["Rule Type"] == "Missing in Candidate").sum()
+    missing_baseline_count = aggregates.loc[aggregates["Rule Type"] == "Missing in Baseline", "Count"].sum()
+    missing_candidate_count = aggregates.loc[aggregates["Rule Type"] == "Missing in Candidate", "Count"].sum()
 
     # ✅ Total metrics to display
     total_metrics = len(category_counts) + 3  # Dynamic categories + threshold + missing rows
@@ -351,7 +404,7 @@ if not filtered_results.empty:
 
     # ✅ Display each category dynamically
     i = 0
-    kpi_columns[i % len(kpi_columns)].metric("🔍 Total Discrepancies", len(filtered_results))
+    kpi_columns[i % len(kpi_columns)].metric("🔍 Total Discrepancies", int(aggregates["Count"].sum()))
     i += 1
     for category, count in category_counts.items():
         kpi_columns[i % len(kpi_columns)].metric(f"{category}", count)
@@ -362,12 +415,12 @@ if not filtered_results.empty:
     kpi_columns[i % len(kpi_columns)].metric("Missing Rows in Candidate", missing_candidate_count)
 
     # ✅ Extract unique categories dynamically
-    unique_categories = filtered_results["Category"].unique()
+    unique_categories = category_totals.index
     # ✅ Generate distinct colors dynamically using Plotly's color palette
     color_palette = plotly.colors.qualitative.Set1  # Choose a color set
     color_map = {category: color_palette[i % len(color_palette)] for i, category in enumerate(unique_categories)}
     # ✅ Count discrepancies per column and category
-    discrepancy_counts = filtered_results.groupby(["Column Name", "Category"]).size().reset_index(name="Count")
+    discrepancy_counts = aggregates.groupby(["Column Name", "Category"])["Count"].sum().reset_index()
     # ✅ Bar Chart: Count of Discrepancies by Column
     st.header("📊 Discrepancy Analysis")
     fig = px.bar(
@@ -384,10 +437,32 @@ if not filtered_results.empty:
 
     # ✅ **Pie Chart: Category Distribution**
     st.header("Discrepancy Distribution")
-    pie_chart = px.pie(filtered_results, names="Category", title="Proportion of Discrepancy Types", hole=0.4)
+    pie_chart = px.pie(category_totals.reset_index(), names="Category", values="Count", title="Proportion of Discrepancy Types", hole=0.4)
     st.plotly_chart(pie_chart, use_container_width=True)
 
-    # ✅ **Filtered Data Table Based on Selected Column**
+    # ✅ **Filtered Data Table Based on Selected Column** (one page at a time, sorted/filtered server-side)
     st.header("Discrepancy Details")
-    st.dataframe(filtered_results)
+    pager = st.session_state.get("result_pager")
+    if pager is None or pager.df is not filtered_results:
+        pager = ResultPager(filtered_results)
+        st.session_state["result_pager"] = pager
+
+    grid_columns = st.columns(4)
+    sort_by = grid_columns[0].selectbox("Sort by", ["(none)"] + list(filtered_results.columns), key="grid_sort_by")
+    ascending = grid_columns[1].radio("Order", ["Ascending", "Descending"], horizontal=True, key="grid_order") == "Ascending"
+    search_column = grid_columns[2].selectbox("Search in", list(filtered_results.columns), key="grid_search_column")
+    search_text = grid_columns[3].text_input("Contains", key="grid_search_text")
+    page_size = st.select_slider("Rows per page", options=[50, 100, 250, 500, 1000], value=100, key="grid_page_size")
+
+    sort_by = None if sort_by == "(none)" else sort_by
+    grid_filters = {search_column: search_text} if search_text else {}
+    total_rows = len(pager.order(sort_by, ascending, grid_filters))
+    page_count = max((total_rows + page_size - 1) // page_size, 1)
+    if st.session_state.get("grid_page", 1) > page_count:
+        st.session_state["grid_page"] = page_count  # ✅ A narrower search can leave fewer pages
+    page_number = st.number_input(f"Page (of {page_count})", min_value=1, max_value=page_count, value=1, step=1, key="grid_page")
+
+    page_rows, _ = pager.page(int(page_number), page_size, sort_by, ascending, grid_filters)
+    st.caption(f"Showing {len(page_rows)} of {total_rows} matching rows ({len(filtered_results)} total)")
+    st.dataframe(page_rows.assign(Category=page_rows["Category"].str.upper()), use_container_width=True)
 
@@ -0,0 +1,79 @@
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+# Modules the first screen (config upload) must not load; they belong to later screens
+HEAVY_MODULES = ["plotly", "utils.data_processor", "utils.grid_helpers"]
+
+# Runs in a fresh interpreter so every sample is a real cold start
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+from streamlit.testing.v1 import AppTest
+import_seconds = time.perf_counter() - start
+before = set(sys.modules)
+start = time.perf_counter()
+at = AppTest.from_file(sys.argv[1], default_timeout=120).run()
+print(json.dumps({
+    "streamlit_import_seconds": import_seconds,
+    "first_screen_seconds": time.perf_counter() - start,
+    "exceptions": [str(e.value) for e in at.exception],
+    "loaded": sorted(set(sys.modules) - before)
+}))
+"""
+
+def get_absolute_path(path):
+    """Convert relative paths to absolute paths."""
+    return os.path.abspath(path)
+
+def run_probe(app_path):
+    """Render the first screen of the dashboard in a new interpreter and return its timings."""
+    env = dict(os.environ, PYTHONPATH=os.path.dirname(app_path))
+    completed = subprocess.run(
+        [sys.executable, "-c", PROBE, app_path], capture_output=True, text=True, env=env, check=True
+    )
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+def main():
+    parser = argparse.ArgumentParser(description="Dashboard cold start benchmark")
+
+    parser.add_argument("--app", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "app.py"), help="Path to the Streamlit app")
+    parser.add_argument("--runs", type=int, default=5, help="Number of cold starts to sample")
+    parser.add_argument("--budget", type=float, default=float(os.getenv("STARTUP_BUDGET_SECONDS", 1.0)), help="Maximum median seconds to render the first screen")
+
+    args = parser.parse_args()
+
+    try:
+        import streamlit  # noqa: F401
+    except ImportError:
+        print("streamlit is not installed; install requirements.txt to run the startup benchmark.")
+        sys.exit(2)
+
+    samples = [run_probe(get_absolute_path(args.app)) for _ in range(args.runs)]
+    first_screen = [sample["first_screen_seconds"] for sample in samples]
+    median = statistics.median(first_screen)
+
+    print(f"streamlit import: {statistics.median(sample['streamlit_import_seconds'] for sample in samples):.3f}s (median)")
+    print(f"first screen:     {median:.3f}s (median), min {min(first_screen):.3f}s, max {max(first_screen):.3f}s over {args.runs} runs")
+
+    failures = []
+    exceptions = samples[-1]["exceptions"]
+    if exceptions:
+        failures.append(f"first screen raised: {exceptions}")
+    heavy = [name for name in HEAVY_MODULES if name in samples[-1]["loaded"]]
+    if heavy:
+        failures.append(f"first screen imported heavy modules: {', '.join(heavy)}")
+    if median > args.budget:
+        failures.append(f"median first screen time {median:.3f}s exceeds the {args.budget:.3f}s budget")
+
+    for failure in failures:
+        print(f"❌ {failure}")
+    if failures:
+        sys.exit(1)
+    print("✅ Startup within budget")
+
+if __name__ == "__main__":
+    main()
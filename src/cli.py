@@ -1,6 +1,11 @@
 import argparse
+import json
 import os
 from utils.data_processor import DataProcessor
+from utils.matrix_runner import MatrixRunner, matrix_pairs
+from utils.incremental import IncrementalStore
+from utils.metrics import profile_table
+from utils.result_cache import ResultCache
 
 def get_absolute_path(path):
     """Convert relative paths to absolute paths."""
@@ -9,17 +14,33 @@ def get_absolute_path(path):
 def main():
     parser = argparse.ArgumentParser(description="Discrepancy Detection CLI Tool")
 
-    parser.add_argument("--baseline", required=True, help="Path to the baseline file")
-    parser.add_argument("--candidate", required=True, help="Path to the candidate file")
+    parser.add_argument("--baseline", help="Path to the baseline file")
+    parser.add_argument("--candidate", help="Path to the candidate file")
     parser.add_argument("--directory_config", required=True, help="Path to directory_config.json")
-    parser.add_argument("--job_response", required=True, help="Path to job_creation_response.json")
+    parser.add_argument("--job_response", help="Path to job_creation_response.json")
     parser.add_argument("--rules_config", required=True, help="Path to rules_config.json")
     parser.add_argument("--output", default="discrepancy_report.csv", help="Output file path")
     parser.add_argument("--file_type", choices=["Excel", "CSV"], default="Excel", help="File type")
     parser.add_argument("--format", choices=["csv", "json", "excel"], default="csv", help="Output format")
+    parser.add_argument("--cache_dir", default=os.getenv("RESULT_CACHE_DIR", ".comparison_cache"), help="Directory of the comparison result cache")
+    parser.add_argument("--no_cache", action="store_true", help="Always recompute instead of using cached results")
+    parser.add_argument("--matrix", action="store_true", help="Compare every environment x label pair of --environment_config")
+    parser.add_argument("--environment_config", help="Path to environment_config.json (with --matrix)")
+    parser.add_argument("--baseline_env", action="append", help="Only use these baseline environments (with --matrix, repeatable)")
+    parser.add_argument("--candidate_env", action="append", help="Only use these candidate environments (with --matrix, repeatable)")
+    parser.add_argument("--output_dir", default="output", help="Directory of the per-pair reports (with --matrix)")
+    parser.add_argument("--max_workers", type=int, help="Maximum parallel worker processes (with --matrix)")
+    parser.add_argument("--incremental_state", default=os.getenv("INCREMENTAL_STATE_DIR"), help="Directory of the day-over-day snapshots; only rows changed since the last labels are re-checked")
+    parser.add_argument("--profile", action="store_true", help="Single comparisons: print per rule/column strategy, time, rows and allocated bytes, and save them as <output>_profile.json (bypasses the result cache)")
 
     args = parser.parse_args()
 
+    if args.matrix:
+        run_matrix(args)
+        return
+    if not (args.baseline and args.candidate and args.job_response):
+        parser.error("--baseline, --candidate and --job_response are required unless --matrix is given")
+
     # Convert paths to absolute paths
     baseline_path = get_absolute_path(args.baseline)
     candidate_path = get_absolute_path(args.candidate)
@@ -30,12 +51,59 @@ def main():
 
     # Initialize tool
     tool = DataProcessor(directory_config_path, job_response_path, rules_config_path)
+    if not args.no_cache:
+        tool.result_cache = ResultCache(get_absolute_path(args.cache_dir), max_bytes=int(os.getenv("RESULT_CACHE_MAX_BYTES", 512 * 1024 ** 2)))
+    if args.incremental_state:
+        tool.incremental = IncrementalStore(get_absolute_path(args.incremental_state))
+    tool.profile = args.profile
 
     # Run comparison
     results = tool.run_comparison(baseline_path, candidate_path, args.file_type)
+    if tool.duplicate_keys is not None:
+        print(f"{tool.duplicate_keys['many_to_many_keys']} identifiers repeat in both files; "
+              f"matched with the '{tool.duplicate_keys['strategy']}' strategy")
+    if tool.churn is not None:
+        print(f"Incremental run against labels {tool.churn['previous_labels']}: baseline {tool.churn['baseline']}, "
+              f"candidate {tool.churn['candidate']}, {tool.churn['recomputed']} keys re-checked")
 
     # Save results
     tool.save_results(results, output_path, args.format)
 
+    if args.profile:
+        profile = tool.timings.as_dict()
+        profile_path = f"{os.path.splitext(output_path)[0]}_profile.json"
+        with open(profile_path, "w") as f:
+            json.dump(profile, f, indent=4)
+        print(profile_table(profile))
+        print(f"Profile saved at {profile_path}")
+
+def run_matrix(args):
+    """Run every requested environment x label comparison and write one report per pair."""
+    if not args.environment_config:
+        raise SystemExit("--environment_config is required with --matrix")
+    file_type = "CSV" if args.file_type == "CSV" else "Excel"
+    runner = MatrixRunner(
+        get_absolute_path(args.directory_config),
+        get_absolute_path(args.rules_config),
+        get_absolute_path(args.environment_config),
+        file_type,
+        args.max_workers
+    )
+    pairs = matrix_pairs(runner.environment_config, args.baseline_env, args.candidate_env)
+    output_dir = get_absolute_path(args.output_dir)
+    os.makedirs(output_dir, exist_ok=True)
+    extension = {"csv": ".csv", "json": ".json", "excel": ".xlsx"}[args.format]
+    writer = DataProcessor(runner.directory_config, None, runner.rules_config)
+
+    def report(name, outcome):
+        if outcome["status"] == "success":
+            writer.save_results(outcome["results"], os.path.join(output_dir, f"discrepancy_report_{name}{extension}"), args.format)
+        else:
+            print(f"Failed {name}: {outcome['error']}")
+
+    outcomes = runner.run(pairs, on_pair_done=report)
+    failed = sum(1 for outcome in outcomes.values() if outcome["status"] != "success")
+    print(f"Matrix finished: {len(outcomes) - failed} succeeded, {failed} failed")
+
 if __name__ == "__main__":
     main()
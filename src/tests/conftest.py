@@ -0,0 +1,5 @@
+import os
+import sys
+
+# ✅ The modules import each other as `utils.x`, as when run from src/
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
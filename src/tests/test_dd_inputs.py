@@ -0,0 +1,50 @@
+import pandas as pd
+
+from utils.data_processor import DataProcessor
+from utils.matrix_runner import MatrixRunner
+
+RULES = {
+    "identifier": "StockCode",
+    "text_file_delimiter": ",",
+    "rules": [
+        {"type": "String_Check", "Rule Number": "S1", "columns": ["Sector"], "Category": "Sector", "description": "sector name"}
+    ]
+}
+
+
+def write_log(path, rows):
+    # ✅ DD .log exports are pipe-delimited with a header row
+    path.write_text("StockCode|Price|Sector\n" + "".join(f"{code}|{price}|{sector}\n" for code, price, sector in rows))
+
+
+def test_read_input_uses_the_pipe_delimiter_of_dd_log_files(tmp_path):
+    path = tmp_path / "20250214.log"
+    write_log(path, [("BHP", 45.9, "Mining"), ("CBA", 103.2, "Banks")])
+    processor = DataProcessor({}, None, RULES)
+
+    df = processor.read_input(str(path), "DD", "baseline")
+
+    assert df.columns.tolist() == ["StockCode", "Price", "Sector"]
+    pd.testing.assert_frame_equal(df, processor.read_file(path, "DD"))
+
+
+def test_matrix_runner_compares_dd_log_files(tmp_path):
+    for env, sector in (("PROD", "Banks"), ("QA", "Finance")):
+        (tmp_path / env).mkdir()
+        write_log(tmp_path / env / "20250214.log", [("BHP", 45.9, "Mining"), ("CBA", 103.2, sector)])
+    directory_config = {
+        "input_base_dir_baseline": str(tmp_path),
+        "input_base_dir_candidate": str(tmp_path),
+        "output_base_dir": str(tmp_path),
+        "input_file_baseline": "{input_base_dir_baseline}/{ENV}/{DD_file_date}.log",
+        "input_file_candidate": "{input_base_dir_candidate}/{ENV}/{DD_file_date}.log",
+        "output_file_result": "{output_base_dir}/{BASELINE_ENV}_{CANDIDATE_ENV}_{rundate}.csv"
+    }
+    pair = {"baseline": {"env": "PROD", "label": "20250214"}, "candidate": {"env": "QA", "label": "20250214"}}
+
+    outcome = MatrixRunner(directory_config, RULES, file_type="DD", max_workers=2).run([pair])["PROD_QA_20250214_20250214"]
+
+    assert outcome["status"] == "success", outcome.get("error")
+    flagged = outcome["results"]
+    assert flagged["StockCode"].tolist() == ["CBA"]
+    assert flagged[["Baseline Field Value", "Candidate Field Value"]].values.tolist() == [["Banks", "Finance"]]
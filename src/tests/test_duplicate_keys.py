@@ -0,0 +1,31 @@
+import pandas as pd
+
+from utils.data_processor import DataProcessor
+
+RULES = {
+    "identifier": "StockCode",
+    "rules": [
+        {"type": "String_Check", "Rule Number": "S1", "columns": ["Sector"], "Category": "Sector", "description": "sector name"}
+    ]
+}
+
+
+def compare(baseline_rows, candidate_rows):
+    processor = DataProcessor({}, None, RULES)
+    columns = ["StockCode", "Sector"]
+    report = processor.compare_files(pd.DataFrame(baseline_rows, columns=columns), pd.DataFrame(candidate_rows, columns=columns), "CSV")
+    return report, processor
+
+
+def test_one_to_many_key_merges_alike_with_or_without_many_to_many_keys():
+    one_to_many, _ = compare([("B", "Banks")], [("B", "Banks"), ("B", "Banks")])
+    assert one_to_many.empty
+
+    # ✅ A repeats in both files, so the occurrence strategy applies; B must still merge one-to-many
+    report, processor = compare(
+        [("A", "Mining"), ("A", "Energy"), ("B", "Banks")],
+        [("A", "Mining"), ("A", "Retail"), ("B", "Banks"), ("B", "Banks")]
+    )
+
+    assert processor.duplicate_keys["many_to_many_keys"] == 1
+    assert report[["StockCode", "Rule Number", "Baseline Field Value", "Candidate Field Value"]].values.tolist() == [["A", "S1", "Energy", "Retail"]]
@@ -0,0 +1,47 @@
+import pandas as pd
+import pytest
+
+from utils.data_processor import DataProcessor
+from utils.incremental import IncrementalStore
+
+RULES = {
+    "identifier": "StockCode",
+    "rules": [
+        {"type": "tolerance_check", "Rule Number": "T1", "columns": ["Close"], "acceptable": 1, "warning": {"min": 1, "max": 5}, "fatal": {"min": 5}, "description": "close price"},
+        {"type": "String_Check", "Rule Number": "S1", "columns": ["Volume"], "Category": "Volume", "description": "volume as text"}
+    ]
+}
+
+
+def job(label):
+    return {"baseline": {"env": "PROD", "label": label}, "candidate": {"env": "QA", "label": label}}
+
+
+def frame(codes, close, volume):
+    return pd.DataFrame({"StockCode": codes, "Close": close, "Volume": volume})
+
+
+def compare(df_baseline, df_candidate, label, store=None):
+    processor = DataProcessor({}, job(label), RULES)
+    processor.incremental = store
+    report = processor.compare_files(df_baseline, df_candidate, "CSV")
+    return report, processor
+
+
+@pytest.mark.parametrize("first, second", [
+    # ✅ A key removed from the candidate makes the candidate columns nullable (int -> float)
+    ((["A", "B", "C"], ["A", "B", "C"]), (["A", "B", "C"], ["A", "B"])),
+    # ✅ A key that was one-sided gets its counterpart, so the columns go back to int
+    ((["A", "B", "C"], ["A", "B"]), (["A", "B", "C"], ["A", "B", "C"]))
+])
+def test_incremental_report_matches_full_run_when_a_key_becomes_one_sided(tmp_path, first, second):
+    store = IncrementalStore(str(tmp_path))
+    close = {"A": 10, "B": 20, "C": 30}
+    for label, (baseline_keys, candidate_keys) in (("d0", first), ("d1", second)):
+        df_baseline = frame(baseline_keys, [close[key] for key in baseline_keys], [100 for _ in baseline_keys])
+        df_candidate = frame(candidate_keys, [close[key] + 3 for key in candidate_keys], [101 for _ in candidate_keys])
+        incremental, processor = compare(df_baseline, df_candidate, label, store)
+        full, _ = compare(df_baseline, df_candidate, label)
+
+        pd.testing.assert_frame_equal(incremental, full)
+    assert processor.churn is None
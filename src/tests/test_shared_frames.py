@@ -0,0 +1,58 @@
+import pandas as pd
+
+from utils.matrix_runner import MatrixRunner
+from utils.shared_frames import SharedFrameStore
+
+RULES = {
+    "identifier": "StockCode",
+    "rules": [
+        {"type": "String_Check", "Rule Number": "S1", "columns": ["MarketCap"], "Category": "Cap", "description": "market cap text"}
+    ]
+}
+
+
+def mixed_frame():
+    # ✅ As read from Excel: one object column holding text and numbers
+    return pd.DataFrame({"StockCode": ["BHP", "CBA", "WES"], "MarketCap": ["1.2M", 350, 2.5], "Close": [45.9, 103.2, 60.1]})
+
+
+def test_mixed_type_column_round_trips_unchanged(tmp_path):
+    df = mixed_frame()
+    with SharedFrameStore(str(tmp_path)) as store:
+        frame = store.put(df)
+        attached = frame.attach()
+
+    assert not frame.is_arrow
+    assert len(frame) == 3
+    pd.testing.assert_frame_equal(attached, df)
+    assert [type(value) for value in attached["MarketCap"]] == [str, int, float]
+
+
+def test_plain_frame_stays_arrow(tmp_path):
+    df = mixed_frame().assign(MarketCap=["1.2M", "350", "2.5"])
+    with SharedFrameStore(str(tmp_path)) as store:
+        frame = store.put(df)
+        pd.testing.assert_frame_equal(frame.attach(), df)
+    assert frame.is_arrow
+
+
+def test_matrix_runner_compares_mixed_type_excel_inputs(tmp_path):
+    for env, cap in (("PROD", 350), ("QA", "350K")):
+        (tmp_path / env).mkdir()
+        mixed_frame().assign(MarketCap=["1.2M", cap, 2.5]).to_excel(tmp_path / env / "20250214.xlsx", index=False)
+    directory_config = {
+        "input_base_dir_baseline": str(tmp_path),
+        "input_base_dir_candidate": str(tmp_path),
+        "output_base_dir": str(tmp_path),
+        "input_file_baseline": "{input_base_dir_baseline}/{ENV}/{DD_file_date}.xlsx",
+        "input_file_candidate": "{input_base_dir_candidate}/{ENV}/{DD_file_date}.xlsx",
+        "output_file_result": "{output_base_dir}/{BASELINE_ENV}_{CANDIDATE_ENV}_{rundate}.xlsx"
+    }
+    pair = {"baseline": {"env": "PROD", "label": "20250214"}, "candidate": {"env": "QA", "label": "20250214"}}
+
+    outcome = MatrixRunner(directory_config, RULES, max_workers=2).run([pair])["PROD_QA_20250214_20250214"]
+
+    assert outcome["status"] == "success", outcome.get("error")
+    flagged = outcome["results"]
+    assert flagged["StockCode"].tolist() == ["CBA"]
+    assert flagged[["Baseline Field Value", "Candidate Field Value"]].values.tolist() == [["350", "350K"]]
@@ -0,0 +1,29 @@
+import pandas as pd
+
+from utils.validator import ValidationEngine, ValidationRule
+
+
+def unique_rule(columns):
+    return ValidationRule(columns, None, f"unique {columns}", rule_type="unique")
+
+
+def test_unique_rule_reports_the_duplicated_keys():
+    df = pd.DataFrame({"StockCode": ["BHP", "CBA", "BHP", "WES", "CBA", "CBA"], "Exchange": ["ASX", "ASX", "ASX", "ASX", "NZX", "NZX"]})
+    # ✅ Chunks of two rows, so every duplicate group spans chunks
+    engine = ValidationEngine([unique_rule(["StockCode"]), unique_rule(["StockCode", "Exchange"])], chunk_rows=2)
+
+    by_code, by_code_and_exchange = engine.validate(df)
+
+    assert [(group["key"], group["positions"]) for group in by_code["duplicate_groups"]] == [("BHP", [0, 2]), ("CBA", [1, 4, 5])]
+    assert [(group["key"], group["positions"]) for group in by_code_and_exchange["duplicate_groups"]] == [(("BHP", "ASX"), [0, 2]), (("CBA", "NZX"), [4, 5])]
+
+
+def test_unique_rule_reports_the_duplicated_keys_of_a_chunk_stream():
+    df = pd.DataFrame({"StockCode": ["BHP", "CBA", "BHP"]}, index=[10, 11, 12])
+    chunks = (df.iloc[start:start + 1] for start in range(len(df)))
+
+    result = ValidationEngine([unique_rule(["StockCode"])]).validate_chunks(chunks)[0]
+
+    assert not result["passed"]
+    assert result["details"] == [10, 12]
+    assert result["duplicate_groups"] == [{"key": "BHP", "count": 2, "positions": [0, 2]}]
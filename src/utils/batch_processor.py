@@ -1,118 +1,297 @@
 from typing import Dict, List, Optional, Tuple
 import pandas as pd
 import asyncio
+import multiprocessing
+import os
+import queue
+import threading
 from pathlib import Path
 import concurrent.futures
+from concurrent.futures.process import BrokenProcessPool
+import gc
 from .data_processor import DataProcessor
+from .progress import ComparisonCancelled, ProgressReporter
+from .shared_frames import SharedFrame
+
+
+def _process_pair_worker(
+    pair_id: str,
+    directory_config,
+    job_response,
+    rules_config,
+    file1,
+    file2,
+    file_type: str,
+    sheet1: Optional[str],
+    sheet2: Optional[str],
+    max_runtime_seconds: Optional[float],
+    progress_queue=None,
+    cancel_event=None
+) -> Dict:
+    """Compare one file pair; runs in a worker process, so it must stay at module level (picklable)
+
+    file1/file2 are paths, or SharedFrame handles of inputs already parsed into shared memory
+    """
+    reporter = ProgressReporter(max_runtime_seconds=max_runtime_seconds)
+
+    def report(percent, stage):
+        if progress_queue is not None:
+            progress_queue.put((pair_id, percent, stage))
+        if cancel_event is not None and cancel_event.is_set():
+            reporter.cancel()  # ✅ Raised by the reporter right after this callback
+
+    reporter.callback = report
+    processor = DataProcessor(directory_config, job_response, rules_config)
+    try:
+        reporter.check()
+        if isinstance(file1, SharedFrame) or isinstance(file2, SharedFrame):
+            df1 = file1.attach() if isinstance(file1, SharedFrame) else processor.read_input(file1, file_type, 'baseline')
+            df2 = file2.attach() if isinstance(file2, SharedFrame) else processor.read_input(file2, file_type, 'candidate')
+            reporter.update("read", 1)
+            discrepancies = processor.compare_files(df1, df2, file_type, progress=reporter)
+        elif sheet1 or sheet2:
+            df1 = pd.read_excel(file1, sheet_name=sheet1 or 0, engine="openpyxl")
+            df2 = pd.read_excel(file2, sheet_name=sheet2 or 0, engine="openpyxl")
+            reporter.update("read", 1)
+            discrepancies = processor.compare_files(df1, df2, file_type, progress=reporter)
+        else:
+            discrepancies = processor.run_comparison(file1, file2, file_type, progress=reporter)
+        reporter.finish()
+    except ComparisonCancelled as e:
+        return {'status': 'cancelled', 'pair_id': pair_id, 'message': str(e)}
+    finally:
+        gc.collect()  # ✅ Release a cancelled/failed pair's frames before the worker takes the next pair
+
+    return {
+        'status': 'success',
+        'pair_id': pair_id,
+        'message': 'Successfully processed file pair',
+        'discrepancies': discrepancies,
+        'aggregates': processor.aggregates,
+        'timings': processor.timings.as_dict()
+    }
+
 
 class BatchProcessor:
-    def __init__(self):
+    def __init__(
+        self,
+        directory_config,
+        job_response,
+        rules_config,
+        max_runtime_seconds: Optional[float] = None,
+        max_workers: Optional[int] = None
+    ):
+        # Config file paths or dictionaries, passed unchanged to DataProcessor in every worker
+        self.directory_config = directory_config
+        self.job_response = job_response
+        self.rules_config = rules_config
         self.results = {}
         self.errors = {}
+        self.cancelled = {}
+        self.reporters: Dict[str, ProgressReporter] = {}
         self.progress = 0
         self.total_pairs = 0
-        
+        self.max_runtime_seconds = max_runtime_seconds
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self._cancel_events = {}
+
+    def _pair_args(self, pair_id: str, pair: Dict[str, str], file_type: str) -> tuple:
+        return (
+            pair_id,
+            self.directory_config,
+            self.job_response,
+            self.rules_config,
+            pair['file1'] if isinstance(pair['file1'], SharedFrame) else str(pair['file1']),
+            pair['file2'] if isinstance(pair['file2'], SharedFrame) else str(pair['file2']),
+            pair.get('file_type', file_type),
+            pair.get('sheet1'),
+            pair.get('sheet2'),
+            self.max_runtime_seconds
+        )
+
+    def _record(self, pair_id: str, outcome: Optional[Dict] = None, error: Optional[BaseException] = None) -> Dict:
+        """Store the outcome of one pair; a failure never affects the other pairs"""
+        self.progress += 1
+        reporter = self.reporters[pair_id]
+        if error is not None or outcome['status'] == 'cancelled':
+            # ✅ A finished pair counts as fully done in the batch percentage, whatever its outcome
+            reporter.percent = 100.0
+            reporter.stage = 'failed' if error is not None else 'cancelled'
+
+        if error is not None:
+            self.errors[pair_id] = str(error) or type(error).__name__
+            return {'status': 'error', 'pair_id': pair_id, 'message': self.errors[pair_id]}
+
+        if outcome['status'] == 'cancelled':
+            self.cancelled[pair_id] = outcome['message']
+            return outcome
+
+        self.results[pair_id] = {
+            'discrepancies': outcome['discrepancies'],
+            'aggregates': outcome['aggregates'],
+            'timings': outcome['timings']
+        }
+        reporter.finish()
+        return {key: outcome[key] for key in ('status', 'pair_id', 'message')}
+
     async def process_file_pair(
-        self, 
-        file1: Path, 
-        file2: Path, 
+        self,
+        file1: Path,
+        file2: Path,
         pair_id: str,
         sheet1: Optional[str] = None,
-        sheet2: Optional[str] = None
+        sheet2: Optional[str] = None,
+        file_type: str = "Excel"
     ) -> Dict:
-        """Process a single pair of files asynchronously"""
+        """Process a single pair of files in a worker thread of this process"""
+        reporter = self.reporters.setdefault(pair_id, ProgressReporter(max_runtime_seconds=self.max_runtime_seconds))
+        self.total_pairs = max(self.total_pairs, len(self.reporters))
+        cancel_event = self._cancel_events.setdefault(pair_id, threading.Event())
+        if reporter.cancelled:
+            cancel_event.set()
+        progress_queue = queue.Queue()
+        args = self._pair_args(pair_id, {'file1': file1, 'file2': file2, 'sheet1': sheet1, 'sheet2': sheet2}, file_type)
         try:
-            processor = DataProcessor()
-            df1, df2 = processor.process_files(file1, file2, sheet1, sheet2)
-            discrepancies = processor.find_discrepancies()
-            validation_results = processor.validate_data()
-            
-            self.results[pair_id] = {
-                'discrepancies': discrepancies,
-                'validation': validation_results,
-                'type_analysis': processor.get_type_analysis()
-            }
-            
-            return {
-                'status': 'success',
-                'pair_id': pair_id,
-                'message': 'Successfully processed file pair'
-            }
-            
+            outcome = await asyncio.to_thread(_process_pair_worker, *args, progress_queue, cancel_event)
         except Exception as e:
-            self.errors[pair_id] = str(e)
-            return {
-                'status': 'error',
-                'pair_id': pair_id,
-                'message': str(e)
-            }
+            return self._record(pair_id, error=e)
         finally:
-            self.progress += 1
-    
+            self._drain(progress_queue)
+            self._cancel_events.pop(pair_id, None)
+        return self._record(pair_id, outcome)
+
+    def cancel(self, pair_id: Optional[str] = None) -> None:
+        """Cancel one pair, or every pair of the batch that has not finished yet"""
+        targets = [pair_id] if pair_id is not None else list(self.reporters)
+        for target in targets:
+            if target in self.reporters:
+                self.reporters[target].cancel()
+            if target in self._cancel_events:
+                self._cancel_events[target].set()
+
     def get_progress(self) -> Tuple[int, int]:
         """Get current progress"""
         return self.progress, self.total_pairs
-    
+
     def get_progress_percentage(self) -> float:
-        """Get progress as percentage"""
+        """Get progress as percentage, including partial progress of running pairs"""
         if self.total_pairs == 0:
             return 0
-        return (self.progress / self.total_pairs) * 100
-    
+        return sum(reporter.percent for reporter in self.reporters.values()) / self.total_pairs
+
+    def _drain(self, progress_queue) -> None:
+        """Apply the progress messages sent by the workers to the pairs' reporters"""
+        while True:
+            try:
+                pair_id, percent, stage = progress_queue.get_nowait()
+            except (queue.Empty, EOFError, OSError):
+                return
+            reporter = self.reporters.get(pair_id)
+            if reporter is not None:
+                reporter.percent = max(reporter.percent, percent)
+                reporter.stage = stage
+
+    def run_batch(self, file_pairs: List[Dict[str, str]], max_concurrent: Optional[int] = None, file_type: str = "Excel") -> List[Dict]:
+        """Run the pairs in a process pool with a sliding window: a new pair starts as soon as one finishes"""
+        window = max(1, min(max_concurrent or self.max_workers, len(file_pairs) or 1))
+        pending = []
+        for index, pair in enumerate(file_pairs):
+            pair_id = pair.get('pair_id', f"pair_{index}")
+            self.reporters.setdefault(pair_id, ProgressReporter(max_runtime_seconds=self.max_runtime_seconds))
+            pending.append((pair_id, pair))
+        self.total_pairs = max(self.total_pairs, len(self.reporters))
+        pending.reverse()
+        outcomes = []
+
+        with multiprocessing.Manager() as manager:
+            progress_queue = manager.Queue()
+            self._cancel_events = {pair_id: manager.Event() for pair_id, _ in pending}
+            for pair_id, event in self._cancel_events.items():
+                if self.reporters[pair_id].cancelled:
+                    event.set()  # ✅ cancel() may have been called before the batch started
+
+            executor = concurrent.futures.ProcessPoolExecutor(max_workers=window)
+            running = {}
+            try:
+                while pending or running:
+                    while pending and len(running) < window:
+                        pair_id, pair = pending.pop()
+                        if self.reporters[pair_id].cancelled:
+                            outcomes.append(self._record(pair_id, {'status': 'cancelled', 'pair_id': pair_id, 'message': 'Comparison was cancelled.'}))
+                            continue
+                        args = self._pair_args(pair_id, pair, file_type)
+                        try:
+                            future = executor.submit(_process_pair_worker, *args, progress_queue, self._cancel_events[pair_id])
+                        except BrokenProcessPool:
+                            # ✅ A crashed worker (e.g. out of memory) broke the pool; retry this pair on a fresh one
+                            executor.shutdown(wait=False, cancel_futures=True)
+                            executor = concurrent.futures.ProcessPoolExecutor(max_workers=window)
+                            future = executor.submit(_process_pair_worker, *args, progress_queue, self._cancel_events[pair_id])
+                        running[future] = pair_id
+
+                    if not running:
+                        continue
+                    done, _ = concurrent.futures.wait(running, timeout=0.2, return_when=concurrent.futures.FIRST_COMPLETED)
+                    self._drain(progress_queue)
+                    for future in done:
+                        pair_id = running.pop(future)
+                        error = future.exception()
+                        outcomes.append(self._record(pair_id, error=error) if error is not None else self._record(pair_id, future.result()))
+            finally:
+                executor.shutdown(wait=True, cancel_futures=True)
+                self._drain(progress_queue)
+                self._cancel_events = {}
+
+        return outcomes
+
     async def process_batch(
         self,
         file_pairs: List[Dict[str, str]],
-        max_concurrent: int = 3
+        max_concurrent: Optional[int] = None,
+        file_type: str = "Excel"
     ) -> Dict:
-        """Process multiple file pairs concurrently"""
+        """Process multiple file pairs in parallel worker processes (up to max_concurrent at a time, all workers by default)"""
         self.progress = 0
         self.total_pairs = len(file_pairs)
         self.results = {}
         self.errors = {}
-        
-        # Create tasks for each file pair
-        tasks = []
-        for pair in file_pairs:
-            task = self.process_file_pair(
-                Path(pair['file1']),
-                Path(pair['file2']),
-                pair.get('pair_id', f"pair_{len(tasks)}"),
-                pair.get('sheet1'),
-                pair.get('sheet2')
-            )
-            tasks.append(task)
-        
-        # Process files in batches
-        results = []
-        for i in range(0, len(tasks), max_concurrent):
-            batch = tasks[i:i + max_concurrent]
-            batch_results = await asyncio.gather(*batch)
-            results.extend(batch_results)
-        
+        self.cancelled = {}
+        # ✅ Register every pair up front so cancel() also reaches pairs that have not started
+        self.reporters = {
+            pair.get('pair_id', f"pair_{index}"): ProgressReporter(max_runtime_seconds=self.max_runtime_seconds)
+            for index, pair in enumerate(file_pairs)
+        }
+
+        # ✅ The pool is driven from a thread so the event loop stays free to serve progress/cancel calls
+        await asyncio.to_thread(self.run_batch, file_pairs, max_concurrent, file_type)
+
         return {
             'total_pairs': self.total_pairs,
             'successful': len(self.results),
             'failed': len(self.errors),
+            'cancelled': len(self.cancelled),
             'results': self.results,
             'errors': self.errors
         }
-    
+
     def get_summary_report(self) -> pd.DataFrame:
         """Generate summary report for all processed pairs"""
         summary_data = []
-        
+
         for pair_id, result in self.results.items():
-            discrepancies = result['discrepancies']
-            validation = result['validation']
-            
+            aggregates = result['aggregates']
+            counts = aggregates.groupby('Rule Type')['Count'].sum() if aggregates is not None else pd.Series(dtype=int)
+            total = int(counts.sum())
+            missing_in_file1 = int(counts.get('Missing in Baseline', 0))
+            missing_in_file2 = int(counts.get('Missing in Candidate', 0))
+
             summary_data.append({
                 'pair_id': pair_id,
-                'total_mismatches': discrepancies['summary']['value_mismatches'],
-                'missing_in_file1': discrepancies['summary']['missing_in_df1'],
-                'missing_in_file2': discrepancies['summary']['missing_in_df2'],
-                'validation_passed': validation['file1']['summary']['passed_rules'],
-                'validation_failed': validation['file1']['summary']['failed_rules'],
-                'total_violations': validation['file1']['summary']['total_violations']
+                'total_discrepancies': total,
+                'total_mismatches': total - missing_in_file1 - missing_in_file2,
+                'missing_in_file1': missing_in_file1,
+                'missing_in_file2': missing_in_file2,
+                'seconds': result['timings']['total_seconds']
             })
-        
-        return pd.DataFrame(summary_data) 
\ No newline at end of file
+
+        return pd.DataFrame(summary_data)
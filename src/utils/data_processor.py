@@ -1,3 +1,4 @@
+import gc
 import json  # ✅ Fix: Ensure JSON module is imported
 import os
 import numpy as np
@@ -5,9 +6,30 @@ import pandas as pd
 from datetime import datetime, timedelta
 from io import BytesIO
 from pathlib import Path
+from .differences import ColumnDifference, ComparisonDifferences, aggregate_report
+from .incremental import churned_keys, merge_reports, order_report
+from .metrics import StageTimings, allocation_tracing
+from .numeric_parser import MISSING_SCALED, parse_numeric, parse_numeric_columns, to_scaled_int
+from .progress import ComparisonCancelled, ProgressReporter
+from .result_cache import ResultCache
+from .reference_sets import REFERENCE_SETS, is_reference_rule
+from .row_hash import RowHashIndex, row_hashes
+from .uniqueness import DuplicateKeyError, UniquenessChecker, estimate_merge
 
 
 class DataProcessor:
+    # Rows per chunk when reading delimited files (one progress/cancel checkpoint each)
+    READ_CHUNK_ROWS = 100_000
+
+    # Rows a merge on a repeated identifier may produce before "cartesian" fails (rules_config duplicate_keys.max_merge_rows)
+    MAX_MERGE_ROWS = 10_000_000
+
+    # Merge column numbering the repeats of an identifier (1st, 2nd, ...) for the "occurrence" strategy
+    OCCURRENCE_COLUMN = "_key_occurrence"
+
+    # Share of matched rows that may differ for rules to run on those rows only (above it, hashing saves nothing)
+    CHANGED_ROWS_MAX_SHARE = 0.5
+
     def __init__(self, directory_config, job_response, rules_config):
         """Initialize with file paths or direct dictionary data."""
         
@@ -29,30 +51,176 @@ class DataProcessor:
                 self.rules_config = json.load(file)
         else:
             self.rules_config = rules_config  # Assume it's already a dictionary
-    
-    def run_comparison(self, baseline_file, candidate_file, file_type="Excel", filters=None):
-        """Run the discrepancy check process."""
-        if isinstance(baseline_file, BytesIO):
-            df_baseline = pd.read_excel(baseline_file, engine="openpyxl") if file_type == "Excel" else pd.read_csv(baseline_file)
-        else:
-            df_baseline = pd.read_excel(baseline_file, engine="openpyxl") if file_type == "Excel" else pd.read_csv(baseline_file)
 
-        if isinstance(candidate_file, BytesIO):
-            df_candidate = pd.read_excel(candidate_file, engine="openpyxl") if file_type == "Excel" else pd.read_csv(candidate_file)
-        else:
-            df_candidate = pd.read_excel(candidate_file, engine="openpyxl") if file_type == "Excel" else pd.read_csv(candidate_file)
+        # ✅ Per-run stage timings (parse, merge, rules, export) and progress/cancellation hook
+        self.timings = StageTimings()
+        self.progress = ProgressReporter()
+        self._run_open = False
+        self._reads_done = 0
+
+        # ✅ Optional ResultCache consulted by run_comparison
+        self.result_cache = None
+
+        # ✅ Optional FrameCache of parsed inputs consulted by read_input
+        self.frame_cache = None
+
+        # ✅ Optional IncrementalStore: compare_files then only re-runs the rules on the keys that
+        # changed since the last labels of the same environments (needs job_response); ``churn``
+        # counts the inserted/deleted/changed keys of the last incremental run
+        self.incremental = None
+        self.churn = None
+
+        # ✅ Column dtypes of the outer merge of the last comparison; one-sided keys make them nullable (int -> float)
+        self.merged_dtypes = None
+
+        # ✅ Profile mode: per rule/column strategy, rows and allocated bytes (tracemalloc) in ``timings``;
+        # results are always recomputed, never served from the result cache
+        self.profile = False
+
+        # ✅ Duplicate-key analysis of the last compare_files call when the identifier repeated in both files
+        self.duplicate_keys = None
+
+        # ✅ Difference arrays of the last compare_files call, reused by reclassify,
+        # and the KPI/chart cube (counts by Category x Column Name x Rule Number) of the last result
+        self.differences = None
+        self.aggregates = None
+
+    def begin_run(self, progress: ProgressReporter = None) -> StageTimings:
+        """Start a fresh timing breakdown that the next compare_files call extends instead of replacing."""
+        self.timings = StageTimings(profile=self.profile)
+        self.progress = progress or ProgressReporter()
+        self._run_open = True
+        self._reads_done = 0
+        return self.timings
+
+    def _run_cancellable(self, func, *args):
+        """Run func; if it is cancelled, drop its frames (and their DataFrames) before re-raising."""
+        try:
+            return func(*args)
+        except ComparisonCancelled as e:
+            reason = str(e)
+        # ✅ The traceback kept the cancelled frames alive until here
+        gc.collect()
+        raise ComparisonCancelled(reason)
+
+    def _read_csv(self, source, **kwargs) -> pd.DataFrame:
+        """Read a delimited file chunk by chunk, reporting progress and honouring cancellation per chunk."""
+        handle = open(source, "rb") if isinstance(source, (str, Path)) else source
+        try:
+            start = handle.tell()
+            handle.seek(0, os.SEEK_END)
+            size = handle.tell() - start
+            handle.seek(start)
+
+            chunks = []
+            with pd.read_csv(handle, chunksize=self.READ_CHUNK_ROWS, **kwargs) as reader:
+                for chunk in reader:
+                    chunks.append(chunk)
+                    fraction = (handle.tell() - start) / size if size else 1.0
+                    self.progress.update("read", self._reads_done + min(fraction, 1.0), 2)
+
+            if not chunks:
+                handle.seek(start)
+                return pd.read_csv(handle, **kwargs)
+            return pd.concat(chunks, ignore_index=True) if len(chunks) > 1 else chunks[0]
+        finally:
+            if handle is not source:
+                handle.close()
+
+    def _finish_read(self, df: pd.DataFrame) -> pd.DataFrame:
+        self._reads_done += 1
+        self.progress.update("read", min(self._reads_done, 2), 2)
+        return df
+
+    # Delimiter of DD files by suffix, as read_dd_file reads them
+    DD_DELIMITERS = {".log": "|", ".csv": ","}
+
+    def reader_options(self, file_type, source=None) -> dict:
+        """Options used to parse an uploaded/local input of the given file type (a path or an upload with a name)."""
+        if file_type == "Excel":
+            return {"reader": "excel", "engine": "openpyxl"}
+        suffix = Path(str(getattr(source, "name", source) or "")).suffix.lower()
+        if file_type == "DD" and suffix in self.DD_DELIMITERS:
+            return {"reader": "csv", "delimiter": self.DD_DELIMITERS[suffix], "header": 0}
+        if file_type in ["Text", "DD"]:
+            return {
+                "reader": "csv",
+                "delimiter": self.rules_config.get("text_file_delimiter", ","),
+                "header": 0 if self.rules_config.get("text_file_contains_header", "yes").lower() == "yes" else None
+            }
+        return {"reader": "csv"}
+
+    def input_key(self, source, file_type) -> str:
+        """Frame cache key of an input: the hash of its bytes plus the reader options."""
+        return self.frame_cache.make_key(ResultCache.hash_source(source), self.reader_options(file_type, source))
+
+    def read_input(self, source, file_type, side):
+        """Read an uploaded/local baseline or candidate file into a DataFrame, via the frame cache when one is set."""
+        options = self.reader_options(file_type, source)
+        cache_key = None
+        if self.frame_cache is not None:
+            cache_key = self.input_key(source, file_type)
+            df = self.frame_cache.get(cache_key)
+            if df is not None:
+                self.timings.record("parse", 0.0, len(df), f"{side} (cached)")
+                return self._finish_read(df)
+
+        if hasattr(source, "seek"):
+            source.seek(0)  # ✅ Uploaded files may already have been read (or hashed)
+        with self.timings.stage("parse", detail=side) as stage:
+            if options["reader"] == "excel":
+                df = pd.read_excel(source, engine=options["engine"])
+            else:
+                df = self._read_csv(source, **{name: value for name, value in options.items() if name != "reader"})
+            stage["rows"] = len(df)
+
+        if cache_key is not None:
+            self.frame_cache.put(cache_key, df)
+        return self._finish_read(df)
+
+    def run_comparison(self, baseline_file, candidate_file, file_type="Excel", filters=None, progress=None):
+        """Run the discrepancy check process, serving repeats from the result cache when one is set."""
+        if not self._run_open:
+            self.begin_run(progress)
+        elif progress is not None:
+            self.progress = progress
+
+        cache_key = None
+        if self.result_cache is not None and not self.profile:
+            with self.timings.stage("cache_lookup") as stage:
+                cache_key = self.result_cache.make_key(baseline_file, candidate_file, self._rules_fingerprint(), filters, file_type)
+                cached = self.result_cache.get(cache_key)
+                stage["rows"] = len(cached["results"]) if cached is not None else 0
+            if cached is not None:
+                self._run_open = False
+                self.progress.update("rules", 1)
+                self.aggregates = cached["aggregates"] if "aggregates" in cached else aggregate_report(cached["results"])
+                return cached["results"]
+
+        with allocation_tracing(self.profile):
+            results = self._run_cancellable(self._run_comparison, baseline_file, candidate_file, file_type, filters)
+
+        if cache_key is not None:
+            with self.timings.stage("cache_store", rows=len(results)):
+                self.result_cache.put(cache_key, {"results": results, "aggregates": self.aggregates})
+        return results
+
+    def _run_comparison(self, baseline_file, candidate_file, file_type, filters):
+        df_baseline = self.read_input(baseline_file, file_type, "baseline")
+        df_candidate = self.read_input(candidate_file, file_type, "candidate")
 
-        results = self.compare_files(df_baseline, df_candidate, file_type, filters)
+        results = self.compare_files(df_baseline, df_candidate, file_type, filters, progress=self.progress)
         return results
 
     def save_results(self, results, output_path, format="csv"):
         """Save results in the required format."""
-        if format == "csv":
-            results.to_csv(output_path, index=False)
-        elif format == "json":
-            results.to_json(output_path, orient="records", indent=4)
-        elif format == "excel":
-            results.to_excel(output_path, index=False)
+        with self.timings.stage("export", rows=len(results), detail=format):
+            if format == "csv":
+                results.to_csv(output_path, index=False)
+            elif format == "json":
+                results.to_json(output_path, orient="records", indent=4)
+            elif format == "excel":
+                results.to_excel(output_path, index=False)
         print(f"Results saved at {output_path}")
 
     def resolve_file_paths(self):
@@ -91,38 +259,60 @@ class DataProcessor:
         delimiter = self.rules_config.get("text_file_delimiter", ",")
         header = 0 if self.rules_config.get("text_file_contains_header", "yes").lower() == "yes" else None
         
-        return pd.read_csv(file_path, delimiter=delimiter, header=header)
+        return self._read_csv(file_path, delimiter=delimiter, header=header)
     
     def read_dd_file(self, file_path: Path) -> pd.DataFrame:
         """Read a DD file (.log or .csv) with appropriate delimiters."""
-        if file_path.suffix.lower() == ".log":
-            return pd.read_csv(file_path, delimiter="|", header=0)
-        elif file_path.suffix.lower() == ".csv":
-            return pd.read_csv(file_path, delimiter=",", header=0)
+        if file_path.suffix.lower() in self.DD_DELIMITERS:
+            return self._read_csv(file_path, delimiter=self.DD_DELIMITERS[file_path.suffix.lower()], header=0)
         else:
             raise ValueError(f"Unsupported DD file format: {file_path.suffix}")
     
     def read_file(self, file_path: Path, file_type: str) -> pd.DataFrame:
         """Determine file type and read accordingly."""
-        if file_type == "Text":
-            return self.read_text_file(file_path)
-        elif file_type == "DD":
-            return self.read_dd_file(file_path)
-        elif file_type == "Excel" and file_path.suffix.lower() in [".xlsx", ".xls"]:
-            return pd.read_excel(file_path, engine="openpyxl")
-        else:
-            raise ValueError(f"Unsupported file type: {file_path.suffix}")
+        with self.timings.stage("parse", detail=file_path.name) as stage:
+            if file_type == "Text":
+                df = self.read_text_file(file_path)
+            elif file_type == "DD":
+                df = self.read_dd_file(file_path)
+            elif file_type == "Excel" and file_path.suffix.lower() in [".xlsx", ".xls"]:
+                df = pd.read_excel(file_path, engine="openpyxl")
+            else:
+                raise ValueError(f"Unsupported file type: {file_path.suffix}")
+            stage["rows"] = len(df)
+        return self._finish_read(df)
   
 
-    def compare_files(self, df_baseline=None, df_candidate=None, file_type="Excel", filters=None):
-        """Compare Baseline and Candidate files using dynamically defined rules from rules_config.json."""
-        
-        if filters is None:
-            filters = {}
-
+    def compare_files(self, df_baseline=None, df_candidate=None, file_type="Excel", filters=None, progress=None):
+        """Compare Baseline and Candidate files using dynamically defined rules from rules_config.json.
+
+        ``progress`` (a ProgressReporter) is updated per read chunk and per rule/column;
+        cancelling it raises ComparisonCancelled and releases the intermediate frames.
+        """
+        # ✅ Continue the breakdown started by run_comparison, otherwise start a new one
+        if not self._run_open:
+            self.begin_run(progress)
+        elif progress is not None:
+            self.progress = progress
+        self._run_open = False
+
+        with allocation_tracing(self.profile):
+            if self.incremental is not None and self.job_response:
+                return self._run_cancellable(self._compare_incremental, df_baseline, df_candidate, file_type, filters)
+            return self._run_cancellable(self._compare_frames, df_baseline, df_candidate, file_type, filters)
+
+    def _rules_fingerprint(self) -> dict:
+        """rules_config plus the content hash of every reference file it names, so cached results follow those files."""
+        reference_files = REFERENCE_SETS.fingerprint(self.rules_config.get("rules", []))
+        return {**self.rules_config, "reference_files": reference_files} if reference_files else self.rules_config
+
+    def _load_frames(self, df_baseline, df_candidate, file_type):
+        """Baseline and candidate frames with stripped column names, and the key column."""
         # ✅ Load DataFrames from Uploaded Files
         if df_baseline is not None and df_candidate is not None:
-            df_prod, df_qa = df_baseline.copy(), df_candidate.copy()
+            # ✅ Shallow copies: the inputs are never modified in place, and frames attached from
+            # shared memory (or the frame cache) stay shared instead of being duplicated per run
+            df_prod, df_qa = df_baseline.copy(deep=False), df_candidate.copy(deep=False)
         else:
             input_file_baseline, input_file_candidate, _ = self.resolve_file_paths()
             df_prod = self.read_file(Path(input_file_baseline), file_type)
@@ -131,127 +321,355 @@ class DataProcessor:
         df_prod.columns = df_prod.columns.str.strip()
         df_qa.columns = df_qa.columns.str.strip()
 
+        # ✅ Value columns holding text like "1.2M" / "350K" become numbers for every rule
+        suffixed_columns = self.rules_config.get("suffixed_numbers", [])
+        if suffixed_columns:
+            df_prod = parse_numeric_columns(df_prod, suffixed_columns)
+            df_qa = parse_numeric_columns(df_qa, suffixed_columns)
+
         key_column = self.rules_config["identifier"]
 
         if key_column not in df_prod.columns or key_column not in df_qa.columns:
             raise ValueError(f"Key identifier '{key_column}' not found in both datasets.")
+        return df_prod, df_qa, key_column
+
+    def _compare_incremental(self, df_baseline, df_candidate, file_type, filters):
+        """Reuse the lineage's last report, re-running the rules only on keys inserted, deleted or changed since."""
+        df_prod, df_qa, key_column = self._load_frames(df_baseline, df_candidate, file_type)
+        settings = ResultCache.canonical_hash({"rules_config": self._rules_fingerprint(), "filters": filters or {}, "file_type": file_type})
+
+        with self.timings.stage("row_hash", rows=len(df_prod) + len(df_qa)):
+            baseline_index = RowHashIndex.from_frame(df_prod, key_column)
+            candidate_index = RowHashIndex.from_frame(df_qa, key_column)
+            snapshot = self.incremental.load(self.job_response, settings)
+            plan = churned_keys(snapshot, baseline_index, candidate_index) if snapshot is not None else None
+
+        if plan is not None:
+            recompute = plan.pop("keys")
+            self.churn = dict(plan, recomputed=len(recompute), previous_labels=snapshot["labels"])
+            discrepancies_df = self._compare_frames(
+                df_prod[df_prod[key_column].isin(recompute)], df_qa[df_qa[key_column].isin(recompute)], file_type, filters
+            )
+            if self.merged_dtypes != snapshot["merged_dtypes"]:
+                # ✅ Keys became or stopped being one-sided, so the merged columns changed dtype (int <-> float):
+                # the snapshot rows would display and compare differently from a full run
+                plan = None
+            else:
+                with self.timings.stage("incremental_merge") as stage:
+                    discrepancies_df = merge_reports(snapshot["report"], discrepancies_df, recompute, key_column)
+                    discrepancies_df = order_report(discrepancies_df, self.rules_config["rules"], key_column, df_prod[key_column].dtype)
+                    self.aggregates = aggregate_report(discrepancies_df)
+                    # ✅ The difference arrays only cover the recomputed rows, so they cannot be reclassified
+                    self.differences = None
+                    stage["rows"] = len(discrepancies_df)
+
+        if plan is None:
+            # ✅ First run of the lineage, other rules/filters, new columns, duplicate keys or new merged dtypes: full comparison
+            self.churn = None
+            discrepancies_df = self._compare_frames(df_prod, df_qa, file_type, filters)
+
+        with self.timings.stage("snapshot_store", rows=len(discrepancies_df)):
+            self.incremental.save(self.job_response, settings, baseline_index, candidate_index, self.merged_dtypes, discrepancies_df)
+        return discrepancies_df
+
+    def _compare_frames(self, df_baseline, df_candidate, file_type, filters):
+        if filters is None:
+            filters = {}
 
-        df_merged = df_prod.merge(
-            df_qa, on=key_column, suffixes=("_baseline", "_candidate"), how="outer", indicator=True
-        )
+        df_prod, df_qa, key_column = self._load_frames(df_baseline, df_candidate, file_type)
 
-        df_merged = df_merged[df_merged["_merge"] == "both"]
+        with self.timings.stage("key_check", rows=len(df_prod) + len(df_qa)):
+            merge_keys, keyed_prod, keyed_qa = self._merge_keys(df_prod, df_qa, key_column)
 
-        # ✅ Identify Missing Rows Before Applying Rules
-        extra_rows_candidate = df_qa[~df_qa[key_column].isin(df_prod[key_column])]
-        extra_rows_baseline = df_prod[~df_prod[key_column].isin(df_qa[key_column])]
+        with self.timings.stage("merge") as stage:
+            df_merged = keyed_prod.merge(
+                keyed_qa, on=merge_keys, suffixes=("_baseline", "_candidate"), how="outer", indicator=True
+            )
+
+            self.merged_dtypes = df_merged.dtypes.astype(str).to_dict()
+            df_merged = df_merged[df_merged["_merge"] == "both"]
+            stage["rows"] = len(df_merged)
+        self.progress.update("merge", 1)
 
-        discrepancies = []
+        # ✅ Identify Missing Rows Before Applying Rules
+        with self.timings.stage("missing_rows", rows=len(df_prod) + len(df_qa)):
+            if len(merge_keys) == 1:
+                extra_rows_candidate = df_qa[~df_qa[key_column].isin(df_prod[key_column])]
+                extra_rows_baseline = df_prod[~df_prod[key_column].isin(df_qa[key_column])]
+            else:
+                # ✅ Surplus repeats of a key are missing rows too
+                baseline_keys = pd.MultiIndex.from_frame(keyed_prod[merge_keys])
+                candidate_keys = pd.MultiIndex.from_frame(keyed_qa[merge_keys])
+                extra_rows_candidate = df_qa[~candidate_keys.isin(baseline_keys)]
+                extra_rows_baseline = df_prod[~baseline_keys.isin(candidate_keys)]
+
+        # ✅ Matched rows whose rule columns hash the same on both sides cannot differ: rules skip them
+        with self.timings.stage("row_hash", rows=len(df_merged)) as stage:
+            changed = self._changed_rows(df_merged, df_prod, df_qa, key_column)
+            if changed is not None:
+                stage["detail"] = f"{len(changed)} of {len(df_merged)} matched rows differ"
+
+        differences = ComparisonDifferences(key_column, df_merged[key_column], [])
+        # ✅ Date columns parsed by a date rule, reused by every other date rule on the same column
+        parsed_dates = {}
+        blocks = []
+        total_checks = sum(len(rule["columns"]) for rule in self.rules_config["rules"])
+        checks_done = 0
 
-        # ✅ Apply Filters Dynamically If Provided
         for rule in self.rules_config["rules"]:
             rule_number = rule.get("Rule Number", "N/A")
             rule_type = rule["type"]
-            rule_description = rule["description"]
-
-            # ✅ Fetch updated filter values or use default values from rules_config
-            updated_acceptable = filters.get(rule_number, {}).get("acceptable", rule.get("acceptable", 0))
-            updated_warning_min = filters.get(rule_number, {}).get("warning_min", rule.get("warning", {}).get("min", updated_acceptable))
-            updated_warning_max = filters.get(rule_number, {}).get("warning_max", rule.get("warning", {}).get("max", float("inf")))
-            updated_fatal_min = filters.get(rule_number, {}).get("fatal_min", rule.get("fatal", {}).get("min", float("inf")))
-            updated_threshold = filters.get(rule_number, {}).get("threshold", rule.get("threshold", 0.1))
-            updated_days = filters.get(rule_number, {}).get("days", rule.get("days", 0))
 
             for col in rule["columns"]:
+                self.progress.update("rules", checks_done, total_checks)
+                checks_done += 1
                 col_baseline = f"{col}_baseline"
                 col_candidate = f"{col}_candidate"
 
-                if col_baseline in df_merged.columns and col_candidate in df_merged.columns:
-                    df_merged["rule_violation"] = 0
-                    df_merged["classification"] = "ACCEPTABLE"
-                    is_string_column = df_merged[col_baseline].dtype == object or df_merged[col_candidate].dtype == object
-                    has_only_category = "Category" in rule and not any(k in rule for k in ["threshold", "acceptable", "warning", "fatal", "days"])
-
-                    # ✅ Apply Tolerance Rules
-                    if "acceptable" in rule or "warning" in rule or "fatal" in rule:
-                        df_merged["rule_violation"] = abs(pd.to_numeric(df_merged[col_candidate], errors="coerce") - pd.to_numeric(df_merged[col_baseline], errors="coerce"))
-                        df_merged.loc[df_merged["rule_violation"] >= updated_fatal_min, "classification"] = "FATAL"
-                        df_merged.loc[(df_merged["rule_violation"] >= updated_warning_min) & (df_merged["rule_violation"] < updated_warning_max), "classification"] = "WARNING"
-
-                    # ✅ Apply Threshold Rules
-                    elif "threshold" in rule:
-                        df_merged["rule_violation"] = abs(pd.to_numeric(df_merged[col_candidate], errors="coerce") - pd.to_numeric(df_merged[col_baseline], errors="coerce")) >= updated_threshold
-                        df_merged.loc[df_merged["rule_violation"], "classification"] = rule.get("Category", "None")
-
-                    # ✅ Apply Date Rules
-                    elif any("date" in col.lower() for col in rule["columns"]) or any(pd.api.types.is_datetime64_any_dtype(df_merged[col_baseline]) for col in rule["columns"]):
-                        # ✅ Convert to date only (drop time part)
-                        df_merged[col_baseline] = pd.to_datetime(df_merged[col_baseline], errors="coerce").dt.date
-                        df_merged[col_candidate] = pd.to_datetime(df_merged[col_candidate], errors="coerce").dt.date
-                        df_merged["Trade_Date_Diff"] = (pd.to_datetime(df_merged[col_candidate]) - pd.to_datetime(df_merged[col_baseline])).dt.days
-                        df_merged["Trade_Date_Diff"] = df_merged["Trade_Date_Diff"].fillna(0).astype(int)
-                        df_merged.loc[df_merged["Trade_Date_Diff"].abs() > updated_days, "classification"] = rule.get("Category", "None")
-                    # elif any("date" in col.lower() for col in rule["columns"]) or any(pd.api.types.is_datetime64_any_dtype(df_merged[col_baseline]) for col in rule["columns"]):
-                    #     df_merged["Trade_Date_Diff"] = (df_merged[col_candidate] - df_merged[col_baseline]).dt.days
-                    #     df_merged["Trade_Date_Diff"] = df_merged["Trade_Date_Diff"].fillna(0).astype(int)
-                    #     df_merged.loc[df_merged["Trade_Date_Diff"].abs() > updated_days, "classification"] = rule.get("Category", "None")
-                    
-                    elif rule_type == "ignore_differences":
-                        continue
-                    elif is_string_column and has_only_category:
-                        category = rule.get("Category", "None")
-                        df_merged[col_baseline] = df_merged[col_baseline].astype(str).str.strip()
-                        df_merged[col_candidate] = df_merged[col_candidate].astype(str).str.strip()
-
-                        df_merged["String_Mismatch"] = df_merged.apply(lambda row: row[col_baseline] != row[col_candidate], axis=1)
-                        df_merged.loc[df_merged["String_Mismatch"], "classification"] = rule.get("Category", "None")
-
-                    # ✅ Collect Discrepancies
-                    for _, row in df_merged[df_merged["classification"] != "ACCEPTABLE"].iterrows():
-                        discrepancies.append({
-                            key_column: row[key_column],
-                            "Column Name": col,
-                            "Rule Type": rule_type,
-                            "Category": row["classification"],
-                            "Rule Number": rule_number,
-                            "Description": rule_description,
-                            "Baseline Field Value": row[col_baseline],
-                            "Candidate Field Value": row[col_candidate]
-                        })
-
-        # ✅ Include Missing Rows
-        for _, row in extra_rows_baseline.iterrows():
-            discrepancies.append({
-                key_column: row[key_column],
-                "Column Name": "ALL",
-                "Rule Type": "Missing in Candidate",
-                "Category": "INFO",
-                "Rule Number": "Missing_Row_Baseline",
-                "Description": "Row exists in baseline but is missing in candidate.",
-                "Baseline Field Value": row.to_dict(),
-                "Candidate Field Value": "MISSING"
-            })
-
-        for _, row in extra_rows_candidate.iterrows():
-            discrepancies.append({
-                key_column: row[key_column],
-                "Column Name": "ALL",
-                "Rule Type": "Missing in Baseline",
-                "Category": "INFO",
-                "Rule Number": "Missing_Row_Candidate",
-                "Description": "Row exists in candidate but is missing in baseline.",
-                "Baseline Field Value": "MISSING",
-                "Candidate Field Value": row.to_dict()
-            })
-
-        # Convert discrepancies to DataFrame
-        discrepancies_df = pd.DataFrame(discrepancies)
-
-        # ✅ Ensure 'Category' Column Exists
-        if "Category" not in discrepancies_df.columns:
-            discrepancies_df["Category"] = "UNKNOWN"
-
-        # ✅ Convert all columns to strings to avoid serialization issues
-        discrepancies_df = discrepancies_df.astype(str)
+                # ✅ Referential rules may also check the identifier itself (same value on both sides)
+                if (col_baseline in df_merged.columns and col_candidate in df_merged.columns) or (col == key_column and is_reference_rule(rule)):
+                    with self.timings.rule(rule_number, rule_type, col, rows=len(df_merged)) as timing:
+                        if changed is not None and not is_reference_rule(rule):
+                            difference = self._changed_difference(df_merged, rule, col, changed, parsed_dates, filters)
+                        else:
+                            difference = self._column_difference(df_merged, rule, col, parsed_dates)
+                        if difference is None:
+                            timing["strategy"] = "skipped (ignored)" if rule_type == "ignore_differences" else "skipped (no check applies)"
+                            continue
+                        timing["strategy"] = difference.strategy
+                        if difference.rows is not None:
+                            timing["strategy"] += ", changed rows only"
+                            timing["rows"] = len(difference.rows)
+                        differences.add(difference)
+
+                        # ✅ Apply Filters Dynamically If Provided (thresholds only re-bucket the stored differences)
+                        positions, categories = difference.classify(filters)
+                        timing["flagged"] = len(positions)
+                        blocks.append(differences.report_block(difference, positions, categories))
+                elif self.profile:
+                    self.timings.skip(rule_number, rule_type, col, "skipped (column not in both files)")
+
+        self.progress.update("rules", checks_done, total_checks)
+
+        with self.timings.stage("build_report") as stage:
+            # ✅ Include Missing Rows
+            for _, row in extra_rows_baseline.iterrows():
+                differences.missing_rows.append({
+                    key_column: row[key_column],
+                    "Column Name": "ALL",
+                    "Rule Type": "Missing in Candidate",
+                    "Category": "INFO",
+                    "Rule Number": "Missing_Row_Baseline",
+                    "Description": "Row exists in baseline but is missing in candidate.",
+                    "Baseline Field Value": row.to_dict(),
+                    "Candidate Field Value": "MISSING"
+                })
+
+            for _, row in extra_rows_candidate.iterrows():
+                differences.missing_rows.append({
+                    key_column: row[key_column],
+                    "Column Name": "ALL",
+                    "Rule Type": "Missing in Baseline",
+                    "Category": "INFO",
+                    "Rule Number": "Missing_Row_Candidate",
+                    "Description": "Row exists in candidate but is missing in baseline.",
+                    "Baseline Field Value": "MISSING",
+                    "Candidate Field Value": row.to_dict()
+                })
+
+            discrepancies_df = differences.build_report(blocks)
+            self.aggregates = differences.build_aggregates(blocks)
+            stage["rows"] = len(discrepancies_df)
+
+        self.differences = differences
+        return discrepancies_df
+
+    def _changed_rows(self, df_merged, df_prod, df_qa, key_column):
+        """Positions of matched rows whose rule columns differ between the sides, or None to evaluate every row."""
+        columns = []
+        for rule in self.rules_config["rules"]:
+            if is_reference_rule(rule):
+                continue
+            for col in rule["columns"]:
+                if col != key_column and col not in columns and f"{col}_baseline" in df_merged.columns and f"{col}_candidate" in df_merged.columns:
+                    columns.append(col)
+        if not columns or not len(df_merged):
+            return None
+
+        hashes = []
+        for suffix, source in (("_baseline", df_prod), ("_candidate", df_qa)):
+            side = df_merged[[f"{col}{suffix}" for col in columns]]
+            side.columns = columns
+            # ✅ The outer merge upcasts columns of the side with unmatched rows (int -> float); matched rows
+            # hold the source values, so restore the source dtypes before hashing
+            restore = {col: source[col].dtype for col in columns if col in source.columns and side[col].dtype != source[col].dtype}
+            if restore:
+                try:
+                    side = side.astype(restore)
+                except (TypeError, ValueError):
+                    pass
+            hashes.append(row_hashes(side))
+        changed = np.flatnonzero(hashes[0] != hashes[1])
+        return changed if len(changed) <= self.CHANGED_ROWS_MAX_SHARE * len(df_merged) else None
+
+    def _changed_difference(self, df_merged, rule, col, changed, parsed_dates, filters):
+        """Evaluate one rule on one column of the changed rows only; on every row if the thresholds flag identical values."""
+        columns = [f"{col}_baseline", f"{col}_candidate"]
+        difference = self._column_difference(df_merged[columns].iloc[changed], rule, col, parsed_dates)
+        if difference is None:
+            return None
+        all_rows = df_merged[columns]
+        difference.rows = changed
+        difference.complete = lambda: self._column_difference(all_rows, rule, col)
+        return difference.complete() if difference.needs_all_rows(filters) else difference
+
+    def _merge_keys(self, df_prod, df_qa, key_column):
+        """Merge keys and frames to merge, guarding against a many-to-many merge on a repeated identifier.
+
+        rules_config ``duplicate_keys`` picks what happens when a key repeats in both files:
+        ``occurrence`` (default) matches the n-th repeat with the n-th repeat of the keys repeated
+        in both files (other keys merge as usual), ``fail`` raises DuplicateKeyError and
+        ``cartesian`` merges every pair, up to ``max_merge_rows``.
+        """
+        self.duplicate_keys = None
+        # ✅ The usual case, a unique identifier on either side, costs one hash table pass per file
+        if UniquenessChecker(key_column).check_frame(df_prod)["unique"] or UniquenessChecker(key_column).check_frame(df_qa)["unique"]:
+            return [key_column], df_prod, df_qa
+
+        options = self.rules_config.get("duplicate_keys", {})
+        strategy = options.get("strategy", "occurrence")
+        max_merge_rows = options.get("max_merge_rows", self.MAX_MERGE_ROWS)
+        if strategy not in ("occurrence", "fail", "cartesian"):
+            raise ValueError(f"Unknown duplicate_keys strategy '{strategy}'; use occurrence, fail or cartesian.")
+
+        estimate = estimate_merge(df_prod[key_column], df_qa[key_column])
+        if not estimate["many_to_many_keys"]:
+            return [key_column], df_prod, df_qa
+        self.duplicate_keys = dict(estimate, key_column=key_column, strategy=strategy, max_merge_rows=max_merge_rows)
+
+        if strategy == "fail" or (strategy == "cartesian" and estimate["merged_rows"] > max_merge_rows):
+            worst = ", ".join(f"{entry['key']} ({entry['baseline']} x {entry['candidate']})" for entry in estimate["top_keys"][:3])
+            raise DuplicateKeyError(
+                f"Key identifier '{key_column}' repeats in both datasets ({estimate['many_to_many_keys']} keys, e.g. {worst}); "
+                f"merging would produce {estimate['merged_rows']:,} rows. Set duplicate_keys.strategy to 'occurrence' "
+                f"to match repeats in file order.",
+                self.duplicate_keys
+            )
+        if strategy == "cartesian":
+            return [key_column], df_prod, df_qa
+
+        # ✅ Only keys repeated in both files are numbered; every other key keeps occurrence 0 and
+        # merges exactly as without the strategy (one-to-one or one-to-many)
+        prod_counts = df_prod[key_column].value_counts(dropna=False)
+        qa_counts = df_qa[key_column].value_counts(dropna=False)
+        many_to_many = prod_counts.index[prod_counts > 1].intersection(qa_counts.index[qa_counts > 1])
+
+        def occurrences(df):
+            numbers = df.groupby(key_column, dropna=False, sort=False).cumcount()
+            return numbers.where(df[key_column].isin(many_to_many), 0)
+
+        keyed_prod = df_prod.assign(**{self.OCCURRENCE_COLUMN: occurrences(df_prod)})
+        keyed_qa = df_qa.assign(**{self.OCCURRENCE_COLUMN: occurrences(df_qa)})
+        return [key_column, self.OCCURRENCE_COLUMN], keyed_prod, keyed_qa
+
+    @staticmethod
+    def _parse_dates(values: pd.Series) -> pd.Series:
+        """Day-precision datetime64 of a column (local dates of tz-aware values); text is parsed once per distinct value."""
+        if pd.api.types.is_datetime64_any_dtype(values.dtype):
+            parsed, codes = values, None
+        else:
+            codes, uniques = pd.factorize(values)
+            # ✅ The format is inferred from the first value, as when parsing the whole column
+            parsed = pd.to_datetime(pd.Series(uniques, dtype=object), errors="coerce")
+        if isinstance(parsed.dtype, pd.DatetimeTZDtype):
+            parsed = parsed.dt.tz_localize(None)
+        dates = parsed.to_numpy(dtype="datetime64[ns]").astype("datetime64[D]")
+        if codes is not None:
+            # ✅ Broadcast the distinct dates through the codes (-1, a missing value, picks the appended NaT)
+            dates = np.append(dates, np.datetime64("NaT", "D"))[codes]
+        return pd.Series(dates.astype("datetime64[ns]"), index=values.index, name=values.name)
+
+    def _column_difference(self, df_merged, rule, col, parsed_dates=None):
+        """Evaluate one rule on one column into a row-aligned difference array (None if nothing can be flagged)."""
+        col_baseline = f"{col}_baseline"
+        col_candidate = f"{col}_candidate"
+
+        # ✅ Referential Rules: values missing from a reference file / allowed list (hashed set probe)
+        if is_reference_rule(rule):
+            baseline = df_merged[col_baseline] if col_baseline in df_merged.columns else df_merged[col]
+            candidate = df_merged[col_candidate] if col_candidate in df_merged.columns else df_merged[col]
+            reference = REFERENCE_SETS.get(rule)
+            side = rule.get("side", "candidate")
+            values = np.zeros(len(df_merged), dtype=bool)
+            if side in ("baseline", "both"):
+                values |= ~reference.contains(baseline)
+            if side in ("candidate", "both"):
+                values |= ~reference.contains(candidate)
+            return ColumnDifference(rule, col, "reference", values, baseline, candidate, f"hashed set probe ({len(reference):,} values, {side})")
+        is_string_column = df_merged[col_baseline].dtype == object or df_merged[col_candidate].dtype == object
+        has_only_category = "Category" in rule and not any(k in rule for k in ["threshold", "acceptable", "warning", "fatal", "days"])
+
+        # ✅ Tolerance & Threshold Rules: absolute numeric delta
+        if any(k in rule for k in ["acceptable", "warning", "fatal", "threshold"]):
+            kind = "tolerance" if any(k in rule for k in ["acceptable", "warning", "fatal"]) else "threshold"
+            # ✅ "suffixed_numbers": true also reads K/M/B/T text ("1.2M"), which pd.to_numeric turns into NaN
+            to_number = parse_numeric if rule.get("suffixed_numbers") else lambda values: pd.to_numeric(values, errors="coerce")
+            source = f"parsed from {'K/M/B/T text' if rule.get('suffixed_numbers') else 'text'}" if is_string_column else "native"
+            if "decimal_places" not in rule:
+                delta = abs(to_number(df_merged[col_candidate]) - to_number(df_merged[col_baseline]))
+                values = delta.to_numpy()
+                strategy = f"numeric delta ({source})"
+            else:
+                # ✅ "decimal_places": n compares exact int64 multiples of 10 ** -n instead of float64 deltas
+                decimal_places = int(rule["decimal_places"])
+                baseline = to_scaled_int(to_number(df_merged[col_baseline]), decimal_places)
+                candidate = to_scaled_int(to_number(df_merged[col_candidate]), decimal_places)
+                missing = (baseline == MISSING_SCALED) | (candidate == MISSING_SCALED)
+                values = np.where(missing, MISSING_SCALED, np.abs(candidate - baseline))
+                strategy = f"numeric delta ({source}, int64 at {decimal_places} decimal places)"
+                return ColumnDifference(rule, col, kind, values, df_merged[col_baseline], df_merged[col_candidate], strategy, decimal_places)
+
+        # ✅ Date Rules: day delta
+        elif any("date" in column.lower() for column in rule["columns"]) or pd.api.types.is_datetime64_any_dtype(df_merged[col_baseline]):
+            strategy = f"day delta ({'parsed from text' if is_string_column else 'native'})"
+            # ✅ Dates only (time part dropped), kept as datetime64 next to the untouched merged columns
+            parsed_dates = {} if parsed_dates is None else parsed_dates
+            for name in (col_baseline, col_candidate):
+                if name not in parsed_dates:
+                    parsed_dates[name] = self._parse_dates(df_merged[name])
+            baseline, candidate = parsed_dates[col_baseline], parsed_dates[col_candidate]
+            baseline_days = baseline.to_numpy().astype("datetime64[D]")
+            candidate_days = candidate.to_numpy().astype("datetime64[D]")
+            day_diff = (candidate_days - baseline_days).astype(np.int64)
+            valid = ~(np.isnat(baseline_days) | np.isnat(candidate_days))
+            values = np.where(valid, day_diff, 0).astype(np.int32)
+            return ColumnDifference(rule, col, "date", values, baseline, candidate, strategy)
+
+        elif rule["type"] == "ignore_differences":
+            return None
+
+        # ✅ String Rules: mismatch mask
+        elif is_string_column and has_only_category:
+            # ✅ Stripped copies: the merged columns stay as read for the other rules (and the rows the fast path skips)
+            baseline = df_merged[col_baseline].astype(str).str.strip()
+            candidate = df_merged[col_candidate].astype(str).str.strip()
+            values = (baseline != candidate).to_numpy()
+            return ColumnDifference(rule, col, "string", values, baseline, candidate, "stripped text mismatch")
 
+        else:
+            return None
+
+        return ColumnDifference(rule, col, kind, values, df_merged[col_baseline], df_merged[col_candidate], strategy)
+
+    def reclassify(self, filters=None):
+        """Re-bucket the differences of the last compare_files call with new thresholds, without merging or re-evaluating rules."""
+        if self.differences is None:
+            raise ValueError("No comparison to reclassify; run compare_files first.")
+        self.begin_run()
+        self._run_open = False
+        with self.timings.stage("reclassify") as stage:
+            blocks = self.differences.blocks(filters)
+            discrepancies_df = self.differences.build_report(blocks)
+            self.aggregates = self.differences.build_aggregates(blocks)
+            stage["rows"] = len(discrepancies_df)
         return discrepancies_df
\ No newline at end of file
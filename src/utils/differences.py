@@ -0,0 +1,180 @@
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from .numeric_parser import MISSING_SCALED, scale_limit
+
+# Dimensions of the KPI/chart cube stored with every result
+AGGREGATE_DIMENSIONS = ["Category", "Column Name", "Rule Number", "Rule Type"]
+
+
+def aggregate_report(report: pd.DataFrame) -> pd.DataFrame:
+    """Count discrepancy rows by Category x Column Name x Rule Number (x Rule Type)."""
+    if report.empty or not set(AGGREGATE_DIMENSIONS) <= set(report.columns):
+        return pd.DataFrame(columns=AGGREGATE_DIMENSIONS + ["Count"])
+    cube = report.groupby(AGGREGATE_DIMENSIONS, sort=False).size().reset_index(name="Count")
+    cube[AGGREGATE_DIMENSIONS] = cube[AGGREGATE_DIMENSIONS].astype(str)
+    return cube
+
+
+# Filter keys rule_thresholds reads; nested rule settings are flattened as <key>_<sub key>
+THRESHOLD_KEYS = ("acceptable", "warning_min", "warning_max", "fatal_min", "threshold", "days")
+
+
+def rule_thresholds(rule: Dict, filters: Optional[Dict] = None) -> Dict:
+    """Threshold values of a rule, with any sidebar/API filter overrides applied."""
+    overrides = (filters or {}).get(rule.get("Rule Number", "N/A"), {})
+    acceptable = overrides.get("acceptable", rule.get("acceptable", 0))
+    return {
+        "acceptable": acceptable,
+        "warning_min": overrides.get("warning_min", rule.get("warning", {}).get("min", acceptable)),
+        "warning_max": overrides.get("warning_max", rule.get("warning", {}).get("max", float("inf"))),
+        "fatal_min": overrides.get("fatal_min", rule.get("fatal", {}).get("min", float("inf"))),
+        "threshold": overrides.get("threshold", rule.get("threshold", 0.1)),
+        "days": overrides.get("days", rule.get("days", 0))
+    }
+
+
+class ColumnDifference:
+    """Row-aligned difference array of one rule on one column of the merged frame.
+
+    ``kind`` is ``tolerance``/``threshold`` (absolute numeric delta), ``date`` (day delta),
+    ``string`` (mismatch mask) or ``reference`` (value missing from the reference set).
+    With ``decimal_places`` the numeric delta is int64 in units of 10 ** -decimal_places
+    and the thresholds are scaled the same way, so classifying is exact integer math.
+    Classifying only compares these arrays with the thresholds, so changing a threshold
+    never needs the merge or the rule evaluation again.
+
+    When ``rows`` is set, the arrays only cover those merged-frame positions (the rows
+    whose rule columns differ); ``complete`` evaluates the rule on every row for thresholds
+    that would flag identical values (see needs_all_rows).
+    """
+
+    def __init__(self, rule: Dict, column: str, kind: str, values: np.ndarray, baseline: pd.Series, candidate: pd.Series, strategy: Optional[str] = None, decimal_places: Optional[int] = None):
+        self.rule = rule
+        self.column = column
+        self.kind = kind
+        self.values = values
+        self.decimal_places = decimal_places
+        # ✅ How the array was computed, as shown by the profile
+        self.strategy = strategy or kind
+        # ✅ Displayed values as they were when the rule ran (date rules hold dates, string rules stripped text)
+        self.baseline = baseline
+        self.candidate = candidate
+        self.rows: Optional[np.ndarray] = None
+        self.complete: Optional[Callable[[], "ColumnDifference"]] = None
+
+    def limits(self, filters: Optional[Dict] = None) -> Dict:
+        """Thresholds of the rule with overrides applied, in the units of ``values``."""
+        limits = rule_thresholds(self.rule, filters)
+        if self.decimal_places is not None:
+            limits = {name: scale_limit(limit, self.decimal_places) for name, limit in limits.items()}
+        return limits
+
+    def needs_all_rows(self, filters: Optional[Dict] = None) -> bool:
+        """Whether rows left out as identical on both sides (zero delta, no mismatch) would be flagged under these thresholds."""
+        if self.rows is None:
+            return False
+        limits = self.limits(filters)
+        if self.kind == "tolerance":
+            return limits["fatal_min"] <= 0 or limits["warning_min"] <= 0 < limits["warning_max"]
+        if self.kind == "threshold":
+            return limits["threshold"] <= 0
+        if self.kind == "date":
+            return limits["days"] < 0
+        return False
+
+    def display(self, values: pd.Series, positions: np.ndarray) -> np.ndarray:
+        """Report values at the given positions; dates of date rules (datetime64) read YYYY-MM-DD."""
+        values = values.iloc[positions]
+        if self.kind == "date":
+            return values.dt.strftime("%Y-%m-%d").fillna("NaT").to_numpy(dtype=object)
+        return values.to_numpy(dtype=object)
+
+    def classify(self, filters: Optional[Dict] = None):
+        """Return (positions, categories) of the rows this rule flags under the given thresholds (positions into ``values``)."""
+        limits = self.limits(filters)
+        category = self.rule.get("Category", "None")
+
+        if self.kind == "tolerance":
+            fatal = self.values >= limits["fatal_min"]
+            warning = (self.values >= limits["warning_min"]) & (self.values < limits["warning_max"])
+            flagged = fatal | warning
+            if self.decimal_places is not None:
+                flagged &= self.values != MISSING_SCALED
+            categories = np.where(warning[flagged], "WARNING", "FATAL").astype(object)
+            return np.flatnonzero(flagged), categories
+
+        if self.kind == "threshold":
+            flagged = self.values >= limits["threshold"]
+            if self.decimal_places is not None:
+                flagged &= self.values != MISSING_SCALED
+        elif self.kind == "date":
+            flagged = np.abs(self.values) > limits["days"]
+        else:
+            flagged = self.values
+
+        positions = np.flatnonzero(flagged)
+        return positions, np.full(len(positions), category, dtype=object)
+
+
+class ComparisonDifferences:
+    """Everything compare_files needs to rebuild its report for new thresholds."""
+
+    def __init__(self, key_column: str, keys: pd.Series, missing_rows: List[Dict]):
+        self.key_column = key_column
+        self.keys = keys
+        self.columns: List[ColumnDifference] = []
+        self.missing_rows = missing_rows
+
+    def add(self, difference: ColumnDifference) -> None:
+        self.columns.append(difference)
+
+    def report_block(self, difference: ColumnDifference, positions: np.ndarray, categories: np.ndarray) -> pd.DataFrame:
+        """Discrepancy rows of one rule/column, in merged-frame order."""
+        rule = difference.rule
+        rows = positions if difference.rows is None else difference.rows[positions]
+        return pd.DataFrame({
+            self.key_column: self.keys.iloc[rows].to_numpy(dtype=object),
+            "Column Name": difference.column,
+            "Rule Type": rule["type"],
+            "Category": categories,
+            "Rule Number": rule.get("Rule Number", "N/A"),
+            "Description": rule["description"],
+            "Baseline Field Value": difference.display(difference.baseline, positions),
+            "Candidate Field Value": difference.display(difference.candidate, positions)
+        })
+
+    def build_report(self, blocks: List[pd.DataFrame]) -> pd.DataFrame:
+        """Stack rule blocks and missing rows into the string-typed discrepancy report."""
+        frames = [block for block in blocks if len(block)]
+        if self.missing_rows:
+            frames.append(pd.DataFrame(self.missing_rows))
+        discrepancies_df = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+
+        # ✅ Ensure 'Category' Column Exists
+        if "Category" not in discrepancies_df.columns:
+            discrepancies_df["Category"] = "UNKNOWN"
+
+        # ✅ Convert all columns to strings to avoid serialization issues
+        return discrepancies_df.astype(str)
+
+    def build_aggregates(self, blocks: List[pd.DataFrame]) -> pd.DataFrame:
+        """Aggregate cube of the report, counted per (small) block instead of over the full report."""
+        cubes = [aggregate_report(block[AGGREGATE_DIMENSIONS].astype(str)) for block in blocks if len(block)]
+        missing = {}
+        for row in self.missing_rows:
+            dimensions = tuple(str(row[name]) for name in AGGREGATE_DIMENSIONS)
+            missing[dimensions] = missing.get(dimensions, 0) + 1
+        if missing:
+            cubes.append(pd.DataFrame([list(dimensions) + [count] for dimensions, count in missing.items()], columns=AGGREGATE_DIMENSIONS + ["Count"]))
+        if not cubes:
+            return pd.DataFrame(columns=AGGREGATE_DIMENSIONS + ["Count"])
+        return pd.concat(cubes, ignore_index=True).groupby(AGGREGATE_DIMENSIONS, sort=False)["Count"].sum().reset_index()
+
+    def blocks(self, filters: Optional[Dict] = None) -> List[pd.DataFrame]:
+        """Classify the stored difference arrays for new thresholds into report blocks."""
+        # ✅ Thresholds that now flag identical values need the rows the row-hash fast path skipped
+        self.columns = [difference.complete() if difference.needs_all_rows(filters) else difference for difference in self.columns]
+        return [self.report_block(difference, *difference.classify(filters)) for difference in self.columns]
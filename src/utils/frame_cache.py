@@ -0,0 +1,61 @@
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional
+
+import pandas as pd
+
+
+class FrameCache:
+    """In-memory LRU cache of parsed input DataFrames, bounded by their memory footprint.
+
+    Entries are keyed by the hash of the raw file bytes plus the reader options, so the
+    same upload read with a different delimiter or header setting is parsed again.
+    Cached frames are shared; callers must treat them as read-only (compare_files copies).
+    """
+
+    def __init__(self, max_bytes: int = 256 * 1024 ** 2):
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self._frames = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(content_hash: str, reader_options: Dict) -> str:
+        options = json.dumps(reader_options, sort_keys=True, separators=(",", ":"), default=str)
+        return hashlib.sha256(f"{content_hash}|{options}".encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[pd.DataFrame]:
+        with self._lock:
+            entry = self._frames.get(key)
+            if entry is None:
+                return None
+            self._frames.move_to_end(key)
+            return entry[0]
+
+    def put(self, key: str, df: pd.DataFrame) -> pd.DataFrame:
+        """Cache a frame, evicting the least recently used ones above the memory cap."""
+        size = int(df.memory_usage(index=True, deep=True).sum())
+        if size > self.max_bytes:
+            return df  # ✅ Never let a single huge file flush everything else
+
+        with self._lock:
+            previous = self._frames.pop(key, None)
+            if previous is not None:
+                self.total_bytes -= previous[1]
+            self._frames[key] = (df, size)
+            self.total_bytes += size
+            while self.total_bytes > self.max_bytes:
+                _, (_, evicted_size) = self._frames.popitem(last=False)
+                self.total_bytes -= evicted_size
+        return df
+
+    def __contains__(self, key: str) -> bool:
+        with self._lock:
+            return key in self._frames
+
+    def clear(self) -> None:
+        with self._lock:
+            self._frames.clear()
+            self.total_bytes = 0
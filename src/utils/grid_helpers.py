@@ -1,5 +1,8 @@
+import numpy as np
 import pandas as pd
-from st_aggrid import GridOptionsBuilder
+from typing import Dict, Optional, Tuple
+
+from .numeric_parser import UNIT_MULTIPLIERS
 
 def convert_to_numeric(value):
     if pd.isna(value) or value == '':
@@ -34,6 +37,8 @@ def get_grid_options(comparison_df):
     """
     Configure grid options with custom sorting for alphanumeric values
     """
+    from st_aggrid import GridOptionsBuilder
+
     gb = GridOptionsBuilder.from_dataframe(comparison_df)
     gb.configure_default_column(sortable=True)
     
@@ -87,4 +92,80 @@ def get_grid_options(comparison_df):
         }"""
     } for col in comparison_df.columns]
     
-    return gridOptions 
\ No newline at end of file
+    return gridOptions 
+
+def numeric_sort_keys(values: pd.Series) -> pd.DataFrame:
+    """
+    Vectorized version of the grid comparator: K/M/B/T-aware numbers first, then text
+    """
+    text = values.astype(str)
+    blank = values.isna().to_numpy() | (text == '').to_numpy()
+
+    cleaned = text.str.replace(',', '', regex=False).str.replace(' ', '', regex=False).str.upper()
+    # parseFloat semantics: longest numeric prefix once everything but digits, '.' and '-' is dropped
+    number = pd.to_numeric(
+        cleaned.str.replace(r'[^0-9.\-]', '', regex=True).str.extract(r'^(-?(?:\d+\.?\d*|\.\d+))', expand=False),
+        errors='coerce'
+    ).to_numpy(dtype=float)
+
+    multiplier = np.ones(len(values))
+    for unit in reversed(list(UNIT_MULTIPLIERS)):  # the first matching unit in K, M, B, T order wins
+        multiplier[cleaned.str.contains(unit, regex=False).to_numpy()] = UNIT_MULTIPLIERS[unit]
+
+    number = np.where(blank, 0.0, number * multiplier)
+    is_text = np.isnan(number)
+    return pd.DataFrame({
+        'is_text': is_text,
+        'number': np.where(is_text, 0.0, number),
+        'text': np.where(is_text, text.to_numpy(dtype=object), '')
+    }, index=values.index)
+
+
+def filter_frame(df: pd.DataFrame, filters: Optional[Dict[str, str]] = None) -> np.ndarray:
+    """
+    Row positions whose columns contain every filter text (case-insensitive)
+    """
+    mask = np.ones(len(df), dtype=bool)
+    for column, needle in (filters or {}).items():
+        if needle and column in df.columns:
+            mask &= df[column].astype(str).str.contains(str(needle), case=False, regex=False).to_numpy()
+    return np.flatnonzero(mask)
+
+
+class ResultPager:
+    """
+    Serves one page of a (large) result frame at a time; sorting and filtering run server-side
+    and the resulting row order is cached so flipping pages only slices
+    """
+
+    def __init__(self, df: pd.DataFrame, max_cached_orders: int = 8):
+        self.df = df
+        self.max_cached_orders = max_cached_orders
+        self._orders = {}
+
+    def order(self, sort_by: Optional[str] = None, ascending: bool = True, filters: Optional[Dict[str, str]] = None) -> np.ndarray:
+        """
+        Row positions after filtering and sorting
+        """
+        cache_key = (sort_by, ascending, tuple(sorted((filters or {}).items())))
+        if cache_key in self._orders:
+            return self._orders[cache_key]
+
+        positions = filter_frame(self.df, filters)
+        if sort_by in self.df.columns and len(positions):
+            keys = numeric_sort_keys(self.df[sort_by].iloc[positions]).reset_index(drop=True)
+            ordered = keys.sort_values(['is_text', 'number', 'text'], ascending=ascending, kind='mergesort').index.to_numpy()
+            positions = positions[ordered]
+
+        if len(self._orders) >= self.max_cached_orders:
+            self._orders.pop(next(iter(self._orders)))
+        self._orders[cache_key] = positions
+        return positions
+
+    def page(self, page_number: int, page_size: int = 100, sort_by: Optional[str] = None, ascending: bool = True, filters: Optional[Dict[str, str]] = None) -> Tuple[pd.DataFrame, int]:
+        """
+        Return the rows of one page (1-based) and the total number of matching rows
+        """
+        positions = self.order(sort_by, ascending, filters)
+        start = max(page_number - 1, 0) * page_size
+        return self.df.iloc[positions[start:start + page_size]], len(positions)
@@ -0,0 +1,131 @@
+import os
+import pickle
+import tempfile
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import pandas as pd
+
+from .row_hash import RowHashIndex
+
+# Bump when the snapshot layout or the comparison logic changes so old snapshots are ignored
+SNAPSHOT_VERSION = "2"
+
+
+class IncrementalStore:
+    """Last comparison of every baseline env -> candidate env lineage, for day-over-day runs.
+
+    A snapshot holds the labels that were compared, the row-hash index of both inputs, the
+    column dtypes of their outer merge and the report. The next label of the same lineage only re-runs the rules on the keys that
+    were inserted, deleted or changed on either side since then; the report rows of every
+    other key are taken over from the snapshot, as long as the merged dtypes are unchanged.
+    """
+
+    def __init__(self, state_dir: str):
+        self.state_dir = Path(state_dir)
+        self.state_dir.mkdir(parents=True, exist_ok=True)
+
+    def _path(self, job_response: Dict) -> Path:
+        name = f"{job_response['baseline']['env']}_{job_response['candidate']['env']}"
+        return self.state_dir / f"{''.join(c if c.isalnum() or c in '-_' else '_' for c in name)}.pkl"
+
+    def load(self, job_response: Dict, settings: str) -> Optional[Dict]:
+        """Snapshot of the lineage, or None if there is none or it was made with other rules/filters."""
+        path = self._path(job_response)
+        try:
+            with open(path, "rb") as f:
+                snapshot = pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError, AttributeError, ImportError):
+            return None
+        if snapshot.get("version") != SNAPSHOT_VERSION or snapshot.get("settings") != settings:
+            return None
+        return snapshot
+
+    def save(
+        self, job_response: Dict, settings: str, baseline: RowHashIndex, candidate: RowHashIndex, merged_dtypes: Dict[str, str], report: pd.DataFrame
+    ) -> None:
+        """Replace the lineage's snapshot (atomically)."""
+        snapshot = {
+            "version": SNAPSHOT_VERSION,
+            "settings": settings,
+            "labels": {side: job_response[side]["label"] for side in ("baseline", "candidate")},
+            "baseline": baseline,
+            "candidate": candidate,
+            "merged_dtypes": merged_dtypes,
+            "report": report
+        }
+        path = self._path(job_response)
+        fd, temp_path = tempfile.mkstemp(dir=self.state_dir, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                pickle.dump(snapshot, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(temp_path, path)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+
+def churned_keys(previous: Dict, baseline: RowHashIndex, candidate: RowHashIndex) -> Optional[Dict]:
+    """Keys whose report rows must be recomputed, or None if the snapshot cannot be reused.
+
+    Besides the keys changed on either side, keys present on one side only are always
+    recomputed, so the outer merge of the recomputed rows is nullable (e.g. int -> float)
+    exactly where a full comparison's would be. The rows taken over from the snapshot only
+    match a full comparison if its merged dtypes were the same; the caller checks that.
+    """
+    if not (baseline.has_unique_keys and candidate.has_unique_keys):
+        return None
+    if not (baseline.compatible(previous["baseline"]) and candidate.compatible(previous["candidate"])):
+        return None
+
+    baseline_churn = baseline.diff(previous["baseline"])
+    candidate_churn = candidate.diff(previous["candidate"])
+    one_sided = baseline.keys.symmetric_difference(candidate.keys, sort=False)
+    recompute = one_sided
+    for churn in (baseline_churn, candidate_churn):
+        for keys in churn.values():
+            recompute = recompute.union(keys, sort=False)
+    return {
+        "baseline": {name: len(keys) for name, keys in baseline_churn.items()},
+        "candidate": {name: len(keys) for name, keys in candidate_churn.items()},
+        "keys": recompute
+    }
+
+
+def merge_reports(previous: pd.DataFrame, partial: pd.DataFrame, recomputed: pd.Index, key_column: str) -> pd.DataFrame:
+    """Report rows of the snapshot for untouched keys plus the recomputed rows."""
+    if key_column in previous.columns:
+        previous = previous[~previous[key_column].isin(recomputed.astype(str))]
+    frames = [frame for frame in (previous, partial) if len(frame)]
+    if not frames:
+        return partial
+    report = pd.concat(frames, ignore_index=True)
+    return report.fillna("nan") if len(frames) > 1 else report
+
+
+def order_report(report: pd.DataFrame, rules: List[Dict], key_column: str, key_dtype) -> pd.DataFrame:
+    """Put a stitched report in the order of a full comparison.
+
+    Rule rows come per rule/column in rules_config order, by key as the outer merge sorts
+    them; missing rows follow as they are, since they are always recomputed in file order.
+    """
+    if report.empty or key_column not in report.columns:
+        return report
+
+    block_ranks = {}
+    for rule in rules:
+        for column in rule["columns"]:
+            block_ranks.setdefault(f"{rule.get('Rule Number', 'N/A')}\x1f{column}", len(block_ranks))
+
+    rule_number = report["Rule Number"]
+    is_missing = rule_number.isin(["Missing_Row_Baseline", "Missing_Row_Candidate"]).to_numpy()
+    rule_rows = report[~is_missing]
+    # ✅ The report holds keys as text; sort numeric keys by value like the merge did
+    keys = rule_rows[key_column]
+    if pd.api.types.is_numeric_dtype(key_dtype):
+        keys = pd.to_numeric(keys, errors="coerce")
+    order = pd.DataFrame({
+        "block": (rule_rows["Rule Number"] + "\x1f" + rule_rows["Column Name"]).map(block_ranks).fillna(len(block_ranks)).to_numpy(),
+        "key": keys.to_numpy()
+    }).sort_values(["block", "key"], kind="mergesort").index
+    return pd.concat([rule_rows.iloc[order], report[is_missing]], ignore_index=True)
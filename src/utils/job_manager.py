@@ -1,18 +1,31 @@
+import os
 import uuid
+from .job_store import JobStore
 
 class JobManager:
-    jobs = {}
+    store = None
+
+    @staticmethod
+    def _store():
+        if JobManager.store is None:
+            JobManager.store = JobStore(os.getenv("JOBS_DB_PATH", "jobs.db"))
+        return JobManager.store
 
     @staticmethod
     def create_job(validation_results):
         job_id = str(uuid.uuid4())
-        JobManager.jobs[job_id] = validation_results
+        summary = {
+            "rules": len(validation_results),
+            "failed_rules": sum(1 for result in validation_results.values() if isinstance(result, dict) and not result.get("passed", True))
+        } if isinstance(validation_results, dict) else None
+        JobManager._store().create(job_id, "completed", summary=summary, results=validation_results)
         return job_id
 
     @staticmethod
     def get_job_status(job_id):
-        return JobManager.jobs.get(job_id, "Job Not Found")
+        job = JobManager._store().get(job_id, include_results=True)
+        return job["results"] if job is not None else "Job Not Found"
 
     @staticmethod
     def list_jobs():
-        return list(JobManager.jobs.keys())
+        return [job["job_id"] for job in JobManager._store().list_jobs(limit=-1)]
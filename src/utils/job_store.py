@@ -0,0 +1,202 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterable, List, Optional
+
+
+def _to_json(value) -> Optional[str]:
+    if value is None:
+        return None
+    # ✅ numpy/pandas scalars (e.g. failed row counts) expose .item()
+    return json.dumps(value, default=lambda o: o.item() if hasattr(o, "item") else str(o))
+
+
+def summarize_results(results) -> Optional[Dict]:
+    """Keep only the scalar fields of a result payload as its summary."""
+    if not isinstance(results, dict):
+        return None
+    return {key: value for key, value in results.items() if not isinstance(value, (list, dict))}
+
+
+class JobStore:
+    """SQLite (WAL mode) store for comparison jobs.
+
+    Status polling reads one indexed row instead of re-parsing every job, and
+    status changes are single-row transactions that are safe across threads.
+    Full result payloads live in a separate table so polls only load the small summary.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS jobs (
+            job_id TEXT PRIMARY KEY,
+            status TEXT NOT NULL,
+            baseline TEXT,
+            candidate TEXT,
+            summary TEXT,
+            error TEXT,
+            created_at REAL NOT NULL,
+            updated_at REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status, updated_at);
+        CREATE TABLE IF NOT EXISTS job_results (
+            job_id TEXT PRIMARY KEY REFERENCES jobs (job_id) ON DELETE CASCADE,
+            data TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS files (
+            file_id TEXT PRIMARY KEY,
+            path TEXT NOT NULL,
+            created_at REAL NOT NULL
+        );
+    """
+
+    def __init__(self, db_path: str = "jobs.db"):
+        self.db_path = db_path
+        self._local = threading.local()
+        self._connect().executescript(self.SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        """Return this thread's connection (sqlite3 connections must not be shared across threads)."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA foreign_keys=ON")
+            self._local.conn = _Transaction(conn)
+            conn = self._local.conn
+        return conn
+
+    def create(self, job_id: str, status: str = "queued", baseline: Optional[str] = None, candidate: Optional[str] = None, summary: Optional[Dict] = None, results=None) -> None:
+        """Insert a new job, with its results when it is created already finished."""
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO jobs (job_id, status, baseline, candidate, summary, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (job_id, status, baseline, candidate, _to_json(summary), now, now)
+            )
+            if results is not None:
+                conn.execute("INSERT INTO job_results (job_id, data) VALUES (?, ?)", (job_id, _to_json(results)))
+
+    def transition(
+        self,
+        job_id: str,
+        status: str,
+        expected: Optional[Iterable[str]] = None,
+        summary: Optional[Dict] = None,
+        results=None,
+        error: Optional[str] = None
+    ) -> bool:
+        """Atomically move a job to ``status``, optionally only from one of the ``expected`` states.
+
+        Returns False when the job does not exist or is not in an expected state.
+        """
+        assignments = ["status = ?", "updated_at = ?"]
+        params = [status, time.time()]
+        if summary is not None:
+            assignments.append("summary = ?")
+            params.append(_to_json(summary))
+        if error is not None:
+            assignments.append("error = ?")
+            params.append(error)
+
+        query = f"UPDATE jobs SET {', '.join(assignments)} WHERE job_id = ?"
+        params.append(job_id)
+        if expected is not None:
+            expected = list(expected)
+            query += f" AND status IN ({', '.join('?' for _ in expected)})"
+            params.extend(expected)
+
+        with self._connect() as conn:
+            updated = conn.execute(query, params).rowcount == 1
+            if updated and results is not None:
+                conn.execute(
+                    "INSERT OR REPLACE INTO job_results (job_id, data) VALUES (?, ?)",
+                    (job_id, _to_json(results))
+                )
+        return updated
+
+    def get(self, job_id: str, include_results: bool = False) -> Optional[Dict]:
+        """Look up a single job by id."""
+        conn = self._connect()
+        row = conn.execute("SELECT * FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+
+        job = dict(row)
+        job["summary"] = json.loads(job["summary"]) if job["summary"] else None
+        if include_results:
+            result_row = conn.execute("SELECT data FROM job_results WHERE job_id = ?", (job_id,)).fetchone()
+            job["results"] = json.loads(result_row["data"]) if result_row else None
+        return job
+
+    def list_jobs(self, status: Optional[str] = None, limit: int = 100) -> List[Dict]:
+        """List the most recently updated jobs, optionally filtered by status."""
+        conn = self._connect()
+        if status is None:
+            rows = conn.execute("SELECT job_id, status, updated_at FROM jobs ORDER BY updated_at DESC LIMIT ?", (limit,))
+        else:
+            rows = conn.execute(
+                "SELECT job_id, status, updated_at FROM jobs WHERE status = ? ORDER BY updated_at DESC LIMIT ?",
+                (status, limit)
+            )
+        return [dict(row) for row in rows.fetchall()]
+
+    def delete(self, job_id: str) -> None:
+        """Remove a job and its results."""
+        with self._connect() as conn:
+            conn.execute("DELETE FROM jobs WHERE job_id = ?", (job_id,))
+
+    def register_file(self, file_id: str, path: str) -> None:
+        """Remember where an uploaded file was stored."""
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO files (file_id, path, created_at) VALUES (?, ?, ?)",
+                (file_id, path, time.time())
+            )
+
+    def get_file(self, file_id: str) -> Optional[str]:
+        """Return the stored path of an uploaded file."""
+        row = self._connect().execute("SELECT path FROM files WHERE file_id = ?", (file_id,)).fetchone()
+        return row["path"] if row else None
+
+    def import_json(self, json_path: str) -> int:
+        """One-off import of a legacy ``jobs.json`` file into an empty store."""
+        if not os.path.exists(json_path):
+            return 0
+        conn = self._connect()
+        if conn.execute("SELECT 1 FROM jobs LIMIT 1").fetchone() or conn.execute("SELECT 1 FROM files LIMIT 1").fetchone():
+            return 0
+
+        with open(json_path, "r") as f:
+            legacy = json.load(f)
+
+        imported = 0
+        for job_id, job in legacy.items():
+            if isinstance(job, str):
+                self.register_file(job_id, job)
+            else:
+                results = job.get("results")
+                self.create(job_id, job.get("status", "unknown"), job.get("baseline"), job.get("candidate"), summarize_results(results), results)
+            imported += 1
+        return imported
+
+
+class _Transaction:
+    """Connection wrapper whose ``with`` block runs as one IMMEDIATE transaction."""
+
+    def __init__(self, conn: sqlite3.Connection):
+        self._conn = conn
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def __enter__(self):
+        self._conn.execute("BEGIN IMMEDIATE")
+        return self._conn
+
+    def __exit__(self, exc_type, exc, tb):
+        self._conn.execute("ROLLBACK" if exc_type else "COMMIT")
+        return False
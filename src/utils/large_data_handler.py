@@ -1,6 +1,6 @@
 import dask.dataframe as dd
 import os
-from .validator import ValidationRuleLoader
+from .validator import ValidationEngine, ValidationRuleLoader
 
 class LargeDataHandler:
     def __init__(self, validation_config_path):
@@ -18,8 +18,7 @@ class LargeDataHandler:
         else:
             raise ValueError("Unsupported file format. Please upload CSV or Excel files.")
 
-        validation_results = {}
-        for rule in self.validation_rules:
-            validation_results[rule.description] = rule.validate(df.compute())  # Convert Dask DF to Pandas
-
-        return validation_results
+        # ✅ One pass over the partitions for all rules; only one partition is in memory at a time
+        engine = ValidationEngine(self.validation_rules)
+        results = engine.validate_chunks((partition.compute() for partition in df.to_delayed()), columns=df.columns)
+        return {result["description"]: result for result in results}
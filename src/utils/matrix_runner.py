@@ -0,0 +1,127 @@
+import concurrent.futures
+import json
+import os
+from itertools import product
+from typing import Callable, Dict, List, Optional
+
+from .data_processor import DataProcessor
+from .shared_frames import SharedFrame, SharedFrameStore
+
+
+def matrix_pairs(environment_config: Dict, baseline_envs: Optional[List[str]] = None, candidate_envs: Optional[List[str]] = None) -> List[Dict]:
+    """Every baseline/candidate (env, label) combination of environment_config, shaped like job_creation_response.json."""
+    targets = [
+        {"env": environment["env"], "label": label}
+        for environment in environment_config.get("environments", [])
+        for label in environment.get("labels", [])
+    ]
+    baselines = [t for t in targets if not baseline_envs or t["env"] in baseline_envs]
+    candidates = [t for t in targets if not candidate_envs or t["env"] in candidate_envs]
+    return [
+        {"baseline": dict(baseline), "candidate": dict(candidate)}
+        for baseline, candidate in product(baselines, candidates)
+        if baseline != candidate
+    ]
+
+
+def pair_name(job_response: Dict) -> str:
+    """Same naming as the dashboard's report files: <baseline env>_<candidate env>_<baseline label>_<candidate label>."""
+    baseline, candidate = job_response["baseline"], job_response["candidate"]
+    return f"{baseline['env']}_{candidate['env']}_{baseline['label']}_{candidate['label']}"
+
+
+def _parse_input(directory_config: Dict, rules_config: Dict, path: str, file_type: str, store_root: str) -> SharedFrame:
+    """Parse one input file into the shared frame store (worker process)."""
+    df = DataProcessor(directory_config, None, rules_config).read_input(path, file_type, os.path.basename(path))
+    return SharedFrameStore(store_root).put(df)
+
+
+def _compare_pair(directory_config: Dict, job_response: Dict, rules_config: Dict, baseline: SharedFrame, candidate: SharedFrame, file_type: str) -> Dict:
+    """Compare two parsed inputs attached from shared memory (worker process)."""
+    processor = DataProcessor(directory_config, job_response, rules_config)
+    results = processor.compare_files(baseline.attach(), candidate.attach(), file_type)
+    return {"results": results, "aggregates": processor.aggregates, "timings": processor.timings.as_dict()}
+
+
+class MatrixRunner:
+    """Runs every requested environment x label comparison with bounded parallelism.
+
+    File paths come from directory_config.json through DataProcessor.resolve_file_paths,
+    and each distinct input file is parsed once even when several pairs use it. Parsed
+    inputs live in memory-mapped Arrow files that the workers attach to, so only
+    small handles cross process boundaries.
+    """
+
+    def __init__(self, directory_config, rules_config, environment_config=None, file_type: str = "Excel", max_workers: Optional[int] = None, shared_dir: Optional[str] = None):
+        # ✅ Load the configs once (file path or dictionary) and hand plain dictionaries to the workers
+        base = DataProcessor(directory_config, None, rules_config)
+        self.directory_config = base.directory_config
+        self.rules_config = base.rules_config
+        if isinstance(environment_config, str) and os.path.exists(environment_config):
+            with open(environment_config, "r") as file:
+                self.environment_config = json.load(file)
+        else:
+            self.environment_config = environment_config or {"environments": []}
+        self.file_type = file_type
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.shared_dir = shared_dir
+
+    def resolve(self, pairs: Optional[List[Dict]] = None) -> List[Dict]:
+        """Resolve the input/output files of each pair (all environment combinations by default)."""
+        resolved = []
+        for job_response in pairs if pairs is not None else matrix_pairs(self.environment_config):
+            processor = DataProcessor(self.directory_config, job_response, self.rules_config)
+            baseline_file, candidate_file, output_file = processor.resolve_file_paths()
+            resolved.append({
+                "name": pair_name(job_response),
+                "job_response": job_response,
+                "baseline_file": str(baseline_file),
+                "candidate_file": str(candidate_file),
+                "output_file": str(output_file)
+            })
+        return resolved
+
+    def run(self, pairs: Optional[List[Dict]] = None, on_pair_done: Optional[Callable[[str, Dict], None]] = None) -> Dict[str, Dict]:
+        """Parse every distinct input once, then compare all pairs; a failing pair never stops the others."""
+        resolved = self.resolve(pairs)
+        outcomes = {}
+
+        with SharedFrameStore(self.shared_dir) as store, concurrent.futures.ProcessPoolExecutor(max_workers=self.max_workers) as executor:
+            # ✅ Stage 1: one parse per distinct file
+            paths = sorted({pair[side] for pair in resolved for side in ("baseline_file", "candidate_file")})
+            parse_futures = {
+                path: executor.submit(_parse_input, self.directory_config, self.rules_config, path, self.file_type, store.root)
+                for path in paths
+            }
+            frames, parse_errors = {}, {}
+            for path, future in parse_futures.items():
+                try:
+                    frames[path] = future.result()
+                except Exception as e:
+                    parse_errors[path] = f"{path}: {e}"
+
+            # ✅ Stage 2: the pool queues the comparisons, so at most max_workers run at once
+            compare_futures = {}
+            for pair in resolved:
+                errors = [parse_errors[pair[side]] for side in ("baseline_file", "candidate_file") if pair[side] in parse_errors]
+                if errors:
+                    outcomes[pair["name"]] = dict(pair, status="error", error="; ".join(errors))
+                    if on_pair_done is not None:
+                        on_pair_done(pair["name"], outcomes[pair["name"]])
+                    continue
+                future = executor.submit(
+                    _compare_pair, self.directory_config, pair["job_response"], self.rules_config,
+                    frames[pair["baseline_file"]], frames[pair["candidate_file"]], self.file_type
+                )
+                compare_futures[future] = pair
+
+            for future in concurrent.futures.as_completed(compare_futures):
+                pair = compare_futures[future]
+                try:
+                    outcomes[pair["name"]] = dict(pair, status="success", **future.result())
+                except Exception as e:
+                    outcomes[pair["name"]] = dict(pair, status="error", error=str(e))
+                if on_pair_done is not None:
+                    on_pair_done(pair["name"], outcomes[pair["name"]])
+
+        return {pair["name"]: outcomes[pair["name"]] for pair in resolved}
@@ -0,0 +1,237 @@
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+
+# Seconds; covers sub-millisecond rules up to multi-minute parses of large workbooks
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+
+def _escape_label(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape_label(value)}"' for key, value in labels.items()) + "}"
+
+
+class Histogram:
+    """Cumulative histogram rendered in the Prometheus text exposition format."""
+
+    def __init__(self, name: str, help_text: str, labelnames: Tuple[str, ...], buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = labelnames
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels) -> None:
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            series = self._series.setdefault(key, {"counts": [0] * len(self.buckets), "sum": 0.0, "count": 0})
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series["counts"][i] += 1
+            series["sum"] += value
+            series["count"] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, series in sorted(self._series.items()):
+                labels = dict(zip(self.labelnames, key))
+                for bound, count in zip(self.buckets, series["counts"]):
+                    lines.append(f"{self.name}_bucket{_format_labels({**labels, 'le': repr(float(bound))})} {count}")
+                lines.append(f"{self.name}_bucket{_format_labels({**labels, 'le': '+Inf'})} {series['count']}")
+                lines.append(f"{self.name}_sum{_format_labels(labels)} {series['sum']}")
+                lines.append(f"{self.name}_count{_format_labels(labels)} {series['count']}")
+        return lines
+
+
+class Counter:
+    """Monotonic counter rendered in the Prometheus text exposition format."""
+
+    def __init__(self, name: str, help_text: str, labelnames: Tuple[str, ...]):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = labelnames
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(dict(zip(self.labelnames, key)))} {value}")
+        return lines
+
+
+class MetricsRegistry:
+    """Process-wide collection of metrics exposed by the API."""
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def histogram(self, name: str, help_text: str, labelnames: Tuple[str, ...] = ()) -> Histogram:
+        with self._lock:
+            return self._metrics.setdefault(name, Histogram(name, help_text, labelnames))
+
+    def counter(self, name: str, help_text: str, labelnames: Tuple[str, ...] = ()) -> Counter:
+        with self._lock:
+            return self._metrics.setdefault(name, Counter(name, help_text, labelnames))
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+STAGE_SECONDS = REGISTRY.histogram("comparison_stage_seconds", "Wall time spent per comparison stage.", ("stage",))
+STAGE_ROWS = REGISTRY.counter("comparison_stage_rows_total", "Rows processed per comparison stage.", ("stage",))
+RULE_SECONDS = REGISTRY.histogram("comparison_rule_seconds", "Wall time spent evaluating a rule on one column.", ("rule_type",))
+RULE_ROWS_FLAGGED = REGISTRY.counter("comparison_rule_rows_flagged_total", "Rows flagged per rule type.", ("rule_type",))
+
+
+@contextmanager
+def allocation_tracing(enabled: bool = True):
+    """Trace allocations (Python objects and NumPy/pandas buffers) inside the block, unless already tracing."""
+    started = enabled and not tracemalloc.is_tracing()
+    if started:
+        tracemalloc.start()
+    try:
+        yield
+    finally:
+        if started:
+            tracemalloc.stop()
+
+
+class StageTimings:
+    """Timing breakdown of a single comparison run, mirrored into the process-wide metrics.
+
+    With ``profile`` set, stages and rules timed while allocation tracing is on also
+    record ``bytes_allocated`` (peak memory above the start of the block) and
+    ``bytes_retained`` (memory still held at its end).
+    """
+
+    def __init__(self, profile: bool = False):
+        self.profile = profile
+        self.stages: List[Dict] = []
+        self.rules: List[Dict] = []
+
+    def _allocation_start(self) -> Optional[int]:
+        if not (self.profile and tracemalloc.is_tracing()):
+            return None
+        tracemalloc.reset_peak()
+        return tracemalloc.get_traced_memory()[0]
+
+    def _allocation_end(self, entry: Dict, start: Optional[int]) -> None:
+        if start is None:
+            return
+        current, peak = tracemalloc.get_traced_memory()
+        entry["bytes_allocated"] = max(peak - start, 0)
+        entry["bytes_retained"] = current - start
+
+    def record(self, stage: str, seconds: float, rows: Optional[int] = None, detail: Optional[str] = None, **extra) -> Dict:
+        """Record a stage that was timed by the caller."""
+        entry = {"stage": stage, "seconds": round(seconds, 6), "rows": rows}
+        if detail is not None:
+            entry["detail"] = detail
+        entry.update(extra)
+        self.stages.append(entry)
+        STAGE_SECONDS.observe(seconds, stage=stage)
+        if rows:
+            STAGE_ROWS.inc(rows, stage=stage)
+        return entry
+
+    @contextmanager
+    def stage(self, stage: str, rows: Optional[int] = None, detail: Optional[str] = None):
+        """Time a block; the yielded dict's ``rows`` and ``detail`` can be filled in by the block."""
+        entry = {"rows": rows}
+        allocated = self._allocation_start()
+        start = time.perf_counter()
+        try:
+            yield entry
+        finally:
+            seconds = time.perf_counter() - start
+            self._allocation_end(entry, allocated)
+            extra = {name: entry[name] for name in ("bytes_allocated", "bytes_retained") if name in entry}
+            self.record(stage, seconds, entry.get("rows"), entry.get("detail", detail), **extra)
+
+    @contextmanager
+    def rule(self, rule_number: str, rule_type: str, column: str, rows: Optional[int] = None):
+        """Time one rule on one column; the block can set ``rows``, ``flagged`` and ``strategy``."""
+        entry = {"rule_number": rule_number, "rule_type": rule_type, "column": column, "strategy": None, "rows": rows, "flagged": 0}
+        allocated = self._allocation_start()
+        start = time.perf_counter()
+        try:
+            yield entry
+        finally:
+            entry["seconds"] = round(time.perf_counter() - start, 6)
+            self._allocation_end(entry, allocated)
+            self.rules.append(entry)
+            RULE_SECONDS.observe(entry["seconds"], rule_type=rule_type)
+            if entry["flagged"]:
+                RULE_ROWS_FLAGGED.inc(entry["flagged"], rule_type=rule_type)
+
+    def skip(self, rule_number: str, rule_type: str, column: str, strategy: str) -> None:
+        """Record a rule/column that was not evaluated (profile only; not a metrics observation)."""
+        self.rules.append({"rule_number": rule_number, "rule_type": rule_type, "column": column, "strategy": strategy, "rows": 0, "flagged": 0, "seconds": 0.0})
+
+    def as_dict(self) -> Dict:
+        """Return the breakdown as JSON-serialisable data; rule evaluation runs between stages, so its time counts too."""
+        return {
+            "total_seconds": round(sum(entry["seconds"] for entry in self.stages) + sum(entry["seconds"] for entry in self.rules), 6),
+            "stages": list(self.stages),
+            "rules": list(self.rules)
+        }
+
+
+def _format_bytes(value: Optional[int]) -> str:
+    if value is None:
+        return "-"
+    for unit in ("B", "KB", "MB"):
+        if abs(value) < 1024:
+            return f"{value:.0f} {unit}" if unit == "B" else f"{value:.1f} {unit}"
+        value /= 1024
+    return f"{value:.1f} GB"
+
+
+def profile_table(timings: Dict) -> str:
+    """Render the rules (in rules_config order) and stages of ``StageTimings.as_dict()`` as a text table."""
+    header = ("Rule Number", "Type", "Column", "Strategy", "Seconds", "Rows", "Flagged", "Allocated")
+    rows = [header]
+    for entry in timings["rules"]:
+        rows.append((
+            str(entry["rule_number"]), str(entry["rule_type"]), str(entry["column"]), str(entry.get("strategy") or "-"),
+            f"{entry['seconds']:.4f}", f"{entry['rows'] or 0:,}", f"{entry['flagged']:,}", _format_bytes(entry.get("bytes_allocated"))
+        ))
+    for entry in timings["stages"]:
+        rows.append((
+            "", "stage", entry["stage"], str(entry.get("detail") or ""),
+            f"{entry['seconds']:.4f}", f"{entry['rows'] or 0:,}", "", _format_bytes(entry.get("bytes_allocated"))
+        ))
+
+    widths = [max(len(row[i]) for row in rows) for i in range(len(header))]
+    numeric = {4, 5, 6, 7}
+    lines = []
+    for n, row in enumerate(rows):
+        lines.append("  ".join(cell.rjust(width) if i in numeric else cell.ljust(width) for i, (cell, width) in enumerate(zip(row, widths))).rstrip())
+        if n == 0:
+            lines.append("  ".join("-" * width for width in widths))
+    rule_seconds = sum(entry["seconds"] for entry in timings["rules"])
+    lines.append(f"total: {timings['total_seconds']:.4f}s (rules {rule_seconds:.4f}s, stages {timings['total_seconds'] - rule_seconds:.4f}s)")
+    return "\n".join(lines)
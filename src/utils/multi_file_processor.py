@@ -3,84 +3,215 @@ import pandas as pd
 import numpy as np
 from pathlib import Path
 from .data_processor import DataProcessor
+from .shared_frames import SharedFrame, SharedFrameStore
 from itertools import combinations
 
+# Code of a cell whose key is absent from a file (pd.factorize uses -1 for missing values)
+ABSENT = -2
+
 class MultiFileProcessor:
-    def __init__(self):
+    def __init__(self, rules_config: Optional[Dict] = None, frame_store: Optional[SharedFrameStore] = None):
         self.files = {}  # Dict to store DataFrames
+        # ✅ With a store, each file is kept once as a memory-mapped Arrow file that worker processes can attach to
+        self.frame_store = frame_store
         self.common_columns = None
-        self.processor = DataProcessor()
+        self.processor = DataProcessor(None, None, rules_config or {})
         self.comparison_results = {}
-        
+        self.key_columns = None
+        # ✅ Single aligned structure shared by every pair: union key index, per-file row positions
+        # (-1 if the key is absent) and, per common column, an (n_keys x n_files) matrix of value codes
+        self.union_keys = None
+        self.row_positions = {}
+        self.value_codes = {}
+
     def add_file(self, file_id: str, file_path: Path, sheet_name: Optional[str] = None) -> None:
         """Add a file to the comparison set"""
         try:
-            df = self.processor.read_excel(file_path, sheet_name)
-            self.files[file_id] = {
-                'df': df,
-                'path': file_path,
-                'sheet': sheet_name
-            }
-            self._update_common_columns()
+            file_path = Path(file_path)
+            if file_path.suffix.lower() in [".xlsx", ".xls"]:
+                df = pd.read_excel(file_path, sheet_name=sheet_name or 0, engine="openpyxl")
+            else:
+                df = self.processor.read_input(file_path, "Text", file_id)
+            self.add_frame(file_id, df, file_path, sheet_name)
         except Exception as e:
             raise Exception(f"Error adding file {file_id}: {str(e)}")
-    
+
+    def add_frame(self, file_id: str, df: pd.DataFrame, file_path: Optional[Path] = None, sheet_name: Optional[str] = None) -> None:
+        """Add an already parsed DataFrame to the comparison set"""
+        df = df.copy(deep=False)
+        df.columns = df.columns.astype(str).str.strip()
+        shared = None
+        if self.frame_store is not None:
+            shared = self.frame_store.put(df)
+            df = shared.attach()
+        self.files[file_id] = {
+            'df': df,
+            'path': file_path,
+            'sheet': sheet_name,
+            'shared': shared
+        }
+        self._update_common_columns()
+
+    def add_shared(self, file_id: str, shared: SharedFrame, file_path: Optional[Path] = None) -> None:
+        """Add a file already stored in shared memory (e.g. by another process) without copying it"""
+        self.files[file_id] = {
+            'df': shared.attach(),
+            'path': file_path,
+            'sheet': None,
+            'shared': shared
+        }
+        self._update_common_columns()
+
+    def shared_frames(self) -> Dict[str, SharedFrame]:
+        """Handles of the files kept in the frame store, to pass to worker processes instead of the frames"""
+        return {file_id: info['shared'] for file_id, info in self.files.items() if info['shared'] is not None}
+
     def _update_common_columns(self) -> None:
         """Update common columns across all files"""
         if not self.files:
             self.common_columns = None
             return
-            
+
         column_sets = [set(file_info['df'].columns) for file_info in self.files.values()]
         self.common_columns = list(set.intersection(*column_sets))
-    
+
+    def _file_keys(self, df: pd.DataFrame) -> pd.Index:
+        if len(self.key_columns) == 1:
+            return pd.Index(df[self.key_columns[0]])
+        return pd.MultiIndex.from_frame(df[self.key_columns])
+
+    def _align(self) -> None:
+        """Build the union key index and the aligned value-code matrix of every common column"""
+        file_ids = list(self.files)
+        file_keys = {file_id: self._file_keys(self.files[file_id]['df']) for file_id in file_ids}
+
+        union = file_keys[file_ids[0]].drop_duplicates()
+        for file_id in file_ids[1:]:
+            union = union.union(file_keys[file_id].drop_duplicates(), sort=False)
+        self.union_keys = union
+
+        # ✅ One lookup per file; duplicate keys resolve to their first row
+        self.row_positions = {}
+        for file_id in file_ids:
+            keys = file_keys[file_id]
+            first_rows = ~keys.duplicated()
+            positions = keys[first_rows].get_indexer(union)
+            rows = np.full(len(union), -1, dtype=np.int64)
+            found = positions >= 0
+            rows[found] = np.flatnonzero(first_rows)[positions[found]]
+            self.row_positions[file_id] = rows
+
+        self.value_codes = {}
+        for column in sorted(set(self.common_columns) - set(self.key_columns)):
+            aligned = []
+            for file_id in file_ids:
+                values = self.files[file_id]['df'][column].to_numpy()
+                aligned.append(values[np.maximum(self.row_positions[file_id], 0)] if len(values) else np.full(len(union), None, dtype=object))
+            if len({values.dtype for values in aligned}) > 1:
+                aligned = [values.astype(object) for values in aligned]
+            # ✅ Factorize all files together so equal values share a code across files; compare ints, not objects
+            codes, _ = pd.factorize(np.concatenate(aligned))
+            codes = codes.reshape(len(file_ids), len(union)).T
+            for i, file_id in enumerate(file_ids):
+                codes[self.row_positions[file_id] < 0, i] = ABSENT
+            self.value_codes[column] = codes
+
     def compare_all(self, key_columns: Optional[List[str]] = None) -> Dict:
-        """Compare all files with each other"""
+        """Compare all files with each other in one pass over the aligned key index"""
         if len(self.files) < 2:
             raise ValueError("Need at least 2 files for comparison")
-            
-        # Generate all possible pairs
-        file_pairs = list(combinations(self.files.keys(), 2))
-        
-        # Compare each pair
-        for file1_id, file2_id in file_pairs:
-            comparison_key = f"{file1_id}_vs_{file2_id}"
-            
-            # Create temporary processor for this comparison
-            temp_processor = DataProcessor()
-            temp_processor.df1 = self.files[file1_id]['df']
-            temp_processor.df2 = self.files[file2_id]['df']
-            temp_processor.common_columns = self.common_columns
-            
-            if key_columns:
-                temp_processor.set_key_columns(key_columns)
-            
-            # Find discrepancies
-            self.comparison_results[comparison_key] = {
-                'discrepancies': temp_processor.find_discrepancies(),
-                'validation': temp_processor.validate_data(),
-                'type_analysis': temp_processor.get_type_analysis()
+
+        identifier = self.processor.rules_config.get("identifier")
+        self.key_columns = list(key_columns or ([identifier] if identifier else []))
+        missing_keys = [key for key in self.key_columns if key not in self.common_columns]
+        if not self.key_columns or missing_keys:
+            raise ValueError(f"Key columns {missing_keys or self.key_columns} not found in all files.")
+
+        self._align()
+        file_ids = list(self.files)
+        present = np.column_stack([self.row_positions[file_id] >= 0 for file_id in file_ids])
+
+        self.comparison_results = {}
+        for i, j in combinations(range(len(file_ids)), 2):
+            file1_id, file2_id = file_ids[i], file_ids[j]
+            both = present[:, i] & present[:, j]
+            by_column = {
+                column: int(np.count_nonzero(both & (codes[:, i] != codes[:, j])))
+                for column, codes in self.value_codes.items()
             }
-        
+            self.comparison_results[f"{file1_id}_vs_{file2_id}"] = {
+                'file1': file1_id,
+                'file2': file2_id,
+                'discrepancies': {
+                    'summary': {
+                        'total_rows_df1': len(self.files[file1_id]['df']),
+                        'total_rows_df2': len(self.files[file2_id]['df']),
+                        'value_mismatches': sum(by_column.values()),
+                        'missing_in_df1': int(np.count_nonzero(present[:, j] & ~present[:, i])),
+                        'missing_in_df2': int(np.count_nonzero(present[:, i] & ~present[:, j]))
+                    },
+                    'by_column': by_column
+                }
+            }
+
         return self.get_summary()
-    
+
+    def get_pair_discrepancies(self, file1_id: str, file2_id: str) -> pd.DataFrame:
+        """Mismatching cells and missing rows of one pair, read from the aligned structure"""
+        if self.union_keys is None:
+            raise ValueError("Run compare_all first")
+        file_ids = list(self.files)
+        i, j = file_ids.index(file1_id), file_ids.index(file2_id)
+        rows1, rows2 = self.row_positions[file1_id], self.row_positions[file2_id]
+        df1, df2 = self.files[file1_id]['df'], self.files[file2_id]['df']
+        key_label = self.key_columns[0] if len(self.key_columns) == 1 else tuple(self.key_columns)
+
+        frames = []
+        for column, codes in self.value_codes.items():
+            rows = np.flatnonzero((rows1 >= 0) & (rows2 >= 0) & (codes[:, i] != codes[:, j]))
+            if len(rows):
+                frames.append(pd.DataFrame({
+                    key_label: self.union_keys[rows].to_numpy(dtype=object),
+                    'Column Name': column,
+                    'Discrepancy': 'Value Mismatch',
+                    f'{file1_id} Value': df1[column].to_numpy(dtype=object)[rows1[rows]],
+                    f'{file2_id} Value': df2[column].to_numpy(dtype=object)[rows2[rows]]
+                }))
+
+        for rows, label in (
+            (np.flatnonzero((rows1 >= 0) & (rows2 < 0)), f'Missing in {file2_id}'),
+            (np.flatnonzero((rows1 < 0) & (rows2 >= 0)), f'Missing in {file1_id}')
+        ):
+            if len(rows):
+                frames.append(pd.DataFrame({
+                    key_label: self.union_keys[rows].to_numpy(dtype=object),
+                    'Column Name': 'ALL',
+                    'Discrepancy': label,
+                    f'{file1_id} Value': np.where(rows1[rows] >= 0, 'PRESENT', 'MISSING'),
+                    f'{file2_id} Value': np.where(rows2[rows] >= 0, 'PRESENT', 'MISSING')
+                }))
+
+        columns = [key_label, 'Column Name', 'Discrepancy', f'{file1_id} Value', f'{file2_id} Value']
+        return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=columns)
+
     def get_summary(self) -> Dict:
         """Get summary of all comparisons"""
         if not self.comparison_results:
             return {}
-            
+
         summary = {
             'total_files': len(self.files),
             'total_comparisons': len(self.comparison_results),
             'common_columns': len(self.common_columns),
+            'total_keys': len(self.union_keys),
             'comparisons': {}
         }
-        
+
         # Summarize each comparison
         for comp_key, results in self.comparison_results.items():
-            file1_id, file2_id = comp_key.split('_vs_')
+            file1_id, file2_id = results['file1'], results['file2']
             discrepancies = results['discrepancies']
-            
+
             summary['comparisons'][comp_key] = {
                 'file1': {
                     'id': file1_id,
@@ -93,38 +224,39 @@ class MultiFileProcessor:
                     'total_rows': discrepancies['summary']['total_rows_df2']
                 },
                 'mismatches': discrepancies['summary']['value_mismatches'],
+                'mismatches_by_column': discrepancies['by_column'],
                 'missing_rows': {
                     'in_file1': discrepancies['summary']['missing_in_df1'],
                     'in_file2': discrepancies['summary']['missing_in_df2']
                 }
             }
-        
+
         # Calculate overall statistics
-        total_mismatches = sum(comp['mismatches'] 
+        total_mismatches = sum(comp['mismatches']
                              for comp in summary['comparisons'].values())
         total_missing = sum(comp['missing_rows']['in_file1'] + comp['missing_rows']['in_file2']
                           for comp in summary['comparisons'].values())
-        
+
         summary['overall_stats'] = {
             'total_mismatches': total_mismatches,
             'total_missing_rows': total_missing,
             'average_mismatches_per_comparison': total_mismatches / len(self.comparison_results)
         }
-        
+
         return summary
-    
+
     def get_comparison_matrix(self) -> pd.DataFrame:
         """Generate comparison matrix showing differences between all files"""
         file_ids = list(self.files.keys())
         matrix = pd.DataFrame(0, index=file_ids, columns=file_ids)
-        
-        for comp_key, results in self.comparison_results.items():
-            file1_id, file2_id = comp_key.split('_vs_')
+
+        for results in self.comparison_results.values():
+            file1_id, file2_id = results['file1'], results['file2']
             total_diff = (results['discrepancies']['summary']['value_mismatches'] +
                         results['discrepancies']['summary']['missing_in_df1'] +
                         results['discrepancies']['summary']['missing_in_df2'])
-            
+
             matrix.loc[file1_id, file2_id] = total_diff
             matrix.loc[file2_id, file1_id] = total_diff
-        
-        return matrix 
\ No newline at end of file
+
+        return matrix
@@ -0,0 +1,71 @@
+import re
+from decimal import ROUND_HALF_EVEN, Decimal
+from typing import Iterable
+
+import numpy as np
+import pandas as pd
+
+UNIT_MULTIPLIERS = {"K": 1e3, "M": 1e6, "B": 1e9, "T": 1e12}
+
+# Sign, optional currency symbol, digits (with an exponent) and an optional K/M/B/T unit, once commas and spaces are gone
+SUFFIXED_NUMBER = re.compile(r"^([-+]?)[$€£]?((?:\d+\.?\d*|\.\d+)(?:E[-+]?\d+)?)([KMBT]?)$", re.IGNORECASE)
+
+
+def parse_numeric(values: pd.Series) -> pd.Series:
+    """Float values of a column of numbers or text like "1,234", "1.2M", "-3.5 k" or "$2B" (NaN when not a number).
+
+    Each distinct value is parsed once (regex extraction plus a multiplier lookup over the
+    distinct values) and broadcast back through its factorized code.
+    """
+    if pd.api.types.is_numeric_dtype(values.dtype):
+        return values.astype(float)
+
+    codes, uniques = pd.factorize(values)
+    parsed = pd.to_numeric(pd.Series(uniques, dtype=object), errors="coerce").to_numpy(dtype=float)
+
+    # ✅ Only the distinct values that are not plain numbers go through the regex
+    pending = np.flatnonzero(np.isnan(parsed))
+    if len(pending):
+        text = pd.Series(uniques[pending], dtype=object).astype(str).str.replace(r"[,\s]", "", regex=True)
+        parts = text.str.extract(SUFFIXED_NUMBER)
+        number = pd.to_numeric(parts[1], errors="coerce").to_numpy(dtype=float)
+        multiplier = parts[2].str.upper().map(UNIT_MULTIPLIERS).fillna(1.0).to_numpy(dtype=float)
+        sign = np.where(parts[0] == "-", -1.0, 1.0)
+        parsed[pending] = sign * number * multiplier
+
+    result = np.full(len(values), np.nan)
+    found = codes >= 0
+    result[found] = parsed[codes[found]]
+    return pd.Series(result, index=values.index, name=values.name)
+
+
+def parse_numeric_columns(df: pd.DataFrame, columns: Iterable[str]) -> pd.DataFrame:
+    """Frame with the given columns (those present) parsed by parse_numeric; other columns are shared, not copied."""
+    present = [column for column in columns if column in df.columns]
+    if not present:
+        return df
+    return df.assign(**{column: parse_numeric(df[column]) for column in present})
+
+
+# Scaled value of a missing/unparseable number; never flagged
+MISSING_SCALED = np.iinfo(np.int64).min
+
+# Largest magnitude a scaled value may reach, so a delta of two of them still fits in int64
+MAX_SCALED = 2 ** 62
+
+
+def to_scaled_int(values: pd.Series, decimal_places: int) -> np.ndarray:
+    """int64 of the numbers times 10 ** decimal_places, rounded half to even; MISSING_SCALED where not a number."""
+    numbers = values.to_numpy(dtype=float, na_value=np.nan)
+    scaled = np.rint(numbers * 10.0 ** decimal_places)
+    missing = np.isnan(scaled)
+    if np.abs(scaled[~missing]).max(initial=0) >= MAX_SCALED:
+        raise ValueError(f"Column '{values.name}' has values too large for {decimal_places} decimal places.")
+    return np.where(missing, MISSING_SCALED, np.where(missing, 0, scaled).astype(np.int64))
+
+
+def scale_limit(limit: float, decimal_places: int):
+    """A threshold in the same scaled units, exactly as written (0.1 -> 1000 at 4 places); infinite limits stay as they are."""
+    if not np.isfinite(limit):
+        return limit
+    return int(Decimal(str(limit)).scaleb(decimal_places).to_integral_value(rounding=ROUND_HALF_EVEN))
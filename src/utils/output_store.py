@@ -0,0 +1,192 @@
+import hashlib
+import json
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+_JOB_ID_PATTERN = re.compile(r"^[0-9a-f]{16,64}$")
+
+
+class OutputStore:
+    """Per-job output directories with age and disk-budget eviction.
+
+    Every job writes into ``<root>/<job_id>/`` where ``job_id`` is derived from
+    the content of its inputs, so concurrent requests never share a file.
+    Evicted jobs keep a small marker so downloads can answer 410 instead of 404.
+    """
+
+    META_FILE = "job.json"
+    EVICTED_MARKER = ".evicted"
+
+    def __init__(
+        self,
+        root: str,
+        max_age_seconds: float = 24 * 3600,
+        max_total_bytes: int = 1024 ** 3,
+        tombstone_seconds: float = 7 * 24 * 3600
+    ):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.max_age_seconds = max_age_seconds
+        self.max_total_bytes = max_total_bytes
+        self.tombstone_seconds = tombstone_seconds
+        self._lock = threading.Lock()
+        self._janitor = None
+        self._stop_event = threading.Event()
+
+    @staticmethod
+    def job_id_for(*parts) -> str:
+        """Build a content-addressed job id from the bytes/strings that define a job."""
+        digest = hashlib.sha256()
+        for part in parts:
+            data = part if isinstance(part, bytes) else str(part).encode("utf-8")
+            digest.update(len(data).to_bytes(8, "big"))
+            digest.update(data)
+        return digest.hexdigest()[:32]
+
+    def job_dir(self, job_id: str) -> Path:
+        """Return the directory of a job, rejecting ids that could escape the root."""
+        if not _JOB_ID_PATTERN.match(job_id):
+            raise ValueError(f"Invalid job id: {job_id}")
+        return self.root / job_id
+
+    def write_result(self, job_id: str, filename: str, writer: Callable[[str], None], meta: Optional[Dict] = None) -> Path:
+        """Write a job result atomically using ``writer(path)`` and record its metadata."""
+        job_dir = self.job_dir(job_id)
+        job_dir.mkdir(parents=True, exist_ok=True)
+
+        # ✅ Write to a temp file first so readers never see a partial result
+        fd, temp_path = tempfile.mkstemp(dir=job_dir, prefix=".tmp_", suffix=Path(filename).suffix)
+        os.close(fd)
+        try:
+            writer(temp_path)
+            os.replace(temp_path, job_dir / filename)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+        marker = job_dir / self.EVICTED_MARKER
+        if marker.exists():
+            marker.unlink()
+
+        self.update_meta(job_id, filename=filename, created_at=time.time(), **(meta or {}))
+        return job_dir / filename
+
+    def read_meta(self, job_id: str) -> Optional[Dict]:
+        """Return the stored metadata of a job, or None if there is none."""
+        meta_path = self.job_dir(job_id) / self.META_FILE
+        if not meta_path.exists():
+            return None
+        try:
+            with open(meta_path, "r") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def update_meta(self, job_id: str, **fields) -> Dict:
+        """Merge fields into the metadata of a job."""
+        job_dir = self.job_dir(job_id)
+        job_dir.mkdir(parents=True, exist_ok=True)
+        with self._lock:
+            meta = self.read_meta(job_id) or {"job_id": job_id}
+            meta.update(fields)
+            fd, temp_path = tempfile.mkstemp(dir=job_dir, prefix=".tmp_", suffix=".json")
+            with os.fdopen(fd, "w") as f:
+                json.dump(meta, f, indent=2, default=str)
+            os.replace(temp_path, job_dir / self.META_FILE)
+        return meta
+
+    def status(self, job_id: str) -> str:
+        """Return ``available``, ``evicted`` or ``missing`` for a job."""
+        job_dir = self.job_dir(job_id)
+        if (job_dir / self.EVICTED_MARKER).exists():
+            return "evicted"
+        meta = self.read_meta(job_id)
+        if meta and meta.get("filename") and (job_dir / meta["filename"]).exists():
+            return "available"
+        return "missing"
+
+    def result_path(self, job_id: str) -> Optional[Path]:
+        """Return the result file of an available job and mark it as recently used."""
+        if self.status(job_id) != "available":
+            return None
+        job_dir = self.job_dir(job_id)
+        os.utime(job_dir / self.META_FILE)  # ✅ Keeps recently downloaded results last in line for eviction
+        return job_dir / self.read_meta(job_id)["filename"]
+
+    def _job_size(self, job_dir: Path) -> int:
+        return sum(f.stat().st_size for f in job_dir.iterdir() if f.is_file())
+
+    def _evict(self, job_dir: Path) -> None:
+        """Delete a job's files but keep a marker so it can be reported as gone."""
+        for item in job_dir.iterdir():
+            if item.is_dir():
+                shutil.rmtree(item, ignore_errors=True)
+            elif item.name != self.EVICTED_MARKER:
+                item.unlink()
+        (job_dir / self.EVICTED_MARKER).touch()
+
+    def evict_expired(self) -> List[str]:
+        """Evict results older than the age limit, then the least recently used ones above the disk budget."""
+        now = time.time()
+        evicted = []
+        live = []
+
+        with self._lock:
+            for job_dir in self.root.iterdir():
+                if not job_dir.is_dir() or not _JOB_ID_PATTERN.match(job_dir.name):
+                    continue
+                marker = job_dir / self.EVICTED_MARKER
+                if marker.exists():
+                    # ✅ Forget tombstones once they are old enough
+                    if now - marker.stat().st_mtime > self.tombstone_seconds:
+                        shutil.rmtree(job_dir, ignore_errors=True)
+                    continue
+
+                meta_path = job_dir / self.META_FILE
+                last_used = meta_path.stat().st_mtime if meta_path.exists() else job_dir.stat().st_mtime
+                if now - last_used > self.max_age_seconds:
+                    self._evict(job_dir)
+                    evicted.append(job_dir.name)
+                else:
+                    live.append((last_used, job_dir, self._job_size(job_dir)))
+
+            total_bytes = sum(size for _, _, size in live)
+            for _, job_dir, size in sorted(live, key=lambda item: item[0]):
+                if total_bytes <= self.max_total_bytes:
+                    break
+                self._evict(job_dir)
+                evicted.append(job_dir.name)
+                total_bytes -= size
+
+        return evicted
+
+    def start_janitor(self, interval_seconds: float = 300) -> None:
+        """Run eviction periodically in a background daemon thread."""
+        if self._janitor is not None and self._janitor.is_alive():
+            return
+        self._stop_event.clear()
+
+        def run():
+            while True:
+                try:
+                    self.evict_expired()
+                except Exception as e:
+                    print(f"Warning: Output janitor failed - {str(e)}")
+                if self._stop_event.wait(interval_seconds):
+                    break
+
+        self._janitor = threading.Thread(target=run, name="output-janitor", daemon=True)
+        self._janitor.start()
+
+    def stop_janitor(self) -> None:
+        """Stop the background janitor thread."""
+        self._stop_event.set()
+        if self._janitor is not None:
+            self._janitor.join(timeout=5)
+            self._janitor = None
@@ -0,0 +1,72 @@
+import threading
+import time
+from typing import Callable, Optional
+
+
+class ComparisonCancelled(Exception):
+    """Raised inside a comparison once its job was cancelled or ran past its deadline."""
+
+
+class ProgressReporter:
+    """Cooperative progress and cancellation hook for long comparisons.
+
+    The comparison calls ``update`` per read chunk and per rule/column; every call
+    refreshes ``percent`` and raises ComparisonCancelled if the job should stop.
+    """
+
+    # Share of the overall percentage given to each stage, in execution order
+    STAGES = (("read", 30), ("merge", 10), ("rules", 55), ("export", 5))
+
+    def __init__(self, callback: Optional[Callable[[float, str], None]] = None, max_runtime_seconds: Optional[float] = None):
+        self.callback = callback
+        self.percent = 0.0
+        self.stage = "queued"
+        self.started_at = time.monotonic()
+        self.deadline = self.started_at + max_runtime_seconds if max_runtime_seconds else None
+        self._cancel_event = threading.Event()
+
+    def cancel(self) -> None:
+        """Ask the running comparison to stop at its next checkpoint."""
+        self._cancel_event.set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancel_event.is_set()
+
+    def check(self) -> None:
+        """Raise ComparisonCancelled if the job was cancelled or exceeded its runtime budget."""
+        if self._cancel_event.is_set():
+            raise ComparisonCancelled("Comparison was cancelled.")
+        if self.deadline is not None and time.monotonic() > self.deadline:
+            self._cancel_event.set()
+            raise ComparisonCancelled("Comparison exceeded its maximum runtime.")
+
+    def update(self, stage: str, done: float, total: float = 1) -> None:
+        """Report that ``done`` of ``total`` units of ``stage`` are finished."""
+        base = 0
+        for name, weight in self.STAGES:
+            if name == stage:
+                fraction = min(max(done / total, 0.0), 1.0) if total else 1.0
+                # ✅ Never move backwards (e.g. a re-read after the merge)
+                self.percent = max(self.percent, round(base + weight * fraction, 1))
+                break
+            base += weight
+        self.stage = stage
+        if self.callback is not None:
+            self.callback(self.percent, stage)
+        self.check()
+
+    def finish(self) -> None:
+        """Mark the job as fully done."""
+        self.percent = 100.0
+        self.stage = "done"
+        if self.callback is not None:
+            self.callback(self.percent, self.stage)
+
+    def as_dict(self) -> dict:
+        return {
+            "percent": self.percent,
+            "stage": self.stage,
+            "cancelled": self.cancelled,
+            "elapsed_seconds": round(time.monotonic() - self.started_at, 3)
+        }
@@ -0,0 +1,117 @@
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from .result_cache import ResultCache
+
+
+class ReferenceSet:
+    """Distinct values of a reference column or allowed list, probed through pandas' hash tables."""
+
+    def __init__(self, values: pd.Index):
+        self.values = values.dropna().unique()
+        self._text = None
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    @property
+    def text(self) -> pd.Index:
+        """The values as stripped text, for probing columns of another kind (e.g. numeric codes read as text)."""
+        if self._text is None:
+            self._text = pd.Index(self.values.astype(str).str.strip()).unique()
+        return self._text
+
+    def contains(self, values: pd.Series) -> np.ndarray:
+        """Row mask of values found in the set; nulls pass (not_null rules check them)."""
+        if pd.api.types.is_numeric_dtype(values.dtype) == pd.api.types.is_numeric_dtype(self.values.dtype):
+            found = values.isin(self.values)
+        else:
+            found = values.astype(str).str.strip().isin(self.text)
+        return (found | values.isna()).to_numpy(dtype=bool)
+
+
+class ReferenceSetCache:
+    """Process-wide LRU of reference sets keyed by the content hash of their file (or list) and column.
+
+    A master file is parsed once; later rules and runs reuse the set until the file's
+    bytes change. File hashes are remembered per (path, size, mtime) to skip re-hashing.
+    """
+
+    def __init__(self, max_entries: int = 16):
+        self.max_entries = max_entries
+        self._sets = OrderedDict()
+        self._file_hashes = {}
+        self._lock = threading.Lock()
+
+    def _file_hash(self, path: Path) -> str:
+        stat = path.stat()
+        signature = (str(path.resolve()), stat.st_size, stat.st_mtime_ns)
+        with self._lock:
+            digest = self._file_hashes.get(signature)
+        if digest is None:
+            digest = ResultCache.hash_source(path)
+            with self._lock:
+                self._file_hashes[signature] = digest
+        return digest
+
+    def get(self, rule: Dict) -> ReferenceSet:
+        """Set of a rule with ``allowed_values`` (a list) or ``reference_file`` (plus optional ``reference_column``)."""
+        if "allowed_values" in rule:
+            key = ("values", ResultCache.canonical_hash(rule["allowed_values"]))
+            loader = lambda: pd.Index(rule["allowed_values"])
+        elif "reference_file" in rule:
+            path = Path(rule["reference_file"])
+            column = rule.get("reference_column")
+            key = ("file", self._file_hash(path), column, rule.get("reference_sheet"))
+            loader = lambda: read_reference_values(path, column, rule.get("reference_sheet"))
+        else:
+            raise ValueError(f"Rule '{rule.get('description', rule.get('type'))}' needs allowed_values or reference_file.")
+
+        with self._lock:
+            reference = self._sets.get(key)
+            if reference is not None:
+                self._sets.move_to_end(key)
+                return reference
+
+        reference = ReferenceSet(loader())
+        with self._lock:
+            self._sets[key] = reference
+            while len(self._sets) > self.max_entries:
+                self._sets.popitem(last=False)
+        return reference
+
+    def fingerprint(self, rules: List[Dict]) -> Dict[str, str]:
+        """Content hash of every reference file named by the rules."""
+        return {rule["reference_file"]: self._file_hash(Path(rule["reference_file"])) for rule in rules if "reference_file" in rule}
+
+    def clear(self) -> None:
+        with self._lock:
+            self._sets.clear()
+            self._file_hashes.clear()
+
+
+def read_reference_values(path: Path, column: Optional[str] = None, sheet=None) -> pd.Index:
+    """Values of one column of a CSV/Excel file, or one value per line of a plain list when no column is given."""
+    if column is None:
+        with open(path, "r", encoding="utf-8") as file:
+            return pd.Index([line.strip() for line in file if line.strip()])
+    if path.suffix.lower() in (".xlsx", ".xls"):
+        df = pd.read_excel(path, sheet_name=sheet or 0, usecols=[column], engine="openpyxl")
+    else:
+        df = pd.read_csv(path, usecols=[column])
+    return pd.Index(df[column])
+
+
+def is_reference_rule(rule: Dict) -> bool:
+    """Rules checking values against a reference file or an allowed list."""
+    return "reference_file" in rule or "allowed_values" in rule
+
+
+# ✅ Shared by compare_files and the validation engine
+REFERENCE_SETS = ReferenceSetCache(int(os.getenv("REFERENCE_SET_CACHE_ENTRIES", 16)))
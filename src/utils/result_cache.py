@@ -0,0 +1,151 @@
+import hashlib
+import json
+import os
+import pickle
+import tempfile
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Optional
+
+import pandas as pd
+
+# Bump when the comparison logic changes so stale results are never served
+CACHE_VERSION = "1"
+
+
+class ResultCache:
+    """Disk-backed LRU cache of comparison results keyed by content hashes.
+
+    The key covers the bytes of both inputs, the canonical rules config, the filters
+    and the file type, so a repeated comparison is served without parsing anything.
+    A small in-memory tier in front of the disk avoids unpickling hot entries.
+    """
+
+    def __init__(self, cache_dir: str, max_entries: int = 256, max_bytes: int = 512 * 1024 ** 2, memory_entries: int = 8):
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.memory_entries = memory_entries
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def hash_source(source) -> str:
+        """Hash the bytes of a file path, raw bytes or an uploaded file-like object."""
+        digest = hashlib.sha256()
+        if isinstance(source, (bytes, bytearray)):
+            digest.update(source)
+        elif isinstance(source, (str, Path)):
+            with open(source, "rb") as f:
+                for block in iter(lambda: f.read(1024 * 1024), b""):
+                    digest.update(block)
+        elif hasattr(source, "getbuffer"):
+            digest.update(source.getbuffer())
+        else:
+            position = source.tell()
+            source.seek(0)
+            for block in iter(lambda: source.read(1024 * 1024), b""):
+                digest.update(block)
+            source.seek(position)
+        return digest.hexdigest()
+
+    @staticmethod
+    def canonical_hash(value) -> str:
+        """Hash JSON-like data independently of key order and whitespace."""
+        canonical = json.dumps(value, sort_keys=True, separators=(",", ":"), default=str)
+        return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+    def make_key(self, baseline, candidate, rules_config: Dict, filters: Optional[Dict], file_type: str) -> str:
+        parts = [
+            CACHE_VERSION,
+            self.hash_source(baseline),
+            self.hash_source(candidate),
+            self.canonical_hash(rules_config),
+            self.canonical_hash(filters or {}),
+            file_type
+        ]
+        return hashlib.sha256("|".join(parts).encode("utf-8")).hexdigest()
+
+    def _path(self, key: str) -> Path:
+        return self.cache_dir / f"{key}.pkl"
+
+    def get(self, key: str) -> Optional[Dict]:
+        """Return a cached payload (results are copied so callers may modify them), or None."""
+        with self._lock:
+            payload = self._memory.get(key)
+            if payload is not None:
+                self._memory.move_to_end(key)
+
+        if payload is None:
+            path = self._path(key)
+            try:
+                payload = pd.read_pickle(path)
+            except FileNotFoundError:
+                return None
+            except (OSError, EOFError, ValueError, pickle.UnpicklingError, AttributeError, ImportError):
+                # ✅ Corrupt, truncated or stale (moved classes) entry: a miss, removed so the next put replaces it
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+                return None
+            try:
+                os.utime(path)  # ✅ Mark as recently used for LRU eviction
+            except OSError:
+                pass
+            self._remember(key, payload)
+
+        return {name: value.copy() if isinstance(value, pd.DataFrame) else value for name, value in payload.items()}
+
+    def put(self, key: str, payload: Dict) -> None:
+        """Store a payload (a dict of results and related data) and evict least recently used entries."""
+        fd, temp_path = tempfile.mkstemp(dir=self.cache_dir, prefix=".tmp_", suffix=".pkl")
+        os.close(fd)
+        try:
+            pd.to_pickle(payload, temp_path)
+            os.replace(temp_path, self._path(key))
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+        # ✅ Keep a private copy in memory; the caller still owns (and may modify) its frames
+        self._remember(key, {name: value.copy() if isinstance(value, pd.DataFrame) else value for name, value in payload.items()})
+        self._evict()
+
+    def _remember(self, key: str, payload: Dict) -> None:
+        with self._lock:
+            self._memory[key] = payload
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.memory_entries:
+                self._memory.popitem(last=False)
+
+    def _evict(self) -> None:
+        entries = []
+        for path in self.cache_dir.glob("*.pkl"):
+            if path.name.startswith(".tmp_"):
+                continue
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+
+        entries.sort()
+        total_bytes = sum(size for _, size, _ in entries)
+        while entries and (len(entries) > self.max_entries or total_bytes > self.max_bytes):
+            _, size, path = entries.pop(0)
+            try:
+                path.unlink()
+            except OSError:
+                pass
+            total_bytes -= size
+            with self._lock:
+                self._memory.pop(path.stem, None)
+
+    def clear(self) -> None:
+        """Drop every cached result."""
+        with self._lock:
+            self._memory.clear()
+        for path in self.cache_dir.glob("*.pkl"):
+            path.unlink()
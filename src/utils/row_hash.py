@@ -0,0 +1,54 @@
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+
+def row_hashes(df: pd.DataFrame, columns: Optional[List[str]] = None) -> np.ndarray:
+    """64-bit hash of every row over the given columns (all columns by default), ignoring the index."""
+    frame = df if columns is None else df[columns]
+    if frame.shape[1] == 0:
+        return np.zeros(len(frame), dtype=np.uint64)
+    return pd.util.hash_pandas_object(frame, index=False).to_numpy()
+
+
+class RowHashIndex:
+    """Key -> row hash of one parsed input, plus the column layout the hashes were computed on."""
+
+    def __init__(self, key_column: str, hashes: pd.Series, dtypes: Dict[str, str]):
+        self.key_column = key_column
+        self.hashes = hashes
+        self.dtypes = dtypes
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame, key_column: str) -> "RowHashIndex":
+        # ✅ The key is the index already; hashing only the other columns skips the costliest (unique) column
+        values = row_hashes(df, [column for column in df.columns if column != key_column])
+        hashes = pd.Series(values, index=pd.Index(df[key_column]), dtype=np.uint64)
+        return cls(key_column, hashes, df.dtypes.astype(str).to_dict())
+
+    @property
+    def keys(self) -> pd.Index:
+        return self.hashes.index
+
+    @property
+    def has_unique_keys(self) -> bool:
+        return self.hashes.index.is_unique
+
+    def compatible(self, other: "RowHashIndex") -> bool:
+        """Same key column and the same columns with the same dtypes (in the same order)."""
+        return self.key_column == other.key_column and list(self.dtypes.items()) == list(other.dtypes.items())
+
+    def diff(self, previous: "RowHashIndex") -> Dict[str, pd.Index]:
+        """Keys inserted, deleted and changed since ``previous`` (both indexes must have unique keys)."""
+        positions = previous.keys.get_indexer(self.keys)
+        found = positions >= 0
+        current_hashes = self.hashes.to_numpy()
+        previous_hashes = previous.hashes.to_numpy()
+        changed = np.zeros(len(self.keys), dtype=bool)
+        changed[found] = current_hashes[found] != previous_hashes[positions[found]]
+        return {
+            "inserted": self.keys[~found],
+            "deleted": previous.keys.difference(self.keys, sort=False),
+            "changed": self.keys[changed]
+        }
@@ -0,0 +1,105 @@
+import os
+import shutil
+import tempfile
+import uuid
+from typing import Optional
+
+import pandas as pd
+
+
+def _pyarrow():
+    """Import pyarrow lazily so it is only required when shared frames are used."""
+    try:
+        import pyarrow
+        import pyarrow.ipc  # noqa: F401
+    except ImportError as e:
+        raise ImportError("Shared frames need pyarrow; install it with `pip install pyarrow`.") from e
+    return pyarrow
+
+
+class SharedFrame:
+    """Picklable handle to a DataFrame stored as a memory-mapped Arrow IPC file.
+
+    Sending the handle to a worker process costs a file path, not the data: every process
+    maps the same file, so the operating system keeps one copy in the page cache. Frames
+    Arrow cannot hold as they are (object columns mixing types, e.g. '1.2M' and 350) are
+    stored as a pickle file instead, which every process reads into its own copy.
+    """
+
+    def __init__(self, path: str, num_rows: int, columns: list):
+        self.path = path
+        self.num_rows = num_rows
+        self.columns = columns
+
+    @property
+    def is_arrow(self) -> bool:
+        return self.path.endswith(".arrow")
+
+    def attach_table(self):
+        """Map the file and return a zero-copy Arrow table."""
+        if not self.is_arrow:
+            raise ValueError(f"{self!r} is stored as a pickle, not as an Arrow table.")
+        pa = _pyarrow()
+        # ✅ Not closed here: the table's buffers point into the mapping
+        return pa.ipc.open_file(pa.memory_map(self.path, "r")).read_all()
+
+    def attach(self) -> pd.DataFrame:
+        """Return the frame; numeric columns without nulls of an Arrow file stay views of the mapping (read-only)."""
+        if not self.is_arrow:
+            return pd.read_pickle(self.path)
+        return self.attach_table().to_pandas(split_blocks=True)
+
+    def __len__(self) -> int:
+        return self.num_rows
+
+    def __repr__(self) -> str:
+        return f"SharedFrame({self.path!r}, rows={self.num_rows})"
+
+
+class SharedFrameStore:
+    """Directory of Arrow IPC files holding parsed inputs once for all worker processes."""
+
+    def __init__(self, root: Optional[str] = None):
+        self._owns_root = root is None
+        self.root = root or tempfile.mkdtemp(prefix="shared_frames_")
+        os.makedirs(self.root, exist_ok=True)
+
+    def put(self, df: pd.DataFrame, name: Optional[str] = None) -> SharedFrame:
+        """Write a frame (atomically) and return its handle; falls back to a pickle file if Arrow cannot hold it."""
+        pa = _pyarrow()
+        name = name or uuid.uuid4().hex
+        try:
+            table = pa.Table.from_pandas(df, preserve_index=False)
+        except (pa.ArrowTypeError, pa.ArrowInvalid):
+            # ✅ Casting mixed-type columns to str would change what the rules see; keep the values as they are
+            table = None
+        path = os.path.join(self.root, f"{name}.arrow" if table is not None else f"{name}.pkl")
+        temp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        try:
+            if table is not None:
+                with pa.OSFile(temp_path, "wb") as sink:
+                    with pa.ipc.new_file(sink, table.schema) as writer:
+                        writer.write_table(table)
+            else:
+                df.reset_index(drop=True).to_pickle(temp_path)
+            os.replace(temp_path, path)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+        return SharedFrame(path, len(df), list(df.columns))
+
+    def close(self) -> None:
+        """Delete the files (only a store that created its own temporary directory removes it)."""
+        if self._owns_root:
+            shutil.rmtree(self.root, ignore_errors=True)
+        else:
+            for entry in os.listdir(self.root):
+                if entry.endswith((".arrow", ".pkl")):
+                    os.remove(os.path.join(self.root, entry))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
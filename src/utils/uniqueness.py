@@ -0,0 +1,225 @@
+import os
+import shutil
+import tempfile
+from typing import Dict, Iterable, List, Optional, Union
+
+import numpy as np
+import pandas as pd
+
+from .row_hash import row_hashes
+
+
+class DuplicateKeyError(ValueError):
+    """The identifier repeats in both inputs, so merging on it would multiply rows; ``report`` has the details."""
+
+    def __init__(self, message: str, report: Dict):
+        super().__init__(message)
+        self.report = report
+
+
+def estimate_merge(baseline: pd.Series, candidate: pd.Series, top: int = 10) -> Dict:
+    """Rows an outer merge on these key columns would produce, from the key counts alone.
+
+    A key repeated b times in the baseline and c times in the candidate yields b x c rows;
+    ``top_keys`` lists the keys repeated on both sides that contribute the most.
+    """
+    baseline_counts = baseline.value_counts(dropna=False)
+    candidate_counts = candidate.value_counts(dropna=False)
+    common = baseline_counts.index.intersection(candidate_counts.index)
+    common_baseline = baseline_counts.reindex(common)
+    common_candidate = candidate_counts.reindex(common)
+    products = common_baseline * common_candidate
+    many_to_many = products[(common_baseline > 1) & (common_candidate > 1)].sort_values(ascending=False)
+    matched_rows = int(products.sum())
+    return {
+        "baseline_rows": len(baseline),
+        "candidate_rows": len(candidate),
+        "matched_rows": matched_rows,
+        "merged_rows": matched_rows + (len(baseline) - int(common_baseline.sum())) + (len(candidate) - int(common_candidate.sum())),
+        "many_to_many_keys": len(many_to_many),
+        "top_keys": [
+            {"key": key, "baseline": int(common_baseline[key]), "candidate": int(common_candidate[key]), "rows": int(rows)}
+            for key, rows in many_to_many.head(top).items()
+        ]
+    }
+
+
+class UniquenessChecker:
+    """Hash-partitioned duplicate detection on a single or multi-column key.
+
+    Rows are reduced to a 64-bit key hash and routed to one of ``partitions`` buckets by
+    that hash, so every bucket can be resolved on its own (optionally spilled to
+    ``spill_dir`` to bound memory). Works on a DataFrame, an iterator of chunks
+    (e.g. ``pd.read_csv(chunksize=...)``) or a Dask DataFrame; row positions are
+    0-based over the whole input.
+    """
+
+    # resolve() of an input without duplicates
+    NO_DUPLICATES = {"groups": [], "group_count": 0, "positions": np.empty(0, dtype=np.int64)}
+
+    def __init__(self, columns: Union[str, List[str]], partitions: int = 16, max_groups: int = 100, max_positions: int = 1000, spill_dir: Optional[str] = None):
+        self.columns = [columns] if isinstance(columns, str) else list(columns)
+        self.partitions = partitions
+        self.max_groups = max_groups
+        # ✅ Positions listed per group; count always covers the whole group
+        self.max_positions = max_positions
+        self.spill_dir = spill_dir
+        self.rows = 0
+        self._buckets = [([], []) for _ in range(partitions)]
+        self._spill_root = None
+
+    def _store(self, hashes: np.ndarray, positions: np.ndarray) -> None:
+        bucket_of = hashes % np.uint64(self.partitions)
+        order = np.argsort(bucket_of, kind="stable")
+        bounds = np.searchsorted(bucket_of[order], np.arange(self.partitions + 1))
+        for bucket in range(self.partitions):
+            rows = order[bounds[bucket]:bounds[bucket + 1]]
+            if not len(rows):
+                continue
+            if self.spill_dir:
+                if self._spill_root is None:
+                    self._spill_root = tempfile.mkdtemp(prefix="uniqueness_", dir=self.spill_dir)
+                with open(os.path.join(self._spill_root, f"{bucket}.hashes"), "ab") as f:
+                    hashes[rows].tofile(f)
+                with open(os.path.join(self._spill_root, f"{bucket}.positions"), "ab") as f:
+                    positions[rows].tofile(f)
+            else:
+                self._buckets[bucket][0].append(hashes[rows])
+                self._buckets[bucket][1].append(positions[rows])
+
+    def add(self, chunk: pd.DataFrame) -> np.ndarray:
+        """Add the next chunk of rows; returns their key hashes."""
+        return self.add_hashes(row_hashes(chunk, self.columns))
+
+    def add_hashes(self, hashes: np.ndarray) -> np.ndarray:
+        """Add the key hashes of the next rows (e.g. computed by Dask workers)."""
+        hashes = np.asarray(hashes, dtype=np.uint64)
+        self._store(hashes, np.arange(self.rows, self.rows + len(hashes), dtype=np.int64))
+        self.rows += len(hashes)
+        return hashes
+
+    def _bucket(self, bucket: int):
+        if self.spill_dir:
+            if self._spill_root is None:
+                return np.empty(0, dtype=np.uint64), np.empty(0, dtype=np.int64)
+            path = os.path.join(self._spill_root, f"{bucket}")
+            if not os.path.exists(f"{path}.hashes"):
+                return np.empty(0, dtype=np.uint64), np.empty(0, dtype=np.int64)
+            return np.fromfile(f"{path}.hashes", dtype=np.uint64), np.fromfile(f"{path}.positions", dtype=np.int64)
+        hashes, positions = self._buckets[bucket]
+        if not hashes:
+            return np.empty(0, dtype=np.uint64), np.empty(0, dtype=np.int64)
+        return np.concatenate(hashes), np.concatenate(positions)
+
+    def resolve(self) -> Dict:
+        """First ``max_groups`` duplicate groups (by first row), number of groups and all duplicated positions."""
+        top, group_count, duplicated = [], 0, []
+        for bucket in range(self.partitions):
+            hashes, positions = self._bucket(bucket)
+            if len(hashes) < 2:
+                continue
+            # ✅ Positions are stored in ascending order, and the stable sort keeps them so within a group
+            order = np.argsort(hashes, kind="stable")
+            sorted_hashes = hashes[order]
+            starts = np.flatnonzero(np.r_[True, sorted_hashes[1:] != sorted_hashes[:-1]])
+            sizes = np.diff(np.r_[starts, len(sorted_hashes)])
+            repeated = sizes > 1
+            if not repeated.any():
+                continue
+            group_count += int(repeated.sum())
+            duplicated.append(positions[order[np.repeat(repeated, sizes)]])
+            starts, sizes = starts[repeated], sizes[repeated]
+            # ✅ The global first groups are among each bucket's first groups
+            for i in np.argsort(positions[order[starts]], kind="stable")[:self.max_groups]:
+                top.append(positions[order[starts[i]:starts[i] + sizes[i]]])
+        top.sort(key=lambda group: group[0])
+        return {
+            "groups": top[:self.max_groups],
+            "group_count": group_count,
+            "positions": np.sort(np.concatenate(duplicated)) if duplicated else np.empty(0, dtype=np.int64)
+        }
+
+    def report(self, resolved: Dict, keys: Optional[List] = None) -> Dict:
+        """Summary plus the first ``max_groups`` duplicate groups (key when known, row positions)."""
+        return {
+            "columns": self.columns,
+            "rows": self.rows,
+            "unique": resolved["group_count"] == 0,
+            "duplicate_rows": len(resolved["positions"]),
+            "duplicate_groups": resolved["group_count"],
+            "groups": [
+                {"key": keys[i] if keys is not None else None, "count": len(group), "positions": group[:self.max_positions].tolist()}
+                for i, group in enumerate(resolved["groups"])
+            ]
+        }
+
+    def finish(self) -> Dict:
+        """Resolve every bucket and report; key values are unknown for a one-pass chunk stream."""
+        try:
+            return self.report(self.resolve())
+        finally:
+            self.close()
+
+    def close(self) -> None:
+        self._buckets = [([], []) for _ in range(self.partitions)]
+        if self._spill_root:
+            shutil.rmtree(self._spill_root, ignore_errors=True)
+            self._spill_root = None
+
+    def _key(self, row: pd.Series):
+        values = tuple(row.tolist())
+        return values[0] if len(values) == 1 else values
+
+    def group_keys(self, resolved: Dict, keys: pd.DataFrame) -> List:
+        """Key of each reported group, read at its first position in ``keys`` (the key columns of every row, in order)."""
+        return [self._key(keys.iloc[group[0]]) for group in resolved["groups"]]
+
+    def check(self, data: Union[pd.DataFrame, Iterable[pd.DataFrame]]) -> Dict:
+        """Check a DataFrame, an iterator of chunks or a Dask DataFrame."""
+        self.rows = 0
+        if isinstance(data, pd.DataFrame):
+            return self.check_frame(data)
+        if hasattr(data, "npartitions") and hasattr(data, "map_partitions"):
+            return self.check_dask(data)
+        for chunk in data:
+            self.add(chunk)
+        return self.finish()
+
+    def check_frame(self, df: pd.DataFrame) -> Dict:
+        """In-memory check; a single-column key that is unique (the usual case) costs one hash table pass."""
+        missing = [column for column in self.columns if column not in df.columns]
+        if missing:
+            raise KeyError(f"Key columns {missing} not found.")
+        keys = df[self.columns]
+        if len(self.columns) == 1 and keys.iloc[:, 0].is_unique:
+            self.rows = len(df)
+            return self.report(self.NO_DUPLICATES)
+        self.rows = 0
+        self.add(keys)
+        resolved = self.resolve()
+        self.close()
+        return self.report(resolved, self.group_keys(resolved, keys))
+
+    def check_dask(self, ddf) -> Dict:
+        """Dask check: workers hash their partitions and only the 8-byte hashes come back, then the duplicate keys."""
+        import dask
+
+        self.rows = 0
+        columns = self.columns
+        hashes = ddf[columns].map_partitions(lambda part: pd.Series(row_hashes(part, columns)), meta=(None, "uint64"))
+        parts = [part.to_numpy() for part in dask.compute(*hashes.to_delayed())]
+        for part in parts:
+            self.add_hashes(part)
+        resolved = self.resolve()
+        self.close()
+        if not resolved["group_count"]:
+            return self.report(resolved)
+
+        # ✅ Fetch only the rows of the reported duplicate hashes to name their keys
+        all_hashes = np.concatenate(parts)
+        wanted = np.unique(all_hashes[[group[0] for group in resolved["groups"]]])
+        rows = ddf[columns].map_partitions(lambda part: part[np.isin(row_hashes(part, columns), wanted)]).compute()
+        keys = {}
+        for row_hash, (_, row) in zip(row_hashes(rows, columns), rows.iterrows()):
+            keys.setdefault(row_hash, self._key(row))
+        return self.report(resolved, [keys.get(all_hashes[group[0]]) for group in resolved["groups"]])
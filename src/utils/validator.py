@@ -1,17 +1,109 @@
 import pandas as pd
+import numpy as np
 import json
+import os
 import re
-from typing import List, Callable, Dict
+import threading
+from collections import OrderedDict
+from typing import List, Callable, Dict, Iterable, Optional
+from .reference_sets import REFERENCE_SETS
+from .uniqueness import UniquenessChecker
+
+# Rule types compiled into the fused ValidationEngine
+ENGINE_RULE_TYPES = ("not_null", "unique", "regex", "value_range", "reference", "allowed_values")
+
+# Rule parameters kept on a loaded ValidationRule
+RULE_PARAMETERS = ("pattern", "min", "max", "reference_file", "reference_column", "reference_sheet", "allowed_values")
+
+class RegexMemo:
+    """Bounded LRU of regex results per (pattern, text), shared by every rule and run of the process."""
+    def __init__(self, max_entries: int = 200_000):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def match(self, pattern: re.Pattern, texts: np.ndarray) -> np.ndarray:
+        """pattern.match of each (distinct) text, matching only texts not remembered yet."""
+        with self._lock:
+            results = [self._entries.get((pattern.pattern, pattern.flags, text)) for text in texts]
+            for text, result in zip(texts, results):
+                if result is not None:
+                    self._entries.move_to_end((pattern.pattern, pattern.flags, text))
+        missing = [i for i, result in enumerate(results) if result is None]
+        matched = np.array(results, dtype=object)
+        if missing:
+            new = pd.Series(texts[missing], dtype=object).str.match(pattern).to_numpy(dtype=bool)
+            matched[missing] = new
+            if len(missing) <= self.max_entries:
+                with self._lock:
+                    for text, result in zip(texts[missing], new):
+                        self._entries[(pattern.pattern, pattern.flags, text)] = bool(result)
+                    while len(self._entries) > self.max_entries:
+                        self._entries.popitem(last=False)
+        self.hits += len(texts) - len(missing)
+        self.misses += len(missing)
+        return matched.astype(bool)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+# ✅ Process-wide memo: code/ISIN columns repeat the same few thousand values across rules and runs
+REGEX_MEMO = RegexMemo(int(os.getenv("REGEX_MEMO_MAX_ENTRIES", 200_000)))
+
+def match_distinct(values: pd.Series, pattern: re.Pattern, memo: Optional[RegexMemo] = None) -> np.ndarray:
+    """values.astype(str).str.match(pattern), matching each distinct value once and broadcasting through its code."""
+    memo = memo or REGEX_MEMO
+    # ✅ Plain text values can be factorized as they are; anything else is factorized on its text
+    # (1 and 1.0 or 0.0 and -0.0 are equal keys but different strings)
+    if values.dtype == object and pd.api.types.infer_dtype(values, skipna=True) in ("string", "empty"):
+        codes, uniques = pd.factorize(values)
+    else:
+        codes, uniques = pd.factorize(values.astype(str))
+    texts = np.asarray(uniques, dtype=object)
+    matched = memo.match(pattern, texts)[codes] if len(texts) else np.zeros(len(values), dtype=bool)
+
+    missing = codes < 0
+    if missing.any():
+        # ✅ None/NaN become "None"/"nan" like astype(str) does
+        na_codes, na_uniques = pd.factorize(values[missing].astype(str))
+        matched[missing] = memo.match(pattern, np.asarray(na_uniques, dtype=object))[na_codes]
+    return matched
+
+def _rule_function(rule_type: str, params: Dict) -> Optional[Callable]:
+    """Build a rule's row mask function; each call has its own scope, so parameters are bound per rule."""
+    if rule_type == "not_null":
+        return lambda df: df.notna().all(axis=1)
+    if rule_type == "unique":
+        return lambda df: ~df.duplicated(keep=False)
+    if rule_type == "regex":
+        pattern = re.compile(params["pattern"])
+        return lambda df: df.astype(str).apply(lambda column: column.str.match(pattern)).all(axis=1)
+    if rule_type == "value_range":
+        min_val, max_val = params["min"], params["max"]
+        return lambda df: ((df >= min_val) & (df <= max_val)).all(axis=1)
+    if rule_type in ("reference", "allowed_values"):
+        return lambda df: df.apply(lambda column: pd.Series(REFERENCE_SETS.get(params).contains(column), index=column.index)).all(axis=1)
+    return None
 
 class ValidationRule:
     """Defines a validation rule that applies to both files."""
-    def __init__(self, columns: List[str], validation_func: Callable, description: str):
+    def __init__(self, columns: List[str], validation_func: Callable, description: str, rule_type: Optional[str] = None, params: Optional[Dict] = None):
         self.columns = columns
         self.validation_func = validation_func
         self.description = description
+        # ✅ Set for rules loaded from JSON, so the engine can compile them instead of calling validation_func
+        self.rule_type = rule_type
+        self.params = params or {}
 
     def validate(self, df: pd.DataFrame) -> Dict:
         """Run validation and return results."""
+        if self.rule_type in ENGINE_RULE_TYPES:
+            result = ValidationEngine([self]).validate(df)[0]
+            return {key: result[key] for key in ("passed", "details", "failed_rows")}
+
         results = {"passed": True, "details": [], "failed_rows": 0}
 
         try:
@@ -43,21 +135,162 @@ class ValidationRuleLoader:
         rules = []
         for rule in config["rules"]:
             rule_type = rule["type"]
-            columns = rule["columns"]
-
-            if rule_type == "not_null":
-                func = lambda df: df.notna().all(axis=1)
-            elif rule_type == "unique":
-                func = lambda df: df.nunique() == len(df)
-            elif rule_type == "regex":
-                pattern = re.compile(rule["pattern"])
-                func = lambda df: df.astype(str).str.match(pattern)
-            elif rule_type == "value_range":
-                min_val, max_val = rule["min"], rule["max"]
-                func = lambda df: (df >= min_val) & (df <= max_val)
-            else:
+            params = {name: rule[name] for name in RULE_PARAMETERS if name in rule}
+            func = _rule_function(rule_type, params)
+            if func is None:
                 continue
 
-            rules.append(ValidationRule(columns, func, rule["description"]))
+            rules.append(ValidationRule(rule["columns"], func, rule["description"], rule_type, params))
 
         return rules
+
+class ValidationEngine:
+    """Evaluates not_null/unique/regex/value_range rules together in one chunked pass over the data.
+
+    Per chunk, every distinct column check (not-null, pattern match, range) is computed once
+    into a mask shared by all rules that use it; a rule ANDs the masks of its columns. Unique
+    rules feed a hash-partitioned UniquenessChecker and resolve duplicates across chunks at the end.
+    """
+    # Rows evaluated per chunk
+    CHUNK_ROWS = 250_000
+
+    def __init__(self, rules: List[ValidationRule], chunk_rows: Optional[int] = None, sample_size: int = 20, regex_memo: Optional[RegexMemo] = None):
+        unsupported = [rule.description for rule in rules if rule.rule_type not in ENGINE_RULE_TYPES]
+        if unsupported:
+            raise ValueError(f"Rules without a compiled type cannot run in the engine: {unsupported}")
+        self.rules = rules
+        self.chunk_rows = chunk_rows or self.CHUNK_ROWS
+        self.sample_size = sample_size
+        self.regex_memo = regex_memo or REGEX_MEMO
+        self._patterns = {}
+        self._references = {}
+
+    @classmethod
+    def from_config(cls, config_path: str, **kwargs) -> "ValidationEngine":
+        return cls(ValidationRuleLoader.load_rules(config_path), **kwargs)
+
+    def _pattern(self, pattern: str):
+        if pattern not in self._patterns:
+            self._patterns[pattern] = re.compile(pattern)
+        return self._patterns[pattern]
+
+    def _column_mask(self, chunk: pd.DataFrame, key: tuple, masks: Dict) -> np.ndarray:
+        """Row mask of one column check, computed once per chunk (key: check, column, parameters)."""
+        if key not in masks:
+            check, column = key[0], key[1]
+            values = chunk[column]
+            if check == "not_null":
+                masks[key] = values.notna().to_numpy()
+            elif check == "regex":
+                masks[key] = match_distinct(values, self._pattern(key[2]), self.regex_memo)
+            elif check == "reference":
+                masks[key] = self._references[key[2]].contains(values)
+            else:
+                masks[key] = ((values >= key[2]) & (values <= key[3])).to_numpy(dtype=bool)
+        return masks[key]
+
+    def _reference_key(self, rule: ValidationRule) -> int:
+        """Resolve a referential rule's lookup set (once per validation run); rules sharing a set share its masks."""
+        reference = REFERENCE_SETS.get(rule.params)
+        self._references[id(reference)] = reference
+        return id(reference)
+
+    def _rule_mask(self, rule: ValidationRule, chunk: pd.DataFrame, masks: Dict) -> np.ndarray:
+        """Rows of the chunk that pass the rule."""
+        if rule.rule_type == "regex":
+            keys = [("regex", column, rule.params["pattern"]) for column in rule.columns]
+        elif rule.rule_type == "value_range":
+            keys = [("value_range", column, rule.params["min"], rule.params["max"]) for column in rule.columns]
+        elif rule.rule_type in ("reference", "allowed_values"):
+            keys = [("reference", column, self._reference_key(rule)) for column in rule.columns]
+        else:
+            keys = [("not_null", column) for column in rule.columns]
+        passed = np.ones(len(chunk), dtype=bool)
+        for key in keys:
+            passed &= self._column_mask(chunk, key, masks)
+        return passed
+
+    def validate(self, df: pd.DataFrame) -> List[Dict]:
+        """Validate a DataFrame; returns one result per rule, in rule order."""
+        chunks = (df.iloc[start:start + self.chunk_rows] for start in range(0, len(df), self.chunk_rows))
+        return self.validate_chunks(chunks, columns=df.columns)
+
+    def validate_chunks(self, chunks: Iterable[pd.DataFrame], columns: Optional[Iterable[str]] = None) -> List[Dict]:
+        """Validate a stream of chunks (e.g. pd.read_csv(..., chunksize=...)); row labels come from the chunks' index."""
+        states = [{"failed_rows": 0, "details": [], "error": None} for _ in self.rules]
+        checkers, key_chunks, indexes = {}, {}, []
+        total_rows = 0
+        has_unique = any(rule.rule_type == "unique" for rule in self.rules)
+
+        def check_columns(available):
+            for rule, state in zip(self.rules, states):
+                missing = [column for column in rule.columns if column not in available]
+                if missing and state["error"] is None:
+                    state["error"] = f"Columns {missing} not found"
+
+        if columns is not None:
+            check_columns(set(columns))
+
+        for chunk in chunks:
+            if total_rows == 0 and columns is None:
+                check_columns(set(chunk.columns))
+            total_rows += len(chunk)
+            if has_unique:
+                indexes.append(chunk.index)
+            masks = {}
+
+            for rule, state in zip(self.rules, states):
+                if state["error"] is not None:
+                    continue
+                try:
+                    if rule.rule_type == "unique":
+                        # ✅ One hash-partitioned checker per column set, shared by unique rules on the same columns
+                        key = ("unique",) + tuple(rule.columns)
+                        if key not in masks:
+                            checker = checkers.setdefault(key, UniquenessChecker(rule.columns, max_groups=self.sample_size))
+                            masks[key] = checker.add(chunk[rule.columns])
+                            # ✅ Kept like the index, to name the key of every reported duplicate group
+                            key_chunks.setdefault(key, []).append(chunk[rule.columns])
+                        continue
+                    failed = np.flatnonzero(~self._rule_mask(rule, chunk, masks))
+                except Exception as e:
+                    state["error"] = str(e)
+                    continue
+                state["failed_rows"] += len(failed)
+                room = self.sample_size - len(state["details"])
+                if room > 0 and len(failed):
+                    state["details"].extend(chunk.index[failed[:room]].tolist())
+
+        if checkers:
+            index = indexes[0].append(indexes[1:]) if len(indexes) > 1 else indexes[0]
+            reports = {}
+            for key, checker in checkers.items():
+                resolved = checker.resolve()
+                checker.close()
+                keys = checker.group_keys(resolved, pd.concat(key_chunks[key])) if resolved["groups"] else None
+                reports[key] = (resolved["positions"], checker.report(resolved, keys)["groups"])
+            for rule, state in zip(self.rules, states):
+                if rule.rule_type == "unique" and state["error"] is None:
+                    positions, groups = reports[("unique",) + tuple(rule.columns)]
+                    state["failed_rows"] = len(positions)
+                    state["details"] = index[positions[:self.sample_size]].tolist()
+                    state["duplicate_groups"] = groups
+
+        results = []
+        for rule, state in zip(self.rules, states):
+            if state["error"] is not None:
+                passed, failed_rows, details = False, total_rows, [state["error"]]
+            else:
+                passed, failed_rows, details = state["failed_rows"] == 0, state["failed_rows"], state["details"]
+            results.append({
+                "description": rule.description,
+                "type": rule.rule_type,
+                "columns": rule.columns,
+                "passed": passed,
+                "failed_rows": failed_rows,
+                "details": details
+            })
+            if rule.rule_type == "unique" and state["error"] is None:
+                # ✅ Row positions (0-based over the whole input) of the first duplicate groups
+                results[-1]["duplicate_groups"] = state.get("duplicate_groups", [])
+        return results